@@ -2,7 +2,7 @@ from django.contrib import admin
 from django.utils.translation import get_language
 from .models import (
     Societe, Stade, NatureCompte, TypeValeur, PlanCompteGroupe,
-    PlanCompteLocal, Devise
+    PlanCompteLocal, Devise, ImportJob, SearchJob
 )
 
 # Configuration des sections de l'admin
@@ -140,4 +140,19 @@ class DeviseAdmin(AdminLabelMixin, admin.ModelAdmin):
         return super().changelist_view(request, extra_context)
 
 
+@admin.register(ImportJob)
+class ImportJobAdmin(AdminLabelMixin, admin.ModelAdmin):
+    list_display = ['id', 'type_import', 'statut', 'utilisateur', 'date_creation', 'date_debut', 'date_fin']
+    list_filter = ['statut', 'type_import']
+    ordering = ['-id']
+    list_display_links = ['id', 'type_import']
+    readonly_fields = ['date_creation', 'date_debut', 'date_fin', 'resultat', 'erreur']
 
+
+@admin.register(SearchJob)
+class SearchJobAdmin(AdminLabelMixin, admin.ModelAdmin):
+    list_display = ['id', 'statut', 'nb_lignes', 'utilisateur', 'date_creation', 'date_debut', 'date_fin']
+    list_filter = ['statut']
+    ordering = ['-id']
+    list_display_links = ['id']
+    readonly_fields = ['date_creation', 'date_debut', 'date_fin', 'date_consultation', 'nb_lignes', 'erreur']
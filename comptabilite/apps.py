@@ -5,3 +5,6 @@ class ComptabiliteConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'comptabilite'
     verbose_name = 'Finance'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,12 @@
+"""
+Backend `mssql` (mssql-django) avec pool de connexions
+
+ENGINE = 'comptabilite.backends.mssql_pool', options du pool dans OPTIONS['pool'].
+"""
+from mssql.base import DatabaseWrapper as MSSQLDatabaseWrapper
+
+from comptabilite.pool import PooledDatabaseWrapperMixin
+
+
+class DatabaseWrapper(PooledDatabaseWrapperMixin, MSSQLDatabaseWrapper):
+    pass
@@ -0,0 +1,39 @@
+"""
+Backend SQLite avec émulation des procédures stockées DW (mode DW_EMULATION)
+
+ENGINE = 'comptabilite.backends.sqlite_dw' : les `EXEC DW.PS_S_...` sont exécutés
+par comptabilite.dw_emulation, les autres requêtes par SQLite. Les tables du DW
+sont créées à la fin de `python manage.py migrate`.
+"""
+from django.db import connections
+from django.db.backends.sqlite3.base import DatabaseWrapper as SQLiteDatabaseWrapper, SQLiteCursorWrapper
+from django.db.models.signals import post_migrate
+
+from comptabilite import dw_emulation
+
+
+class DWCursorWrapper(SQLiteCursorWrapper):
+    """Curseur SQLite qui redirige les appels de procédures DW vers leur émulation."""
+
+    def execute(self, query, params=None):
+        if dw_emulation.execute_procedure(self, query, params):
+            return self
+        return super().execute(query, params)
+
+
+class DatabaseWrapper(SQLiteDatabaseWrapper):
+    emulates_dw = True
+
+    def create_cursor(self, name=None):
+        return self.connection.cursor(factory=DWCursorWrapper)
+
+
+def create_dw_schema(using, **kwargs):
+    """Crée les tables du DW après les migrations (elles ne sont pas gérées par Django)."""
+    connection = connections[using]
+    if getattr(connection, 'emulates_dw', False):
+        with connection.cursor() as cursor:
+            dw_emulation.create_schema(cursor)
+
+
+post_migrate.connect(create_dw_schema, dispatch_uid='comptabilite.sqlite_dw.create_dw_schema')
@@ -0,0 +1,229 @@
+"""
+Benchmarks des chemins critiques de comptabilite (commande run_benchmarks)
+
+Chaque scénario est une requête exécutée en processus par le client de test Django,
+avec un utilisateur superuser : les mesures couvrent vues, formulaires, templates et
+accès à la base, sans le serveur HTTP. Par scénario sont relevés les percentiles du
+temps de réponse, le nombre de requêtes SQL et le pic mémoire Python (tracemalloc,
+mesuré sur une exécution séparée pour ne pas fausser les temps).
+"""
+import os
+import platform
+import random
+import statistics
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+from django.conf import settings
+from django.contrib import admin
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection, reset_queries
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from . import dataset, imports, recherche_cache
+from .models import ImportJob, Societe, Stade
+from referentiel.models import Periode
+
+
+DEFAULT_ITERATIONS = 20
+DEFAULT_WARMUP = 2
+DEFAULT_EXCEL_SIZES = (1000, 10000)
+PERCENTILES = (50, 90, 95, 99)
+
+API_ENDPOINTS = ['societes', 'stades', 'natures-compte', 'types-valeur', 'groupes-compte', 'comptes-locaux', 'devises']
+ADMIN_APPS = ('comptabilite', 'referentiel', 'perimetre_consolidation', 'parametres')
+
+
+class Scenario:
+    """Scénario mesuré : `request(client)` exécute une requête et retourne la réponse.
+
+    `setup` est appelé avant chaque exécution, hors mesure (vidage d'un cache...).
+    """
+
+    def __init__(self, name, request, setup=None, iterations=None):
+        self.name = name
+        self.request = request
+        self.setup = setup
+        self.iterations = iterations
+
+
+def percentile(values, pct):
+    """Percentile par interpolation linéaire d'une liste triée."""
+    if len(values) == 1:
+        return values[0]
+    rank = (len(values) - 1) * pct / 100
+    low = int(rank)
+    high = min(low + 1, len(values) - 1)
+    return values[low] + (values[high] - values[low]) * (rank - low)
+
+
+def budget_workbook(size, directory, seed=42):
+    """Classeur de budget de `size` lignes (24 colonnes), créé une fois par taille."""
+    path = os.path.join(directory, f'budget_{size}.xlsx')
+    if not os.path.exists(path):
+        rng = random.Random(seed)
+        societes = list(Societe.objects.values_list('id', 'code', 'intitule')[:50]) or [(1, 'SOC', 'Société')]
+        rows = (
+            (code, 2024, 'BUDGET', f'6{rng.randrange(100000):05d}', None, None, None, None,
+             rng.randint(1, 12), round(rng.uniform(-100000, 100000), 2), soc_id, intitule,
+             None, None, None, None, None, None, None, None, None, None, None, 'B')
+            for soc_id, code, intitule in (rng.choice(societes) for _ in range(size))
+        )
+        dataset.write_budget_workbook(path, rows)
+    return path
+
+
+def build_scenarios(excel_sizes=DEFAULT_EXCEL_SIZES, workdir=None):
+    """Liste des scénarios : pages, recherche, imports, API REST et listes de l'admin."""
+    scenarios = [
+        Scenario('index', lambda c: c.get(reverse('comptabilite:index'))),
+        Scenario('societe_list', lambda c: c.get(reverse('comptabilite:societe_list'))),
+        Scenario('devise_list', lambda c: c.get(reverse('comptabilite:devise_list'))),
+    ]
+
+    periode = Periode.objects.order_by('-id').values_list('id', flat=True).first()
+    societe = Societe.objects.order_by('id').values_list('id', flat=True).first()
+    stade = Stade.objects.order_by('id').values_list('id', flat=True).first()
+    if periode and societe:
+        search = {'per_id': periode, 'soc_id': societe}
+        search_url = reverse('comptabilite:ecritures_recherche')
+        # Sans cache : chaque exécution appelle la procédure SRE
+        scenarios.append(Scenario(
+            'ecritures_recherche', lambda c: c.get(search_url, search), setup=recherche_cache.search_cache.clear,
+        ))
+        scenarios.append(Scenario(
+            'ecritures_recherche_page2', lambda c: c.get(search_url, {**search, 'page': 2, 'sort': 'FIN_Montant'}),
+        ))
+
+    workdir = workdir or tempfile.mkdtemp(prefix='bench_')
+    os.makedirs(workdir, exist_ok=True)
+    for size in excel_sizes:
+        path = budget_workbook(size, workdir)
+
+        def post_workbook(c, path=path):
+            with open(path, 'rb') as f:
+                upload = SimpleUploadedFile(os.path.basename(path), f.read())
+            return c.post(reverse('comptabilite:ecritures_import_file'), {'excel_file': upload})
+
+        scenarios.append(Scenario(f'ecritures_import_file_{size}', post_workbook, iterations=5 if size >= 10000 else None))
+
+    if societe and stade:
+        sage = {'societe': societe, 'stade': stade, 'month': 1, 'year': 2024, 'import_type': 'sage'}
+        scenarios.append(Scenario(
+            'ecritures_import_sage', lambda c: c.post(reverse('comptabilite:ecritures_import_sage'), sage),
+        ))
+
+        def run_import_job(c):
+            job = ImportJob.objects.create(type_import='sage', parametres={
+                'actualiser': True, 'societe_id': societe, 'stade_id': stade, 'periode': 202401,
+                'version_id': None, 'libelle': 'benchmark',
+            }, statut=ImportJob.STATUT_EN_COURS)
+            imports.run_job(job)
+            return job
+
+        scenarios.append(Scenario('import_sage_job', run_import_job))
+
+    for endpoint in API_ENDPOINTS:
+        scenarios.append(Scenario(f'api_{endpoint}', lambda c, e=endpoint: c.get(f'/api/{e}/')))
+
+    for model, model_admin in admin.site._registry.items():
+        opts = model._meta
+        if opts.app_label not in ADMIN_APPS:
+            continue
+        url = reverse(f'admin:{opts.app_label}_{opts.model_name}_changelist')
+        scenarios.append(Scenario(f'admin_{opts.app_label}_{opts.model_name}', lambda c, u=url: c.get(u)))
+
+    return scenarios
+
+
+def run_scenario(scenario, client, iterations=DEFAULT_ITERATIONS, warmup=DEFAULT_WARMUP):
+    """Exécute un scénario et retourne ses mesures (temps en millisecondes)."""
+    iterations = scenario.iterations or iterations
+    for _ in range(warmup):
+        if scenario.setup:
+            scenario.setup()
+        scenario.request(client)
+
+    timings = []
+    queries = []
+    status = None
+    for _ in range(iterations):
+        if scenario.setup:
+            scenario.setup()
+        with CaptureQueriesContext(connection) as captured:
+            start = time.perf_counter()
+            response = scenario.request(client)
+            timings.append((time.perf_counter() - start) * 1000)
+        queries.append(len(captured.captured_queries))
+        status = getattr(response, 'status_code', None)
+
+    # Pic mémoire sur une exécution à part : tracemalloc ralentit l'exécution
+    if scenario.setup:
+        scenario.setup()
+    tracemalloc.start()
+    try:
+        scenario.request(client)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    reset_queries()
+
+    timings.sort()
+    return {
+        'iterations': iterations,
+        'status': status,
+        'mean_ms': statistics.fmean(timings),
+        'min_ms': timings[0],
+        'max_ms': timings[-1],
+        **{f'p{pct}_ms': percentile(timings, pct) for pct in PERCENTILES},
+        'queries': max(queries),
+        'peak_memory_kb': peak / 1024,
+    }
+
+
+def environment():
+    """Contexte des mesures, pour comparer des résultats entre commits."""
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, cwd=settings.BASE_DIR, timeout=5,
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        'date': datetime.now().isoformat(timespec='seconds'),
+        'commit': commit,
+        'python': platform.python_version(),
+        'database': connection.vendor,
+        'engine': connection.settings_dict['ENGINE'],
+    }
+
+
+def compare(results, baseline, metric='p50_ms', threshold=10.0):
+    """Compare deux résultats : [(scénario, base, actuel, écart en %, régression)]."""
+    rows = []
+    for name, current in results['scenarios'].items():
+        previous = baseline.get('scenarios', {}).get(name)
+        if not previous or not previous.get(metric):
+            continue
+        delta = (current[metric] - previous[metric]) / previous[metric] * 100
+        rows.append((name, previous[metric], current[metric], delta, delta > threshold))
+    return rows
+
+
+def create_client(username):
+    """Client de test connecté avec un superuser dédié aux benchmarks."""
+    from django.contrib.auth.models import User
+
+    user, created = User.objects.get_or_create(username=username, defaults={'is_staff': True, 'is_superuser': True})
+    if created:
+        user.set_unusable_password()
+        user.save()
+    # Une vue en erreur est mesurée avec son statut 500 au lieu d'interrompre la série
+    client = Client(raise_request_exception=False)
+    client.force_login(user)
+    return client
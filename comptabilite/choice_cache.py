@@ -0,0 +1,166 @@
+"""
+Choix des listes déroulantes des formulaires servis depuis la mémoire (référentiels)
+
+Les listes des formulaires (périodes, stades, sociétés, types valeur, devises) sont
+chargées une fois par processus puis servies depuis la mémoire, pour l'affichage
+comme pour la validation. Comme pour les libellés dynamiques (dynamic_labels.py),
+chaque table a un jeton de version partagé entre les processus via le cache Django :
+il change à chaque enregistrement ou suppression (signaux, voir signals.py) et force
+le rechargement dans tous les workers. Les tables du DW pouvant être modifiées hors
+de Django, une liste est de plus rechargée au bout de CHOICE_CACHE_TIMEOUT secondes.
+"""
+import threading
+import time
+
+from django import forms
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.forms.models import ModelChoiceIterator
+
+from referentiel.models import Periode
+
+from .models import Devise, Societe, Stade, TypeValeur
+
+
+VERSION_KEY_PREFIX = 'comptabilite:choices:version:'
+
+
+def version_key(model):
+    return f'{VERSION_KEY_PREFIX}{model._meta.label_lower}'
+
+
+class ChoiceProvider:
+    """Instances d'un référentiel, dans l'ordre d'affichage, chargées une fois par version."""
+
+    def __init__(self, model, *ordering):
+        self.model = model
+        self.ordering = ordering
+        self._entry = None
+        self._lock = threading.Lock()
+
+    def queryset(self):
+        return self.model.objects.order_by(*self.ordering)
+
+    def _load(self):
+        version = cache.get(version_key(self.model))
+        entry = self._entry
+        timeout = getattr(settings, 'CHOICE_CACHE_TIMEOUT', 3600)
+        if entry is not None and entry[0] == version and (not timeout or time.monotonic() - entry[1] < timeout):
+            return entry
+        objects = list(self.queryset())
+        entry = (version, time.monotonic(), objects, {str(obj.pk): obj for obj in objects})
+        with self._lock:
+            self._entry = entry
+        return entry
+
+    def objects(self):
+        """Instances du référentiel (liste partagée, à ne pas modifier)."""
+        return self._load()[2]
+
+    def get(self, pk):
+        """Instance de clé `pk`, ou None si elle n'existe pas."""
+        if pk is None:
+            return None
+        return self._load()[3].get(str(pk))
+
+    def invalidate(self):
+        with self._lock:
+            self._entry = None
+
+
+PERIODES = ChoiceProvider(Periode, 'id')
+STADES = ChoiceProvider(Stade, 'intitule')
+SOCIETES = ChoiceProvider(Societe, 'intitule')
+TYPES_VALEUR = ChoiceProvider(TypeValeur, 'intitule')
+DEVISES = ChoiceProvider(Devise, 'intitule')
+
+PROVIDERS = [PERIODES, STADES, SOCIETES, TYPES_VALEUR, DEVISES]
+
+
+def invalidate(model):
+    """Invalide les choix de `model` dans ce processus et, via le jeton de version, dans les autres."""
+    for provider in PROVIDERS:
+        if provider.model is model:
+            provider.invalidate()
+    cache.set(version_key(model), time.time_ns(), None)
+
+
+class CachedChoiceIterator(ModelChoiceIterator):
+    """Choix du champ construits depuis les instances en mémoire (aucune requête)."""
+
+    def __iter__(self):
+        if self.field.empty_label is not None:
+            yield ('', self.field.empty_label)
+        for obj in self.field.provider.objects():
+            yield self.choice(obj)
+
+    def __len__(self):
+        return len(self.field.provider.objects()) + (1 if self.field.empty_label is not None else 0)
+
+    def __bool__(self):
+        return self.field.empty_label is not None or bool(self.field.provider.objects())
+
+
+class CachedModelChoiceField(forms.ModelChoiceField):
+    """ModelChoiceField dont l'affichage et la validation utilisent un ChoiceProvider."""
+
+    iterator = CachedChoiceIterator
+
+    def __init__(self, provider, **kwargs):
+        self.provider = provider
+        super().__init__(queryset=provider.queryset(), **kwargs)
+
+    def to_python(self, value):
+        if value in self.empty_values:
+            return None
+        if isinstance(value, self.queryset.model):
+            value = value.pk
+        obj = self.provider.get(value)
+        if obj is None:
+            raise ValidationError(
+                self.error_messages['invalid_choice'],
+                code='invalid_choice',
+                params={'value': value},
+            )
+        return obj
+
+
+class CachedModelMultipleChoiceField(forms.ModelMultipleChoiceField):
+    """ModelMultipleChoiceField dont l'affichage et la validation utilisent un ChoiceProvider.
+
+    La valeur nettoyée est une liste d'instances et non un queryset.
+    """
+
+    iterator = CachedChoiceIterator
+
+    def __init__(self, provider, **kwargs):
+        self.provider = provider
+        super().__init__(queryset=provider.queryset(), **kwargs)
+
+    def clean(self, value):
+        value = self.prepare_value(value)
+        if self.required and not value:
+            raise ValidationError(self.error_messages['required'], code='required')
+        if not self.required and not value:
+            return []
+        objects = self._check_values(value)
+        self.run_validators(value)
+        return objects
+
+    def _check_values(self, value):
+        try:
+            value = list(dict.fromkeys(value))
+        except TypeError:
+            raise ValidationError(self.error_messages['invalid_list'], code='invalid_list')
+        objects = []
+        for pk in value:
+            obj = self.provider.get(pk)
+            if obj is None:
+                raise ValidationError(
+                    self.error_messages['invalid_choice'],
+                    code='invalid_choice',
+                    params={'value': pk},
+                )
+            objects.append(obj)
+        return objects
@@ -0,0 +1,336 @@
+"""
+Lecture en colonnes typées (NumPy) du résultat des procédures DW
+
+Au lieu d'une liste de lignes pyodbc (un objet Row et un Decimal par montant),
+le résultat est lu par lots `fetchmany` et converti colonne par colonne :
+    montants   FIN_Montant, FIN_Solde : int64 en centièmes (Decimal en objets si un
+               montant n'est pas un nombre entier de centièmes, ou float64)
+    ids        colonnes *_id : int32 (int64 au-delà), avec masque des valeurs nulles
+    dates      colonnes *_Date : datetime64[us] (NaT pour les valeurs nulles)
+    codes      autres colonnes : catégories encodées par dictionnaire (codes int32,
+               -1 pour les valeurs nulles)
+Agrégations, tris et pagination travaillent sur les tableaux ; seules les lignes
+affichées sont reconstruites en tuples Python.
+"""
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import numpy as np
+
+
+AMOUNT = 'amount'
+ID = 'id'
+DATE = 'date'
+CATEGORY = 'category'
+
+AMOUNT_COLUMNS = {'FIN_Montant', 'FIN_Solde'}
+# Montants en int64 exprimés en centièmes : sommes exactes, sans Decimal par ligne.
+# La conversion est exacte (Decimal décalé de deux chiffres) ; une colonne dont un montant
+# a plus de deux décimales, ou dépasse l'int64, est conservée en Decimal (tableau d'objets).
+AMOUNT_DECIMALS = 2
+INT64 = np.iinfo(np.int64)
+
+INT32 = np.iinfo(np.int32)
+EPOCH = datetime(1970, 1, 1)
+MICROSECOND = timedelta(microseconds=1)
+
+
+def amounts_to_python(values):
+    """Montants d'un tableau en Decimal (centièmes int64 ou objets) ou en float (float64)."""
+    if values.dtype == np.int64:
+        return [Decimal(value).scaleb(-AMOUNT_DECIMALS) for value in values.tolist()]
+    if values.dtype == object:
+        # Les sommes d'un tableau vide ou les zéros de np.where sont des int
+        return [value if isinstance(value, Decimal) else Decimal(value) for value in values.tolist()]
+    return [float(value) for value in values.tolist()]
+
+
+def _decimal(value):
+    """Montant en Decimal ; les float (pilote SQLite) par leur représentation la plus courte."""
+    if isinstance(value, float):
+        return Decimal(repr(value))
+    return value if isinstance(value, Decimal) else Decimal(value)
+
+
+def _cents(value):
+    """Montant en centièmes entiers, ou None s'il n'est pas un nombre entier de centièmes int64."""
+    scaled = _decimal(value).scaleb(AMOUNT_DECIMALS)
+    if not scaled.is_finite() or scaled != scaled.to_integral_value():
+        return None
+    cents = int(scaled)
+    return cents if INT64.min < cents <= INT64.max else None
+
+
+def amounts_as_objects(values):
+    """Tableau d'objets Decimal à partir d'un tableau de montants (centièmes, float ou objets)."""
+    if values.dtype == object:
+        return values
+    decimals = np.empty(len(values), dtype=object)
+    decimals[:] = amounts_to_python(values) if values.dtype == np.int64 else [_decimal(v) for v in values.tolist()]
+    return decimals
+
+
+def column_kind(name):
+    """Type de colonne déduit de son nom (conventions de nommage du DW)."""
+    if name in AMOUNT_COLUMNS:
+        return AMOUNT
+    lower = name.lower()
+    if lower.endswith('_id'):
+        return ID
+    if lower.endswith('_date'):
+        return DATE
+    return CATEGORY
+
+
+class _ColumnBuilder:
+    """Accumule les valeurs d'une colonne par lots, converties en tableaux."""
+
+    def __init__(self, kind, amount_dtype):
+        self.kind = kind
+        self.amount_dtype = amount_dtype
+        self.chunks = []
+        self.null_chunks = []
+        self.index = {}
+
+    def append(self, values):
+        count = len(values)
+        if self.kind == AMOUNT:
+            if self.amount_dtype == 'float64':
+                self.chunks.append(
+                    np.fromiter((np.nan if v is None else float(v) for v in values), dtype=np.float64, count=count)
+                )
+                return
+            self.null_chunks.append(np.fromiter((v is None for v in values), dtype=bool, count=count))
+            if self.amount_dtype == 'int64':
+                cents = [0 if v is None else _cents(v) for v in values]
+                if None not in cents:
+                    self.chunks.append(np.array(cents, dtype=np.int64))
+                    return
+                # Montant hors centièmes : toute la colonne passe en Decimal, sans arrondi
+                self.amount_dtype = object
+                self.chunks = [amounts_as_objects(chunk) for chunk in self.chunks]
+            amounts = np.empty(count, dtype=object)
+            amounts[:] = [Decimal(0) if v is None else _decimal(v) for v in values]
+            self.chunks.append(amounts)
+        elif self.kind == ID:
+            self.chunks.append(np.fromiter((0 if v is None else v for v in values), dtype=np.int64, count=count))
+            self.null_chunks.append(np.fromiter((v is None for v in values), dtype=bool, count=count))
+        elif self.kind == DATE:
+            if all(v is None or (type(v) is datetime and v.tzinfo is None) for v in values):
+                # Conversion directe en microsecondes, bien plus rapide que np.array(dtype='datetime64')
+                micros = np.fromiter(
+                    (np.iinfo(np.int64).min if v is None else (v - EPOCH) // MICROSECOND for v in values),
+                    dtype=np.int64, count=count,
+                )
+                self.chunks.append(micros.view('datetime64[us]'))
+            else:
+                self.chunks.append(np.array(values, dtype='datetime64[us]'))
+        else:
+            index = self.index
+            self.chunks.append(np.fromiter(
+                (-1 if v is None else index.setdefault(v, len(index)) for v in values),
+                dtype=np.int32, count=len(values),
+            ))
+
+    def build(self):
+        dtypes = {AMOUNT: self.amount_dtype, ID: np.int64, DATE: 'datetime64[us]', CATEGORY: np.int32}
+        values = np.concatenate(self.chunks) if self.chunks else np.array([], dtype=dtypes[self.kind])
+        nulls = np.concatenate(self.null_chunks) if self.null_chunks else None
+        if self.kind == ID and (not len(values) or (values.min() >= INT32.min and values.max() <= INT32.max)):
+            values = values.astype(np.int32)
+        categories = list(self.index) if self.kind == CATEGORY else None
+        return Column(self.kind, values, nulls, categories)
+
+
+class Column:
+    """Colonne typée : `values` et, selon le type, masque des nulls ou catégories."""
+
+    def __init__(self, kind, values, nulls=None, categories=None):
+        self.kind = kind
+        self.values = values
+        self.nulls = nulls
+        self.categories = categories
+
+    def __len__(self):
+        return len(self.values)
+
+    @property
+    def null_mask(self):
+        """Masque booléen des valeurs nulles."""
+        if self.kind == CATEGORY:
+            return self.values < 0
+        if self.kind == DATE:
+            return np.isnat(self.values)
+        if self.nulls is not None:
+            return self.nulls
+        return np.isnan(self.values)
+
+    def sort_key(self):
+        """Clé numérique de tri : ordre des catégories, horodatage, valeur (nulls à 0)."""
+        if self.kind == CATEGORY:
+            order = sorted(range(len(self.categories)), key=lambda i: self.categories[i])
+            ranks = np.empty(len(self.categories) + 1, dtype=np.int64)
+            ranks[np.asarray(order, dtype=np.int64)] = np.arange(len(order))
+            ranks[-1] = 0
+            return ranks[self.values]
+        if self.kind == DATE:
+            return np.where(np.isnat(self.values), 0, self.values.view(np.int64))
+        if self.values.dtype.kind == 'f':
+            return np.nan_to_num(self.values, nan=0.0)
+        if self.values.dtype == object:
+            # Montants en Decimal : ordre des float, suffisant pour trier
+            return self.values.astype(np.float64)
+        return self.values.astype(np.int64)
+
+    def factorize(self):
+        """(codes, libellés) : rang de chaque ligne parmi les valeurs distinctes triées.
+
+        Les valeurs nulles ont le code len(libellés) - 1 et le libellé None, en fin de liste.
+        """
+        nulls = self.null_mask
+        if self.kind == CATEGORY:
+            present = np.unique(self.values[~nulls])
+            present = sorted(present.tolist(), key=lambda code: self.categories[code])
+            remap = np.zeros(len(self.categories), dtype=np.int64)
+            remap[np.asarray(present, dtype=np.int64)] = np.arange(len(present))
+            labels = [self.categories[code] for code in present]
+            codes = np.full(len(self.values), len(labels), dtype=np.int64)
+            codes[~nulls] = remap[self.values[~nulls]]
+        else:
+            unique, inverse = np.unique(self.values[~nulls], return_inverse=True)
+            labels = Column(self.kind, unique, np.zeros(len(unique), dtype=bool)).to_python(np.arange(len(unique)))
+            codes = np.full(len(self.values), len(labels), dtype=np.int64)
+            codes[~nulls] = inverse
+        if nulls.any():
+            labels.append(None)
+        return codes, labels
+
+    def to_python(self, indices):
+        """Valeurs Python des lignes `indices` (None pour les valeurs nulles)."""
+        if self.kind == CATEGORY:
+            categories = self.categories
+            return [None if code < 0 else categories[code] for code in self.values[indices].tolist()]
+        nulls = self.null_mask[indices]
+        if self.kind == AMOUNT:
+            raw = amounts_to_python(self.values[indices])
+        elif self.kind == DATE:
+            raw = self.values[indices].astype(object).tolist()
+        else:
+            raw = self.values[indices].tolist()
+        return [None if null else value for value, null in zip(raw, nulls.tolist())]
+
+
+class ColumnarResult:
+    """Résultat d'une procédure stocké en colonnes typées."""
+
+    def __init__(self, columns, data):
+        self.columns = columns
+        self.data = data
+
+    def __len__(self):
+        return len(self.data[self.columns[0]]) if self.columns else 0
+
+    def __getitem__(self, name):
+        return self.data[name]
+
+    def amount_totals(self, name):
+        """(débit, crédit) d'une colonne de montants, en Decimal si les montants sont en centièmes."""
+        column = self.data[name]
+        values = column.values
+        valid = ~column.null_mask
+        debit = values[valid & (values > 0)].sum()
+        credit = -values[valid & (values < 0)].sum()
+        return tuple(amounts_to_python(np.array([debit, credit], dtype=values.dtype)))
+
+    def argsort(self, name, descending=False):
+        """Ordre stable des lignes selon une colonne, valeurs nulles en fin dans les deux sens."""
+        column = self.data[name]
+        key = column.sort_key()
+        if descending:
+            key = -key
+        # lexsort : la dernière clé est la clé principale
+        return np.lexsort((key, column.null_mask))
+
+    def rows(self, indices=None):
+        """Lignes (tuples) des positions `indices`, toutes par défaut."""
+        if indices is None:
+            indices = np.arange(len(self))
+        indices = np.asarray(indices, dtype=np.int64)
+        values = [self.data[name].to_python(indices) for name in self.columns]
+        return list(zip(*values))
+
+    def iter_rows(self, batch_size=1000):
+        """Parcourt les lignes par lots, pour un export sans reconstruire tout le résultat."""
+        for start in range(0, len(self), batch_size):
+            yield from self.rows(np.arange(start, min(start + batch_size, len(self))))
+
+
+def concat(results):
+    """Concatène des ColumnarResult de mêmes colonnes (résultats partiels d'une procédure).
+
+    Les catégories sont réencodées dans un dictionnaire commun, les lignes gardent
+    l'ordre des résultats puis leur ordre dans chaque résultat.
+    """
+    results = list(results)
+    if not results:
+        raise ValueError('Aucun résultat à concaténer')
+    columns = results[0].columns
+    if any(result.columns != columns for result in results):
+        raise ValueError('Colonnes différentes entre les résultats')
+    data = {}
+    for name in columns:
+        parts = [result[name] for result in results]
+        kind = parts[0].kind
+        if kind == CATEGORY:
+            index = {}
+            codes = []
+            for part in parts:
+                remap = np.fromiter(
+                    (index.setdefault(value, len(index)) for value in part.categories),
+                    dtype=np.int32, count=len(part.categories),
+                )
+                codes.append(np.where(part.values < 0, -1, remap[np.maximum(part.values, 0)]).astype(np.int32)
+                             if len(remap) else part.values)
+            data[name] = Column(kind, np.concatenate(codes), categories=list(index))
+            continue
+        # int32 et int64 mélangés (identifiants) : NumPy promeut en int64
+        arrays = [part.values for part in parts]
+        if kind == AMOUNT and len({array.dtype for array in arrays}) > 1:
+            # Centièmes d'un résultat, Decimal d'un autre : tout en Decimal
+            arrays = [amounts_as_objects(array) for array in arrays]
+        values = np.concatenate(arrays)
+        nulls = None
+        if any(part.nulls is not None for part in parts):
+            nulls = np.concatenate([part.null_mask for part in parts])
+        data[name] = Column(kind, values, nulls)
+    return ColumnarResult(columns, data)
+
+
+class TooManyRows(Exception):
+    """Le résultat dépasse `max_rows` : `result` contient les lignes déjà lues, `batches` la suite."""
+
+    def __init__(self, result, batches):
+        super().__init__('Résultat trop volumineux')
+        self.result = result
+        self.batches = batches
+
+
+def from_batches(columns, batches, max_rows=None, amount_dtype='int64', kinds=None):
+    """Construit un ColumnarResult à partir des lots de lignes du curseur.
+
+    `kinds` remplace le type déduit du nom des colonnes. Au-delà de `max_rows`
+    lignes, lève TooManyRows sans lire le reste du résultat.
+    """
+    kinds = kinds or {}
+    builders = [_ColumnBuilder(kinds.get(name) or column_kind(name), amount_dtype) for name in columns]
+    batches = iter(batches)
+    count = 0
+    for batch in batches:
+        count += len(batch)
+        for position, builder in enumerate(builders):
+            builder.append([row[position] for row in batch])
+        if max_rows is not None and count > max_rows:
+            result = ColumnarResult(columns, {name: b.build() for name, b in zip(columns, builders)})
+            raise TooManyRows(result, batches)
+    return ColumnarResult(columns, {name: builder.build() for name, builder in zip(columns, builders)})
+
@@ -0,0 +1,140 @@
+"""
+Comparaison d'une période avec le même mois de l'année précédente (N / N-1)
+
+Les deux appels de la procédure SRE sont exécutés simultanément (fanout.run_concurrently),
+chacun sur sa connexion. Les deux résultats en colonnes sont concaténés puis les lignes
+alignées sur compte et axes par une jointure vectorisée : les clés sont factorisées
+une seule fois pour les deux périodes et les montants sommés par clé et par période.
+Chaque ligne de la grille porte le montant N, le montant N-1, l'écart et l'écart en %.
+"""
+import numpy as np
+from django.conf import settings
+
+from referentiel.models import Periode
+
+from . import columnar, fanout, pivot
+
+
+# Dimensions d'alignement des deux périodes (voir pivot.DIMENSIONS)
+KEYS = ['compte', 'ax1', 'ax2', 'ax3']
+AMOUNT_COLUMN = 'FIN_Montant'
+
+
+class ComparisonError(Exception):
+    """Comparaison impossible (période absente, résultat trop volumineux)."""
+
+
+class Comparison:
+    """Grille N / N-1 : une ligne par combinaison compte et axes présente dans l'une des périodes."""
+
+    def __init__(self, periode, periode_precedente, row_headers, rows, totals, count, count_precedent,
+                 group_count, truncated):
+        self.periode = periode
+        self.periode_precedente = periode_precedente
+        self.row_headers = row_headers
+        self.rows = rows
+        self.totals = totals
+        self.count = count
+        self.count_precedent = count_precedent
+        self.group_count = group_count
+        self.truncated = truncated
+
+    @property
+    def headers(self):
+        return [*self.row_headers, str(self.periode), str(self.periode_precedente), 'Écart', 'Écart %']
+
+
+def previous_period(per_id):
+    """Période du même mois de l'année précédente, ou None si elle n'existe pas."""
+    periode = Periode.objects.filter(id=per_id).first()
+    if periode is None or not periode.annee or not periode.mois:
+        return None
+    return Periode.objects.filter(annee=periode.annee - 1, mois=periode.mois).first()
+
+
+def _percent(variance, previous):
+    """Écart en % du montant N-1 (None si N-1 est nul), arrondi au dixième."""
+    pct = np.full(len(variance), np.nan)
+    nonzero = previous != 0
+    pct[nonzero] = variance[nonzero] / np.abs(previous[nonzero]) * 100
+    return [None if np.isnan(value) else round(value, 1) for value in pct.tolist()]
+
+
+def build(columns, current, previous, periode, periode_precedente, max_rows=None):
+    """Aligne les résultats `current` (N) et `previous` (N-1) et retourne une Comparison."""
+    max_rows = max_rows or getattr(settings, 'PIVOT_MAX_ROWS', 2000)
+    names = []
+    for name in [*(pivot.DIMENSIONS[key][0] for key in KEYS), AMOUNT_COLUMN]:
+        column = pivot.find_column(columns, name)
+        if column is None:
+            raise ComparisonError(f"Colonne {name} absente du résultat")
+        names.append(column)
+
+    merged = columnar.concat([current, previous])
+    side = np.concatenate([np.zeros(len(current), dtype=bool), np.ones(len(previous), dtype=bool)])
+
+    # Jointure externe : rang de chaque ligne parmi les combinaisons des deux périodes
+    factors = [merged[name].factorize() for name in names[:-1]]
+    keys = np.stack([codes for codes, _ in factors], axis=1)
+    groups, inverse = np.unique(keys, axis=0, return_inverse=True)
+    inverse = inverse.reshape(-1)
+    group_count = len(groups)
+
+    amount = merged[names[-1]]
+    values = np.where(amount.null_mask, 0, amount.values)
+    sums_n = pivot.sum_by(inverse[~side], values[~side], group_count)
+    sums_n1 = pivot.sum_by(inverse[side], values[side], group_count)
+    variances = sums_n - sums_n1
+
+    rows = []
+    shown = min(group_count, max_rows)
+    amounts_n = columnar.amounts_to_python(sums_n[:shown])
+    amounts_n1 = columnar.amounts_to_python(sums_n1[:shown])
+    amounts_variance = columnar.amounts_to_python(variances[:shown])
+    percents = _percent(variances[:shown], sums_n1[:shown])
+    for g in range(shown):
+        header = [factors[position][1][groups[g][position]] for position in range(len(KEYS))]
+        rows.append((header, amounts_n[g], amounts_n1[g], amounts_variance[g], percents[g]))
+
+    total_n, total_n1 = sums_n.sum(keepdims=True), sums_n1.sum(keepdims=True)
+    totals = (
+        columnar.amounts_to_python(total_n)[0],
+        columnar.amounts_to_python(total_n1)[0],
+        columnar.amounts_to_python(total_n - total_n1)[0],
+        _percent(total_n - total_n1, total_n1)[0],
+    )
+    return Comparison(
+        periode=periode,
+        periode_precedente=periode_precedente,
+        row_headers=[pivot.DIMENSIONS[key][1] for key in KEYS],
+        rows=rows,
+        totals=totals,
+        count=len(current),
+        count_precedent=len(previous),
+        group_count=group_count,
+        truncated=group_count > max_rows,
+    )
+
+
+def compare(params):
+    """Exécute la recherche pour la période N et N-1 simultanément et retourne la Comparison."""
+    if params.get('per_ids') is not None:
+        raise ComparisonError('La comparaison N / N-1 porte sur une seule période')
+    periode = Periode.objects.filter(id=params.get('per_id')).first()
+    if periode is None:
+        raise ComparisonError('Choisissez une période pour la comparaison N / N-1')
+    periode_precedente = previous_period(periode.id)
+    if periode_precedente is None:
+        raise ComparisonError(f"Période de l'année précédente absente du référentiel pour {periode}")
+
+    max_rows = getattr(settings, 'COMPARAISON_MAX_ROWS', 1000000)
+    parts = fanout.run_concurrently(
+        [params, {**params, 'per_id': periode_precedente.id}], max_rows, max_workers=2,
+    )
+    if parts is None:
+        raise ComparisonError(f'Résultat supérieur à {max_rows} lignes, affinez les critères')
+    columns = next((columns for columns, _ in parts if columns), [])
+    if not columns:
+        raise ComparisonError('La procédure de recherche ne retourne aucune colonne')
+    current, previous = (result if result is not None else columnar.from_batches(columns, []) for _, result in parts)
+    return build(columns, current, previous, periode, periode_precedente)
@@ -1,22 +1,19 @@
 from typing import Dict
-from django.utils.translation import get_language
-from parametres.models import AdminText
+from .dynamic_labels import get_admin_texts
 
 
 def admin_labels(request) -> Dict[str, object]:
     try:
-        lang = get_language() or 'fr'
-        items = AdminText.objects.filter(language=lang)
-        if not items.exists() and lang != 'fr':
-            items = AdminText.objects.filter(language='fr')
-        mapping = {row.key: row.value for row in items}
+        # Libellés servis depuis le cache en mémoire (aucune requête en régime établi)
+        items = get_admin_texts()
+        mapping = {key: value for key, value, _ in items}
         
         # Récupérer les ordres d'affichage
         orders = {}
-        for item in items:
-            if item.key.startswith('model.') and item.key.endswith('.name_plural'):
-                model_name = item.key.split('.')[1].lower()
-                orders[model_name] = item.display_order
+        for key, _, display_order in items:
+            if key.startswith('model.') and key.endswith('.name_plural'):
+                model_name = key.split('.')[1].lower()
+                orders[model_name] = display_order
         
         # Créer la structure imbriquée pour admin_labels.site.title
         nested = {}
@@ -8,17 +8,20 @@ from django.db.backends.base.client import BaseDatabaseClient
 from django.db.backends.base.creation import BaseDatabaseCreation
 from django.db.backends.base.introspection import BaseDatabaseIntrospection
 from django.db.backends.base.schema import BaseDatabaseSchemaEditor
-from django.db.backends.mssql.base import DatabaseWrapper as MSSQLDatabaseWrapper
-from django.db.backends.mssql.operations import DatabaseOperations
-from django.db.backends.mssql.client import DatabaseClient
-from django.db.backends.mssql.creation import DatabaseCreation
-from django.db.backends.mssql.introspection import DatabaseIntrospection
-from django.db.backends.mssql.schema import DatabaseSchemaEditor
+from mssql.base import DatabaseWrapper as MSSQLDatabaseWrapper
+from mssql.operations import DatabaseOperations
+from mssql.client import DatabaseClient
+from mssql.creation import DatabaseCreation
+from mssql.introspection import DatabaseIntrospection
+from mssql.schema import DatabaseSchemaEditor
 
+from .pool import PooledDatabaseWrapperMixin
 
-class CustomMSSQLDatabaseWrapper(MSSQLDatabaseWrapper):
+
+class CustomMSSQLDatabaseWrapper(PooledDatabaseWrapperMixin, MSSQLDatabaseWrapper):
     """
     Wrapper personnalisé pour MSSQL avec gestion de l'instance
+    (connexions empruntées au pool si OPTIONS['pool'] est défini)
     """
     
     def get_connection_params(self):
@@ -50,8 +53,8 @@ class CustomMSSQLDatabaseWrapper(MSSQLDatabaseWrapper):
             self.connection = self.get_new_connection(self.get_connection_params())
         return self.connection.cursor()
     
-    def get_new_connection(self, conn_params):
-        """Créer une nouvelle connexion avec pyodbc"""
+    def _connect(self, conn_params):
+        """Créer une nouvelle connexion avec pyodbc (appelé par le pool, voir pool.py)"""
         # Construction de la chaîne de connexion
         conn_str_parts = []
         for key, value in conn_params.items():
@@ -0,0 +1,238 @@
+"""
+Génération d'un jeu de données synthétique reproductible (commande generate_dataset)
+
+Les volumes sont proportionnels à l'échelle `scale` :
+    sociétés                10 × scale
+    comptes locaux          COMPTES_PAR_SOCIETE par société (100 000 à l'échelle 100)
+    périodes                12 par année
+    faits financiers        faits_par_periode par société et par période
+Les référentiels générés ont un code préfixé par GEN pour être reconnus (et supprimés
+par `clear_dataset`). Les faits sont écrits dans T_E_FinanceFaits_FIN selon le schéma
+du DW (voir dw_emulation.SCHEMA), avec les axes T_E_Axe1_AX1 à T_E_Axe3_AX3.
+"""
+from datetime import datetime
+from itertools import islice
+
+from django.db import connection, transaction
+
+from .imports import BUDGET_EXCEL_COLUMNS, _driver_cursor
+from .models import NatureCompte, PlanCompteGroupe, PlanCompteLocal, Societe, Stade, TypeValeur
+from referentiel.models import Periode
+
+
+PREFIX = 'GEN'
+SOCIETES_PAR_ECHELLE = 10
+COMPTES_PAR_SOCIETE = 100
+GROUPES = 50
+AXES_PAR_NIVEAU = 20
+DEFAULT_FAITS_PAR_PERIODE = 250
+DEFAULT_BATCH_SIZE = 5000
+
+NATURES = [
+    ('GEN1', 'Capitaux'), ('GEN2', 'Immobilisations'), ('GEN4', 'Tiers'),
+    ('GEN5', 'Financier'), ('GEN6', 'Charges'), ('GEN7', 'Produits'),
+]
+STADES = ['GEN Réel', 'GEN Budget', 'GEN Prévision']
+TYPES_VALEUR = [('GENR', 'Réel'), ('GENB', 'Budget')]
+
+FAITS_COLUMNS = [
+    'PER_Id', 'STA_Id', 'SOC_Id', 'VER_Id', 'LOT_Id', 'PCL_Id', 'TYV_Id',
+    'AX1_Id', 'AX2_Id', 'AX3_Id', 'FIN_Montant', 'FIN_Solde', 'FIN_Date',
+]
+
+
+def periode_id(annee, mois):
+    """Identifiant de période AAAAMM."""
+    return annee * 100 + mois
+
+
+def generate_referentiels(scale, rng, start_year, years, batch_size=DEFAULT_BATCH_SIZE):
+    """Crée les référentiels (en bulk_create) et retourne les identifiants utiles aux faits."""
+    natures = NatureCompte.objects.bulk_create(
+        [NatureCompte(code=code, intitule=intitule) for code, intitule in NATURES]
+    )
+    groupes = [
+        PlanCompteGroupe(code=f'{PREFIX}{i:03d}', intitule=f'Groupe {i}', nature_compte=rng.choice(natures))
+        for i in range(1, GROUPES + 1)
+    ]
+    PlanCompteGroupe.objects.bulk_create(groupes, batch_size=batch_size)
+    # Les identifiants IDENTITY ne sont pas toujours retournés par bulk_create (SQL Server)
+    groupe_ids = list(
+        PlanCompteGroupe.objects.filter(code__startswith=PREFIX).order_by('code').values_list('id', flat=True)
+    )
+    stades = Stade.objects.bulk_create([Stade(intitule=intitule) for intitule in STADES])
+    types_valeur = TypeValeur.objects.bulk_create(
+        [TypeValeur(code=code, intitule=intitule) for code, intitule in TYPES_VALEUR]
+    )
+
+    societes = Societe.objects.bulk_create(
+        [Societe(code=f'{PREFIX}{i:05d}', intitule=f'Société {i}') for i in range(1, scale * SOCIETES_PAR_ECHELLE + 1)],
+        batch_size=batch_size,
+    )
+
+    def comptes():
+        for societe in societes:
+            for i in range(COMPTES_PAR_SOCIETE):
+                classe = rng.choice('1245670')
+                yield PlanCompteLocal(
+                    compte=f'{classe}{i:05d}',
+                    intitule=f'Compte {classe}{i:05d}',
+                    societe=societe,
+                    groupe_id=rng.choice(groupe_ids),
+                )
+
+    pcl = comptes()
+    while True:
+        batch = list(islice(pcl, batch_size))
+        if not batch:
+            break
+        PlanCompteLocal.objects.bulk_create(batch, batch_size=batch_size)
+
+    existing = set(Periode.objects.values_list('id', flat=True))
+    periodes = [
+        Periode(id=periode_id(annee, mois), date=datetime(annee, mois, 1), annee=annee, mois=mois,
+                trimestre_civil=(mois - 1) // 3 + 1)
+        for annee in range(start_year, start_year + years)
+        for mois in range(1, 13)
+    ]
+    Periode.objects.bulk_create([p for p in periodes if p.id not in existing])
+
+    axes = {}
+    with connection.cursor() as cursor:
+        for level in (1, 2, 3):
+            table = f'T_E_Axe{level}_AX{level}'
+            cursor.execute(f"SELECT COALESCE(MAX(AX{level}_Id), 0) FROM {table}")
+            first = cursor.fetchone()[0] + 1
+            ids = list(range(first, first + AXES_PAR_NIVEAU))
+            cursor.executemany(
+                f"INSERT INTO {table} (AX{level}_Id, AX{level}_Code, AX{level}_Intitule) VALUES (%s, %s, %s)",
+                [(ax_id, f'{PREFIX}{level}{ax_id:04d}', f'Axe {level} - {ax_id}') for ax_id in ids],
+            )
+            axes[level] = ids
+
+    comptes_par_societe = {}
+    for societe_id, pcl_id in PlanCompteLocal.objects.filter(
+        societe__code__startswith=PREFIX
+    ).values_list('societe_id', 'id').iterator(chunk_size=batch_size):
+        comptes_par_societe.setdefault(societe_id, []).append(pcl_id)
+
+    return {
+        'societes': [societe.id for societe in societes],
+        'comptes': comptes_par_societe,
+        'periodes': [p.id for p in periodes],
+        'stades': [stade.id for stade in stades],
+        'types_valeur': [tyv.id for tyv in types_valeur],
+        'axes': axes,
+    }
+
+
+def iter_faits(refs, rng, faits_par_periode):
+    """Génère les lignes de faits financiers (colonnes FAITS_COLUMNS).
+
+    Le solde est le cumul des montants du compte jusqu'à l'écriture incluse.
+    """
+    axes1, axes2, axes3 = refs['axes'][1], refs['axes'][2], refs['axes'][3]
+    soldes = {}
+    for per_id in refs['periodes']:
+        date = datetime(per_id // 100, per_id % 100, 1)
+        for soc_id in refs['societes']:
+            comptes = refs['comptes'][soc_id]
+            for _ in range(faits_par_periode):
+                pcl_id = rng.choice(comptes)
+                montant = round(rng.uniform(-50000, 50000), 2)
+                soldes[pcl_id] = round(soldes.get(pcl_id, 0) + montant, 2)
+                yield (
+                    per_id,
+                    rng.choice(refs['stades']),
+                    soc_id,
+                    None,
+                    None,
+                    pcl_id,
+                    rng.choice(refs['types_valeur']),
+                    rng.choice(axes1),
+                    rng.choice(axes2) if rng.random() < 0.7 else None,
+                    rng.choice(axes3) if rng.random() < 0.3 else None,
+                    montant,
+                    soldes[pcl_id],
+                    date,
+                )
+
+
+def insert_faits(rows, batch_size=DEFAULT_BATCH_SIZE, progress=None):
+    """Insère les faits par lots (fast_executemany avec pyodbc) et retourne le nombre de lignes."""
+    sql = (
+        f"INSERT INTO T_E_FinanceFaits_FIN ({', '.join(FAITS_COLUMNS)}) "
+        f"VALUES ({', '.join(['%s'] * len(FAITS_COLUMNS))})"
+    )
+    rows = iter(rows)
+    total = 0
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            break
+        with transaction.atomic(), connection.cursor() as cursor:
+            driver_cursor = _driver_cursor(cursor)
+            if hasattr(driver_cursor, 'fast_executemany'):
+                driver_cursor.fast_executemany = True
+            cursor.executemany(sql, batch)
+        total += len(batch)
+        if progress:
+            progress(total)
+    return total
+
+
+def iter_budget_rows(refs, rng, count, start_year, years):
+    """Génère `count` lignes de budget au format des 24 colonnes de T_Temp_ImportBudgetExcel."""
+    societes = list(
+        Societe.objects.filter(code__startswith=PREFIX).values_list('id', 'code', 'intitule')
+    )
+    comptes = {}
+    for soc_id, compte, intitule, plg_code, plg_intitule, nct_code, nct_intitule in PlanCompteLocal.objects.filter(
+        societe__code__startswith=PREFIX
+    ).values_list(
+        'societe_id', 'compte', 'intitule', 'groupe__code', 'groupe__intitule',
+        'groupe__nature_compte__code', 'groupe__nature_compte__intitule',
+    ).iterator(chunk_size=DEFAULT_BATCH_SIZE):
+        comptes.setdefault(soc_id, []).append((compte, intitule, plg_code, plg_intitule, nct_code, nct_intitule))
+    societes = [s for s in societes if s[0] in comptes]
+
+    for _ in range(count):
+        soc_id, soc_code, soc_nom = rng.choice(societes)
+        compte, intitule, plg_code, plg_intitule, nct_code, nct_intitule = rng.choice(comptes[soc_id])
+        yield (
+            soc_code, start_year + rng.randrange(years), 'BUDGET', compte, f'{PREFIX}1{rng.choice(refs["axes"][1]):04d}',
+            plg_code, None, None, rng.randint(1, 12), round(rng.uniform(-100000, 100000), 2),
+            soc_id, soc_nom, intitule, plg_code, plg_intitule, nct_intitule, nct_code,
+            None, None, None, None, None, None, TYPES_VALEUR[1][0],
+        )
+
+
+def write_budget_workbook(path, rows):
+    """Écrit un classeur Excel de budget (en-tête BUDGET_EXCEL_COLUMNS) en mode écriture seule."""
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('Budget')
+    sheet.append(BUDGET_EXCEL_COLUMNS)
+    for row in rows:
+        sheet.append(row)
+    workbook.save(path)
+
+
+def clear_dataset():
+    """Supprime les données générées (codes préfixés par GEN) et leurs faits financiers."""
+    soc_ids = list(Societe.objects.filter(code__startswith=PREFIX).values_list('id', flat=True))
+    with transaction.atomic(), connection.cursor() as cursor:
+        for i in range(0, len(soc_ids), 500):
+            chunk = soc_ids[i:i + 500]
+            cursor.execute(
+                f"DELETE FROM T_E_FinanceFaits_FIN WHERE SOC_Id IN ({', '.join(['%s'] * len(chunk))})", chunk
+            )
+        for level in (1, 2, 3):
+            cursor.execute(f"DELETE FROM T_E_Axe{level}_AX{level} WHERE AX{level}_Code LIKE %s", [f'{PREFIX}%'])
+        PlanCompteLocal.objects.filter(societe__code__startswith=PREFIX).delete()
+        Societe.objects.filter(code__startswith=PREFIX).delete()
+        PlanCompteGroupe.objects.filter(code__startswith=PREFIX).delete()
+        NatureCompte.objects.filter(code__in=[code for code, _ in NATURES]).delete()
+        Stade.objects.filter(intitule__in=STADES).delete()
+        TypeValeur.objects.filter(code__in=[code for code, _ in TYPES_VALEUR]).delete()
@@ -0,0 +1,296 @@
+"""
+Émulation SQLite des procédures stockées DW (mode DW_EMULATION)
+
+Le backend comptabilite.backends.sqlite_dw intercepte les `EXEC DW.PS_S_...`
+des vues et des imports et les redirige vers les fonctions de ce module, qui
+travaillent sur un schéma reproduisant les tables du DW (faits financiers,
+lots, axes, périodes, sources Sage/Exact et T_Temp_ImportBudgetExcel). Les
+mêmes points d'appel peuvent ainsi être mesurés sans SQL Server.
+
+Chaque procédure laisse sur le curseur le jeu de résultats qu'elle retourne
+(SELECT final), lu ensuite par fetchone/fetchmany comme avec SQL Server.
+"""
+import re
+from datetime import datetime
+
+
+SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS T_R_Periode_PER (
+        PER_Id INTEGER PRIMARY KEY,
+        PER_Date DATETIME,
+        PER_Annee INTEGER,
+        PER_Mois INTEGER,
+        PER_TrimestreCivil INTEGER
+    )""",
+    """CREATE TABLE IF NOT EXISTS T_E_PerimetreConso_PEC (
+        PEC_Id INTEGER PRIMARY KEY,
+        PEC_Code VARCHAR(50),
+        PEC_Libelle VARCHAR(255)
+    )""",
+    """CREATE TABLE IF NOT EXISTS T_J_PEC_SOC (
+        PECSOC_Id INTEGER PRIMARY KEY AUTOINCREMENT,
+        PEC_Id INTEGER NOT NULL,
+        SOC_Id INTEGER NOT NULL,
+        UNIQUE (PEC_Id, SOC_Id)
+    )""",
+    """CREATE TABLE IF NOT EXISTS T_E_Versions_VER (
+        VER_Id INTEGER PRIMARY KEY,
+        VER_Code VARCHAR(20) NOT NULL,
+        VER_Intitule VARCHAR(255),
+        SOC_Id INTEGER,
+        VER_Cloture BOOLEAN NOT NULL DEFAULT 0
+    )""",
+    """CREATE TABLE IF NOT EXISTS T_E_Lot_LOT (
+        LOT_Id INTEGER PRIMARY KEY AUTOINCREMENT,
+        LOT_Source VARCHAR(20) NOT NULL,
+        LOT_Libelle VARCHAR(255),
+        SOC_Id INTEGER,
+        STA_Id INTEGER,
+        VER_Id INTEGER,
+        PER_Id INTEGER,
+        LOT_Date DATETIME NOT NULL
+    )""",
+    """CREATE TABLE IF NOT EXISTS T_E_Axe1_AX1 (
+        AX1_Id INTEGER PRIMARY KEY,
+        AX1_Code VARCHAR(50) NOT NULL UNIQUE,
+        AX1_Intitule VARCHAR(255)
+    )""",
+    """CREATE TABLE IF NOT EXISTS T_E_Axe2_AX2 (
+        AX2_Id INTEGER PRIMARY KEY,
+        AX2_Code VARCHAR(50) NOT NULL UNIQUE,
+        AX2_Intitule VARCHAR(255)
+    )""",
+    """CREATE TABLE IF NOT EXISTS T_E_Axe3_AX3 (
+        AX3_Id INTEGER PRIMARY KEY,
+        AX3_Code VARCHAR(50) NOT NULL UNIQUE,
+        AX3_Intitule VARCHAR(255)
+    )""",
+    """CREATE TABLE IF NOT EXISTS T_E_FinanceFaits_FIN (
+        FIN_Id INTEGER PRIMARY KEY AUTOINCREMENT,
+        PER_Id INTEGER NOT NULL,
+        STA_Id INTEGER,
+        SOC_Id INTEGER NOT NULL,
+        VER_Id INTEGER,
+        LOT_Id INTEGER,
+        PCL_Id INTEGER NOT NULL,
+        TYV_Id INTEGER,
+        AX1_Id INTEGER,
+        AX2_Id INTEGER,
+        AX3_Id INTEGER,
+        FIN_Montant DECIMAL(18, 2) NOT NULL,
+        FIN_Solde DECIMAL(18, 2),
+        FIN_Date DATETIME
+    )""",
+    "CREATE INDEX IF NOT EXISTS IX_FIN_SOC_PER ON T_E_FinanceFaits_FIN (SOC_Id, PER_Id, STA_Id)",
+    "CREATE INDEX IF NOT EXISTS IX_FIN_PCL ON T_E_FinanceFaits_FIN (PCL_Id)",
+    "CREATE INDEX IF NOT EXISTS IX_FIN_LOT ON T_E_FinanceFaits_FIN (LOT_Id)",
+    """CREATE TABLE IF NOT EXISTS T_Temp_EcritureSage (
+        SOC_Id INTEGER NOT NULL,
+        Periode VARCHAR(6) NOT NULL,
+        CompteGeneral VARCHAR(20) NOT NULL,
+        Section1 VARCHAR(50),
+        Section2 VARCHAR(50),
+        Section3 VARCHAR(50),
+        TypeValeur VARCHAR(10),
+        Montant DECIMAL(18, 2) NOT NULL,
+        DateEcriture DATETIME
+    )""",
+    "CREATE INDEX IF NOT EXISTS IX_ECS_SOC_PER ON T_Temp_EcritureSage (SOC_Id, Periode)",
+    """CREATE TABLE IF NOT EXISTS T_Temp_EcritureExactOnline (
+        SOC_Id INTEGER NOT NULL,
+        Periode VARCHAR(6) NOT NULL,
+        CompteGeneral VARCHAR(20) NOT NULL,
+        Section1 VARCHAR(50),
+        Section2 VARCHAR(50),
+        Section3 VARCHAR(50),
+        TypeValeur VARCHAR(10),
+        Montant DECIMAL(18, 2) NOT NULL,
+        DateEcriture DATETIME
+    )""",
+    "CREATE INDEX IF NOT EXISTS IX_ECE_SOC_PER ON T_Temp_EcritureExactOnline (SOC_Id, Periode)",
+    """CREATE TABLE IF NOT EXISTS T_Temp_ImportBudgetExcel (
+        Societe NVARCHAR(4000), Annee NVARCHAR(4000), Version NVARCHAR(4000),
+        CompteGeneral NVARCHAR(4000), Section NVARCHAR(4000), GroupeCode NVARCHAR(4000),
+        RefactCode NVARCHAR(4000), Parametre NVARCHAR(4000), Periode NVARCHAR(4000),
+        Valeur NVARCHAR(4000), SOC_Id NVARCHAR(4000), SocieteNom NVARCHAR(4000),
+        CompteIntitule NVARCHAR(4000), PLG_Code NVARCHAR(4000), PLG_Intitule NVARCHAR(4000),
+        NCT_Intitule NVARCHAR(4000), NCT_Code NVARCHAR(4000), SIG_Code NVARCHAR(4000),
+        SIG_Intitule NVARCHAR(4000), TFT_code NVARCHAR(4000), TFT_Intitule NVARCHAR(4000),
+        BLN_code NVARCHAR(4000), BLN_Intitule NVARCHAR(4000), TypeValeur NVARCHAR(4000),
+        IMP_Lot VARCHAR(32)
+    )""",
+]
+
+EXEC_RE = re.compile(r'^\s*EXEC(?:UTE)?\s+(?:\[?DW\]?\.)?\[?(\w+)\]?\s*(.*)$', re.IGNORECASE | re.DOTALL)
+PARAM_RE = re.compile(r'@(\w+)\s*=\s*%s')
+
+# Sources des procédures d'insertion Sage / Exact Online
+SOURCE_TABLES = {
+    'sage': 'T_Temp_EcritureSage',
+    'exact': 'T_Temp_EcritureExactOnline',
+}
+
+SRE_SELECT = """
+    SELECT FIN.FIN_Id AS FIN_id, FIN.PER_Id AS PER_id, FIN.STA_Id AS STA_id, FIN.SOC_Id AS SOC_id,
+           TYV.TYV_code, PCL.PCL_Compte, PCL.PCL_Intitule,
+           AX1.AX1_Code, AX2.AX2_Code, AX3.AX3_Code,
+           FIN.FIN_Montant, FIN.FIN_Solde, FIN.LOT_Id AS LOT_id, FIN.FIN_Date
+    FROM T_E_FinanceFaits_FIN FIN
+    JOIN T_E_PlanCompteLocal_PCL PCL ON PCL.PCL_Id = FIN.PCL_Id
+    LEFT JOIN T_E_TypeValeur_TYV TYV ON TYV.TYV_Id = FIN.TYV_Id
+    LEFT JOIN T_E_Axe1_AX1 AX1 ON AX1.AX1_Id = FIN.AX1_Id
+    LEFT JOIN T_E_Axe2_AX2 AX2 ON AX2.AX2_Id = FIN.AX2_Id
+    LEFT JOIN T_E_Axe3_AX3 AX3 ON AX3.AX3_Id = FIN.AX3_Id
+"""
+
+
+# Colonnes ajoutées après la création de bases d'émulation existantes : (table, colonne, type, valeur initiale)
+ADDED_COLUMNS = [
+    ('T_E_FinanceFaits_FIN', 'FIN_Solde', 'DECIMAL(18, 2)', 'FIN_Montant'),
+    ('T_Temp_ImportBudgetExcel', 'IMP_Lot', 'VARCHAR(32)', None),
+]
+
+
+def create_schema(cursor):
+    """Crée les tables du DW absentes de la base SQLite et leurs colonnes ajoutées depuis."""
+    for statement in SCHEMA:
+        cursor.execute(statement)
+    for table, column, column_type, initial in ADDED_COLUMNS:
+        cursor.execute(f"PRAGMA table_info({table})")
+        if column not in {row[1] for row in cursor.fetchall()}:
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}")
+            if initial is not None:
+                cursor.execute(f"UPDATE {table} SET {column} = {initial}")
+
+
+def parse_exec(sql, params):
+    """Retourne (procédure, paramètres nommés) d'un `EXEC DW.xxx @a=%s, ...`, ou None."""
+    match = EXEC_RE.match(sql)
+    if not match:
+        return None
+    names = PARAM_RE.findall(match.group(2))
+    return match.group(1), dict(zip(names, params or []))
+
+
+def _periode_id(cursor, periode):
+    """Identifiant de période d'une période YYYYMM."""
+    periode = str(periode)
+    cursor.execute(
+        "SELECT PER_Id FROM T_R_Periode_PER WHERE PER_Annee = %s AND PER_Mois = %s",
+        [int(periode[:4]), int(periode[4:6])],
+    )
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def select_recherche_ecriture(cursor, per_id=None, sta_id=None, soc_id=None, tyv_id=None, pcl_compte=None,
+                              fin_solde=None, ax1_code=None, ax2_code=None, ax3_code=None, lb_error=None):
+    """DW.PS_S_000423_SelectRechercheEcriture_SRE : recherche des écritures (critères optionnels)."""
+    filters = [
+        ('FIN.PER_Id = %s', per_id),
+        ('FIN.STA_Id = %s', sta_id),
+        ('FIN.SOC_Id = %s', soc_id),
+        ('FIN.TYV_Id = %s', tyv_id),
+        ('PCL.PCL_Compte = %s', pcl_compte),
+        ('FIN.FIN_Solde = %s', fin_solde),
+        ('AX1.AX1_Code = %s', ax1_code),
+        ('AX2.AX2_Code = %s', ax2_code),
+        ('AX3.AX3_Code = %s', ax3_code),
+    ]
+    where = [clause for clause, value in filters if value is not None]
+    values = [value for _, value in filters if value is not None]
+    sql = SRE_SELECT
+    if where:
+        sql += ' WHERE ' + ' AND '.join(where)
+    cursor.execute(sql, values)
+
+
+def _insertion_faits(source, cursor, actualiser=None, socid=None, staid=None, periode=None, force=None,
+                     version=None, libelle=None):
+    """Insertion des écritures d'une source (Sage, Exact Online) pour une société et une période.
+
+    Le solde d'une écriture importée est son montant.
+    """
+    per_id = _periode_id(cursor, periode)
+    if per_id is None:
+        cursor.execute("SELECT 0 AS NbLignes, NULL AS LOT_Id, %s AS Message", [f'Période {periode} inconnue'])
+        return
+
+    if actualiser:
+        # Actualisation : les écritures déjà importées de cette source sont remplacées
+        cursor.execute(
+            "DELETE FROM T_E_FinanceFaits_FIN WHERE LOT_Id IN ("
+            "SELECT LOT_Id FROM T_E_Lot_LOT WHERE LOT_Source = %s AND SOC_Id = %s AND STA_Id = %s "
+            "AND PER_Id = %s AND (VER_Id = %s OR %s IS NULL))",
+            [source, socid, staid, per_id, version, version],
+        )
+
+    cursor.execute(
+        "INSERT INTO T_E_Lot_LOT (LOT_Source, LOT_Libelle, SOC_Id, STA_Id, VER_Id, PER_Id, LOT_Date) "
+        "VALUES (%s, %s, %s, %s, %s, %s, %s)",
+        [source, libelle or f'Import {source} {periode}', socid, staid, version, per_id, datetime.now()],
+    )
+    lot_id = cursor.lastrowid
+
+    cursor.execute(
+        f"""INSERT INTO T_E_FinanceFaits_FIN
+            (PER_Id, STA_Id, SOC_Id, VER_Id, LOT_Id, PCL_Id, TYV_Id, AX1_Id, AX2_Id, AX3_Id, FIN_Montant, FIN_Solde, FIN_Date)
+        SELECT %s, %s, SRC.SOC_Id, %s, %s, PCL.PCL_Id, TYV.TYV_Id, AX1.AX1_Id, AX2.AX2_Id, AX3.AX3_Id,
+               SRC.Montant, SRC.Montant, SRC.DateEcriture
+        FROM {SOURCE_TABLES[source]} SRC
+        JOIN T_E_PlanCompteLocal_PCL PCL ON PCL.PCL_Compte = SRC.CompteGeneral AND PCL.SOC_Id = SRC.SOC_Id
+        LEFT JOIN T_E_TypeValeur_TYV TYV ON TYV.TYV_code = SRC.TypeValeur
+        LEFT JOIN T_E_Axe1_AX1 AX1 ON AX1.AX1_Code = SRC.Section1
+        LEFT JOIN T_E_Axe2_AX2 AX2 ON AX2.AX2_Code = SRC.Section2
+        LEFT JOIN T_E_Axe3_AX3 AX3 ON AX3.AX3_Code = SRC.Section3
+        WHERE SRC.SOC_Id = %s AND SRC.Periode = %s""",
+        [per_id, staid, version, lot_id, socid, str(periode)],
+    )
+    inserted = cursor.rowcount
+    cursor.execute("SELECT %s AS NbLignes, %s AS LOT_Id, %s AS Message", [inserted, lot_id, 'OK'])
+
+
+def insertion_faits_financiers(cursor, **params):
+    """DW.PS_S_000104_InsertionFaitsFinanciers : import Sage."""
+    _insertion_faits('sage', cursor, **params)
+
+
+def insertion_faits_exact_online(cursor, **params):
+    """DW.PS_S_InsertionFaitsExactOnline_IFE : import Exact Online."""
+    _insertion_faits('exact', cursor, **params)
+
+
+def import_ecriture_fin(cursor, ver_id=None, lot_id=None, pcl_id=None, ax1_id=None, ax2_id=None, ax3_id=None,
+                        tyv_id=None, per_id=None, mtt=None):
+    """DW.PS_S_000203_ImportEcritureFIN : insertion d'une écriture (société déduite du compte, stade du lot)."""
+    cursor.execute(
+        """INSERT INTO T_E_FinanceFaits_FIN
+            (PER_Id, STA_Id, SOC_Id, VER_Id, LOT_Id, PCL_Id, TYV_Id, AX1_Id, AX2_Id, AX3_Id, FIN_Montant, FIN_Solde, FIN_Date)
+        SELECT %s, (SELECT STA_Id FROM T_E_Lot_LOT WHERE LOT_Id = %s), PCL.SOC_Id, %s, %s, PCL.PCL_Id,
+               %s, %s, %s, %s, %s, %s, %s
+        FROM T_E_PlanCompteLocal_PCL PCL WHERE PCL.PCL_Id = %s""",
+        [per_id, lot_id, ver_id, lot_id, tyv_id, ax1_id, ax2_id, ax3_id, mtt or 0, mtt or 0, datetime.now(), pcl_id],
+    )
+    fin_id = cursor.lastrowid if cursor.rowcount else None
+    cursor.execute("SELECT %s AS FIN_Id", [fin_id])
+
+
+PROCEDURES = {
+    'PS_S_000423_SelectRechercheEcriture_SRE': select_recherche_ecriture,
+    'PS_S_000104_InsertionFaitsFinanciers': insertion_faits_financiers,
+    'PS_S_InsertionFaitsExactOnline_IFE': insertion_faits_exact_online,
+    'PS_S_000203_ImportEcritureFIN': import_ecriture_fin,
+}
+
+
+def execute_procedure(cursor, sql, params):
+    """Exécute l'émulation d'un `EXEC DW.xxx` ; retourne False si la requête n'en est pas un."""
+    parsed = parse_exec(sql, params)
+    if parsed is None:
+        return False
+    name, named_params = parsed
+    procedure = PROCEDURES.get(name)
+    if procedure is None:
+        raise NotImplementedError(f'Procédure {name} non émulée')
+    procedure(cursor, **named_params)
+    return True
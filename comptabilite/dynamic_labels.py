@@ -1,7 +1,51 @@
+import threading
+import time
+
+from django.core.cache import cache
 from django.utils.translation import get_language
 from parametres.models import AdminText
 
 
+# Jeton de version partagé entre les processus (via le cache Django) : il change à chaque
+# modification d'un AdminText et force le rechargement des libellés dans tous les workers
+LABELS_VERSION_KEY = 'parametres:admintext:version'
+
+_labels_cache = {}
+_labels_lock = threading.Lock()
+
+
+def get_admin_texts(lang=None):
+    """Retourne les libellés (key, value, display_order) de la langue, avec repli sur le français.
+
+    Les libellés sont chargés une fois par langue et par processus, puis servis depuis la
+    mémoire tant que le jeton de version n'a pas changé.
+    """
+    lang = lang or get_language() or 'fr'
+    version = cache.get(LABELS_VERSION_KEY)
+    entry = _labels_cache.get(lang)
+    if entry is not None and entry[0] == version:
+        return entry[1]
+
+    items = list(AdminText.objects.filter(language=lang).values_list('key', 'value', 'display_order'))
+    if not items and lang != 'fr':
+        items = list(AdminText.objects.filter(language='fr').values_list('key', 'value', 'display_order'))
+    with _labels_lock:
+        _labels_cache[lang] = (version, items)
+    return items
+
+
+def get_labels(lang=None):
+    """Retourne le dictionnaire clé -> libellé de la langue courante."""
+    return {key: value for key, value, _ in get_admin_texts(lang)}
+
+
+def invalidate_labels(**kwargs):
+    """Invalide les libellés en mémoire dans ce processus et, via le jeton de version, dans les autres."""
+    with _labels_lock:
+        _labels_cache.clear()
+    cache.set(LABELS_VERSION_KEY, time.time_ns(), None)
+
+
 class DynamicLabelsMixin:
     """Mixin pour appliquer les libellés dynamiques aux modèles"""
     
@@ -10,12 +54,7 @@ class DynamicLabelsMixin:
         """Applique les libellés dynamiques au modèle"""
         try:
             # Récupérer les libellés pour la langue courante
-            lang = get_language() or 'fr'
-            items = AdminText.objects.filter(language=lang)
-            if not items.exists() and lang != 'fr':
-                items = AdminText.objects.filter(language='fr')
-            
-            labels = {row.key: row.value for row in items}
+            labels = get_labels()
             
             # Appliquer les libellés au modèle
             model_name = cls._meta.model_name
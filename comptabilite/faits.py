@@ -0,0 +1,125 @@
+"""
+Recherche des écritures par l'ORM sur les faits financiers (modèle FinanceFaits)
+
+Le queryset applique les critères de la recherche (valeurs uniques, listes, plages)
+sur les colonnes des faits et ne projette que les colonnes du résultat de la procédure
+SRE, sous les mêmes noms. La requête compilée est exécutée sur le curseur de
+l'appelant : le résultat se lit par lots `fetchmany` et en colonnes typées comme celui
+de la procédure.
+
+Le modèle FinanceFaits reprend le schéma du DW émulé (mode DW_EMULATION), non vérifié
+sur le DW : ce chemin n'est utilisé que si RECHERCHE_ORM_ENABLED est activé.
+"""
+from django.conf import settings
+from django.db.models import F
+
+from .models import FinanceFaits
+
+
+# Colonnes du résultat de la procédure SRE : nom -> chemin ORM
+RESULT_COLUMNS = {
+    'FIN_id': 'id',
+    'PER_id': 'periode_id',
+    'STA_id': 'stade_id',
+    'SOC_id': 'societe_id',
+    'TYV_code': 'type_valeur__code',
+    'PCL_Compte': 'compte__compte',
+    'PCL_Intitule': 'compte__intitule',
+    'AX1_Code': 'axe1__code',
+    'AX2_Code': 'axe2__code',
+    'AX3_Code': 'axe3__code',
+    'FIN_Montant': 'montant',
+    'FIN_Solde': 'solde',
+    'LOT_id': 'lot_id',
+    'FIN_Date': 'date',
+}
+
+# Colonnes chargées par la liste des écritures de l'API (only())
+LIST_FIELDS = [
+    'id', 'periode_id', 'stade_id', 'societe_id', 'version_id', 'lot_id', 'montant', 'solde', 'date',
+    'compte__compte', 'compte__intitule', 'type_valeur__code',
+    'axe1__code', 'axe2__code', 'axe3__code',
+]
+
+
+def search_queryset(params):
+    """Faits filtrés selon les paramètres de la recherche (voir recherche.build_sre_params)."""
+    queryset = FinanceFaits.objects.all()
+    filters = {}
+    if params.get('per_ids') == []:
+        # Plage sans période dans le référentiel : PER_Id n'est jamais nul, aucun résultat
+        filters['periode_id__isnull'] = True
+    elif params.get('per_ids') is not None:
+        filters['periode_id__in'] = params['per_ids']
+    elif params.get('per_id') is not None:
+        filters['periode_id'] = params['per_id']
+    if params.get('sta_id') is not None:
+        filters['stade_id'] = params['sta_id']
+    if params.get('soc_ids'):
+        filters['societe_id__in'] = params['soc_ids']
+    elif params.get('soc_id') is not None:
+        filters['societe_id'] = params['soc_id']
+    if params.get('tyv_ids'):
+        filters['type_valeur_id__in'] = params['tyv_ids']
+    elif params.get('tyv_id') is not None:
+        filters['type_valeur_id'] = params['tyv_id']
+    if params.get('pcl_compte') is not None:
+        filters['compte__compte'] = params['pcl_compte']
+    if params.get('compte_prefix') is not None:
+        # LIKE 'préfixe%' : recherche par intervalle sur l'index du compte
+        filters['compte__compte__startswith'] = params['compte_prefix']
+    if params.get('compte_min') is not None and params.get('compte_max') is not None:
+        filters['compte__compte__range'] = (params['compte_min'], params['compte_max'])
+    elif params.get('compte_min') is not None:
+        filters['compte__compte__gte'] = params['compte_min']
+    elif params.get('compte_max') is not None:
+        filters['compte__compte__lte'] = params['compte_max']
+    if params.get('fin_solde') is not None:
+        filters['solde'] = params['fin_solde']
+    if params.get('solde_min') is not None:
+        filters['solde__gte'] = params['solde_min']
+    if params.get('solde_max') is not None:
+        filters['solde__lte'] = params['solde_max']
+    for axe in (1, 2, 3):
+        if params.get(f'ax{axe}_code') is not None:
+            filters[f'axe{axe}__code'] = params[f'ax{axe}_code']
+    return queryset.filter(**filters)
+
+
+def result_queryset(params):
+    """Lignes de la recherche sous la forme du résultat de la procédure SRE (values())."""
+    return search_queryset(params).order_by().values(
+        **{name: F(path) for name, path in RESULT_COLUMNS.items()}
+    )
+
+
+def list_queryset(params):
+    """Faits de la liste de l'API : projection only() et jointures des libellés."""
+    return search_queryset(params).select_related(
+        'compte', 'type_valeur', 'axe1', 'axe2', 'axe3',
+    ).only(*LIST_FIELDS)
+
+
+def enabled():
+    """Vrai si la recherche par l'ORM est activée (RECHERCHE_ORM_ENABLED)."""
+    return getattr(settings, 'RECHERCHE_ORM_ENABLED', False)
+
+
+def is_scoped(params):
+    """Vrai si la recherche est restreinte à des sociétés et des périodes."""
+    return (
+        (params.get('soc_id') is not None or bool(params.get('soc_ids')))
+        and (params.get('per_id') is not None or params.get('per_ids') is not None)
+    )
+
+
+def handles(params):
+    """Vrai si une recherche simple passe par l'ORM plutôt que par la procédure (RECHERCHE_ORM_ENABLED)."""
+    return enabled() and is_scoped(params)
+
+
+def execute(cursor, params):
+    """Exécute la recherche sur le curseur et retourne la liste des colonnes du résultat."""
+    sql, values = result_queryset(params).query.get_compiler(connection=cursor.db).as_sql()
+    cursor.execute(sql, values)
+    return [col[0] for col in cursor.description]
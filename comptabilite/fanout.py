@@ -0,0 +1,88 @@
+"""
+Appels simultanés de la procédure SRE
+
+Plusieurs jeux de paramètres sont exécutés dans un pool de threads borné : chaque
+thread utilise sa propre connexion (empruntée au pool de connexions, voir pool.py) et
+son résultat est lu en colonnes typées. Utilisé par la comparaison N / N-1
+(comparaison.py).
+
+La recherche sur tout le groupe n'est pas répartie par société : l'ordre du résultat
+de PS_S_000423_SelectRechercheEcriture_SRE et les sociétés qu'elle parcourt sans
+société ne sont pas connus dans ce dépôt, une répartition ne pourrait donc pas
+garantir le résultat de l'appel unique.
+"""
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+
+from django.db import connection
+
+from . import columnar, recherche, timing
+
+
+class _Overflow(Exception):
+    """Le total des lignes lues dépasse la limite : les appels sont abandonnés."""
+
+
+class _RowBudget:
+    """Nombre de lignes lues par l'ensemble des threads, borné par `max_rows`."""
+
+    def __init__(self, max_rows):
+        self.max_rows = max_rows
+        self.count = 0
+        self.exceeded = threading.Event()
+        self._lock = threading.Lock()
+
+    def consume(self, batches):
+        for batch in batches:
+            if self.exceeded.is_set():
+                raise _Overflow()
+            if self.max_rows is not None:
+                with self._lock:
+                    self.count += len(batch)
+                    if self.count > self.max_rows:
+                        self.exceeded.set()
+                        raise _Overflow()
+            yield batch
+
+
+def _search(params, budget, request_timing):
+    """Appel de la procédure sur la connexion propre au thread (rendue au pool ensuite)."""
+    wrapper = connection.execute_wrapper(timing.QueryTimer(request_timing)) if request_timing else nullcontext()
+    try:
+        with wrapper, connection.cursor() as cursor:
+            columns, batches = recherche.execute_search(cursor, params)
+            if not columns:
+                return [], None
+            return columns, columnar.from_batches(columns, budget.consume(batches))
+    finally:
+        connection.close()
+
+
+def run_concurrently(param_sets, max_rows=None, max_workers=None):
+    """Exécute la procédure pour chaque jeu de paramètres, au plus `max_workers` appels à la fois.
+
+    Retourne la liste des (colonnes, ColumnarResult ou None) dans l'ordre de `param_sets`,
+    ou None si le total des lignes dépasse `max_rows`.
+    """
+    budget = _RowBudget(max_rows)
+    request_timing = timing.current()
+    max_workers = max(1, min(max_workers or len(param_sets), len(param_sets)))
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='sre-fanout') as executor:
+        # Un contexte par tâche : les instructions sont mesurées dans la requête en cours
+        futures = [
+            executor.submit(contextvars.copy_context().run, _search, params, budget, request_timing)
+            for params in param_sets
+        ]
+        try:
+            return [future.result() for future in futures]
+        except BaseException as e:
+            # Les autres threads s'arrêtent au lot suivant, les appels non commencés sont annulés
+            budget.exceeded.set()
+            for future in futures:
+                future.cancel()
+            if isinstance(e, _Overflow):
+                return None
+            raise
+
@@ -0,0 +1,235 @@
+"""
+Imports d'écritures : procédures d'insertion Sage/Exact, jobs d'import en arrière-plan
+et chargement des fichiers Excel de budget dans T_Temp_ImportBudgetExcel
+"""
+import uuid
+from datetime import datetime, timedelta, timezone as dt_timezone
+from itertools import islice
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from . import recherche_cache
+from .models import ImportJob
+
+
+BUDGET_EXCEL_TABLE = 'T_Temp_ImportBudgetExcel'
+BUDGET_EXCEL_COLUMNS = [
+    'Societe', 'Annee', 'Version', 'CompteGeneral', 'Section', 'GroupeCode',
+    'RefactCode', 'Parametre', 'Periode', 'Valeur', 'SOC_Id', 'SocieteNom',
+    'CompteIntitule', 'PLG_Code', 'PLG_Intitule', 'NCT_Intitule', 'NCT_Code',
+    'SIG_Code', 'SIG_Intitule', 'TFT_code', 'TFT_Intitule', 'BLN_code',
+    'BLN_Intitule', 'TypeValeur'
+]
+# Identifiant de l'import (new_staging_batch_id) porté par chaque ligne de T_Temp_ImportBudgetExcel
+BUDGET_EXCEL_BATCH_COLUMN = 'IMP_Lot'
+DEFAULT_BATCH_SIZE = 1000
+STAGING_TIMESTAMP_FORMAT = '%Y%m%d%H%M%S'
+
+IMPORT_PROCEDURES = {
+    'sage': 'DW.PS_S_000104_InsertionFaitsFinanciers',
+    'exact': 'DW.PS_S_InsertionFaitsExactOnline_IFE',
+}
+
+
+def execute_import_procedure(import_type, actualiser, societe_id, stade_id, periode, version_id, libelle):
+    """Exécute la procédure d'insertion Sage ou Exact et retourne sa première ligne de résultat."""
+    procedure = IMPORT_PROCEDURES['sage' if import_type == 'sage' else 'exact']
+    sql = (
+        f"EXEC {procedure} @actualiser=%s, @socid=%s, @staid=%s, @periode=%s, "
+        "@force=%s, @version=%s, @libelle=%s"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [
+            actualiser,
+            int(societe_id),
+            int(stade_id),
+            periode,
+            True,  # force
+            version_id,
+            libelle or ''
+        ])
+        # Récupérer le résultat si la procédure retourne quelque chose
+        result = cursor.fetchone() if cursor.description else None
+
+    # La période est au format YYYYMM : toutes les recherches de la société sont invalidées
+    recherche_cache.invalidate(soc_id=int(societe_id))
+    return list(result) if result else None
+
+
+STALE_JOB_ERROR = "Job interrompu : le worker s'est arrêté pendant l'import (aucun résultat après {minutes} minutes)"
+
+
+def fail_stale_jobs(stale_after=None):
+    """Passe en erreur les jobs en cours depuis plus de `stale_after` minutes (IMPORT_JOB_STALE_AFTER).
+
+    Un worker arrêté pendant l'import (plantage, arrêt forcé) laisse son job en cours :
+    il n'est pas remis en attente, la procédure ayant pu insérer une partie des écritures.
+    Retourne le nombre de jobs passés en erreur.
+    """
+    if stale_after is None:
+        stale_after = getattr(settings, 'IMPORT_JOB_STALE_AFTER', 120)
+    if not stale_after:
+        return 0
+    now = timezone.now()
+    return ImportJob.objects.filter(
+        statut=ImportJob.STATUT_EN_COURS, date_debut__lt=now - timedelta(minutes=stale_after),
+    ).update(
+        statut=ImportJob.STATUT_ERREUR,
+        erreur=STALE_JOB_ERROR.format(minutes=stale_after),
+        date_fin=now,
+    )
+
+
+def claim_next_job():
+    """Réserve le plus ancien job en attente, ou retourne None s'il n'y en a pas.
+
+    La réservation passe par un UPDATE conditionnel sur le statut : si plusieurs
+    workers tournent, un job n'est exécuté que par un seul d'entre eux. Les jobs
+    abandonnés par un worker arrêté sont d'abord passés en erreur (fail_stale_jobs).
+    """
+    fail_stale_jobs()
+    pending = ImportJob.objects.filter(statut=ImportJob.STATUT_EN_ATTENTE).order_by('id')
+    for job_id in pending.values_list('id', flat=True)[:10]:
+        claimed = ImportJob.objects.filter(id=job_id, statut=ImportJob.STATUT_EN_ATTENTE).update(
+            statut=ImportJob.STATUT_EN_COURS,
+            date_debut=timezone.now(),
+        )
+        if claimed:
+            return ImportJob.objects.get(id=job_id)
+    return None
+
+
+def run_job(job):
+    """Exécute un job d'import réservé et enregistre son résultat."""
+    try:
+        job.resultat = execute_import_procedure(job.type_import, **job.parametres)
+        job.statut = ImportJob.STATUT_TERMINE
+    except Exception as e:
+        job.erreur = str(e)
+        job.statut = ImportJob.STATUT_ERREUR
+    job.date_fin = timezone.now()
+    job.save(update_fields=['resultat', 'erreur', 'statut', 'date_fin'])
+    return job
+
+
+def iter_excel_rows(file):
+    """Lit la première feuille d'un classeur ligne par ligne (en-tête compris).
+
+    Les fichiers .xlsx sont lus par openpyxl en lecture seule, sans charger le classeur
+    en mémoire. Les anciens fichiers .xls, non supportés par openpyxl, sont lus par pandas.
+    """
+    if file.name.lower().endswith('.xls'):
+        import pandas as pd
+        yield from pd.read_excel(file, header=None).itertuples(index=False, name=None)
+        return
+
+    from openpyxl import load_workbook
+    workbook = load_workbook(file, read_only=True, data_only=True)
+    try:
+        yield from workbook.worksheets[0].iter_rows(values_only=True)
+    finally:
+        workbook.close()
+
+
+def budget_rows(rows):
+    """Convertit les lignes lues en lignes de 24 valeurs texte (None pour les cellules vides).
+
+    Les lignes entièrement vides sont ignorées.
+    """
+    width = len(BUDGET_EXCEL_COLUMNS)
+    for row in rows:
+        # value != value : cellule NaN lue par pandas
+        values = [None if value is None or value != value else str(value) for value in row[:width]]
+        if all(value is None for value in values):
+            continue
+        values.extend([None] * (width - len(values)))
+        yield tuple(values)
+
+
+def _driver_cursor(cursor):
+    """Curseur du pilote sous-jacent au curseur Django (pyodbc pour SQL Server)."""
+    backend_cursor = cursor.cursor
+    return getattr(backend_cursor, 'cursor', backend_cursor)
+
+
+def new_staging_batch_id():
+    """Identifiant d'import : horodatage (ordre chronologique, pour la purge) suivi d'un suffixe aléatoire."""
+    return f"{datetime.now(dt_timezone.utc).strftime(STAGING_TIMESTAMP_FORMAT)}_{uuid.uuid4().hex[:8]}"
+
+
+def _delete_staging_rows(where, params):
+    """Supprime les lignes de T_Temp_ImportBudgetExcel vérifiant `where` et retourne leur nombre.
+
+    Si ce sont les seules lignes de la table, elle est vidée par TRUNCATE TABLE (sans
+    journaliser chaque ligne) ; sinon les lignes sont supprimées par un DELETE sur l'index
+    de IMP_Lot. Sur SQL Server, la table est verrouillée le temps de la vérification pour
+    qu'un autre import ne soit pas vidé avec elle.
+    """
+    microsoft = connection.vendor == 'microsoft'
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT COUNT(*), COUNT(CASE WHEN {where} THEN 1 END) FROM {BUDGET_EXCEL_TABLE}"
+            + (" WITH (TABLOCKX, HOLDLOCK)" if microsoft else ""),
+            params,
+        )
+        total, matching = cursor.fetchone()
+        if not matching:
+            return 0
+        if matching == total:
+            # TRUNCATE n'existe pas sous SQLite (émulation) : DELETE sans WHERE y est optimisé de même
+            cursor.execute(f"TRUNCATE TABLE {BUDGET_EXCEL_TABLE}" if microsoft else f"DELETE FROM {BUDGET_EXCEL_TABLE}")
+            return total
+        cursor.execute(f"DELETE FROM {BUDGET_EXCEL_TABLE} WHERE {where}", params)
+        return cursor.rowcount
+
+
+def delete_staging_batch(batch_id):
+    """Supprime les lignes d'un import de T_Temp_ImportBudgetExcel et retourne leur nombre."""
+    return _delete_staging_rows(f"{BUDGET_EXCEL_BATCH_COLUMN} = %s", [batch_id])
+
+
+def purge_staging_batches(max_age_hours=24):
+    """Supprime les lignes des imports plus anciens que `max_age_hours` et retourne leur nombre.
+
+    Les identifiants d'import commencent par leur horodatage : la comparaison des
+    chaînes suit l'ordre chronologique. Les lignes sans identifiant ne sont pas touchées.
+    """
+    limit = (timezone.now() - timedelta(hours=max_age_hours)).astimezone(dt_timezone.utc)
+    return _delete_staging_rows(f"{BUDGET_EXCEL_BATCH_COLUMN} < %s", [limit.strftime(STAGING_TIMESTAMP_FORMAT)])
+
+
+def bulk_insert_budget_rows(rows, batch_id=None, batch_size=None):
+    """Insère les lignes dans T_Temp_ImportBudgetExcel par lots et retourne le nombre de lignes.
+
+    Avec `batch_id`, chaque ligne porte l'identifiant de l'import (colonne IMP_Lot).
+    Avec pyodbc, chaque lot est envoyé en un seul aller-retour grâce à fast_executemany.
+    La taille des lots est définie par IMPORT_EXCEL_BATCH_SIZE.
+    """
+    batch_size = batch_size or getattr(settings, 'IMPORT_EXCEL_BATCH_SIZE', DEFAULT_BATCH_SIZE)
+    columns = list(BUDGET_EXCEL_COLUMNS)
+    if batch_id is not None:
+        columns.append(BUDGET_EXCEL_BATCH_COLUMN)
+        rows = (row + (batch_id,) for row in rows)
+    width = len(columns)
+    sql = (
+        f"INSERT INTO {BUDGET_EXCEL_TABLE} ({', '.join(columns)}) "
+        f"VALUES ({', '.join(['%s'] * width)})"
+    )
+    rows = iter(rows)
+    total = 0
+    with transaction.atomic(), connection.cursor() as cursor:
+        driver_cursor = _driver_cursor(cursor)
+        if hasattr(driver_cursor, 'fast_executemany'):
+            import pyodbc
+            driver_cursor.fast_executemany = True
+            # Types fixés à l'avance : une première ligne avec des valeurs nulles ne doit pas fausser la liaison
+            driver_cursor.setinputsizes([(pyodbc.SQL_WVARCHAR, 4000, 0)] * width)
+        while True:
+            batch = list(islice(rows, batch_size))
+            if not batch:
+                break
+            cursor.executemany(sql, batch)
+            total += len(batch)
+    return total
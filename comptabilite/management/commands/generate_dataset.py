@@ -0,0 +1,82 @@
+import os
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from comptabilite import dataset
+from comptabilite.models import Societe
+
+
+class Command(BaseCommand):
+    help = (
+        "Génère un jeu de données synthétique reproductible (sociétés, plan comptable, périodes, "
+        "faits financiers) et des classeurs Excel de budget pour les tests de charge"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=int, default=1,
+                            help="Échelle : 10 sociétés et 1 000 comptes locaux par unité (défaut : 1)")
+        parser.add_argument('--seed', type=int, default=42, help="Graine aléatoire (défaut : 42)")
+        parser.add_argument('--start-year', type=int, default=2022, help="Première année générée (défaut : 2022)")
+        parser.add_argument('--years', type=int, default=3, help="Nombre d'années de périodes (défaut : 3)")
+        parser.add_argument('--faits-par-periode', type=int, default=dataset.DEFAULT_FAITS_PAR_PERIODE,
+                            help="Faits financiers par société et par période (défaut : %(default)s, 0 : aucun)")
+        parser.add_argument('--batch-size', type=int, default=dataset.DEFAULT_BATCH_SIZE,
+                            help="Lignes par lot d'insertion (défaut : %(default)s)")
+        parser.add_argument('--excel-dir', help="Répertoire des classeurs de budget générés (aucun si absent)")
+        parser.add_argument('--excel-rows', default='1000,10000,100000',
+                            help="Tailles des classeurs, séparées par des virgules (défaut : %(default)s)")
+        parser.add_argument('--clear', action='store_true',
+                            help="Supprime d'abord les données générées précédemment")
+
+    def handle(self, *args, **options):
+        if options['scale'] < 1:
+            raise CommandError("--scale doit être supérieur ou égal à 1")
+        try:
+            excel_sizes = [int(size) for size in options['excel_rows'].split(',') if size.strip()]
+        except ValueError:
+            raise CommandError("--excel-rows doit être une liste d'entiers séparés par des virgules")
+
+        if options['clear']:
+            dataset.clear_dataset()
+            self.stdout.write("Données générées précédemment supprimées")
+        elif Societe.objects.filter(code__startswith=dataset.PREFIX).exists():
+            raise CommandError("Des données générées existent déjà : relancer avec --clear")
+
+        rng = random.Random(options['seed'])
+        start = time.perf_counter()
+        refs = dataset.generate_referentiels(
+            options['scale'], rng, options['start_year'], options['years'], options['batch_size']
+        )
+        nb_comptes = sum(len(comptes) for comptes in refs['comptes'].values())
+        self.stdout.write(
+            f"Référentiels : {len(refs['societes'])} sociétés, {nb_comptes} comptes locaux, "
+            f"{len(refs['periodes'])} périodes ({time.perf_counter() - start:.1f} s)"
+        )
+
+        if options['faits_par_periode'] > 0:
+            expected = len(refs['societes']) * len(refs['periodes']) * options['faits_par_periode']
+            step = max(expected // 20, options['batch_size'])
+            start = time.perf_counter()
+
+            def progress(total):
+                if total % step < options['batch_size']:
+                    elapsed = time.perf_counter() - start
+                    self.stdout.write(f"  {total}/{expected} faits ({total / elapsed:.0f} lignes/s)")
+
+            total = dataset.insert_faits(
+                dataset.iter_faits(refs, rng, options['faits_par_periode']), options['batch_size'], progress
+            )
+            self.stdout.write(f"Faits financiers : {total} lignes ({time.perf_counter() - start:.1f} s)")
+
+        if options['excel_dir']:
+            os.makedirs(options['excel_dir'], exist_ok=True)
+            for size in excel_sizes:
+                path = os.path.join(options['excel_dir'], f'budget_{size}.xlsx')
+                dataset.write_budget_workbook(
+                    path, dataset.iter_budget_rows(refs, rng, size, options['start_year'], options['years'])
+                )
+                self.stdout.write(f"Classeur de budget : {path} ({size} lignes)")
+
+        self.stdout.write(self.style.SUCCESS("Jeu de données généré"))
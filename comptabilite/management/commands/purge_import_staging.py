@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from comptabilite import imports
+
+
+class Command(BaseCommand):
+    help = "Supprime de T_Temp_ImportBudgetExcel les lignes des imports Excel plus anciens que le délai indiqué"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--max-age-hours',
+            type=float,
+            default=24,
+            help="Âge maximal en heures des imports conservés (défaut : 24)",
+        )
+
+    def handle(self, *args, **options):
+        deleted = imports.purge_staging_batches(options['max_age_hours'])
+        self.stdout.write(self.style.SUCCESS(f"{deleted} ligne(s) de staging supprimée(s)"))
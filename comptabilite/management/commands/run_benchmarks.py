@@ -0,0 +1,83 @@
+import json
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from comptabilite import benchmarks
+from comptabilite.models import ImportJob
+
+
+class Command(BaseCommand):
+    help = (
+        "Mesure les chemins critiques (pages, recherche, imports, API REST, admin) : percentiles, "
+        "requêtes SQL et pic mémoire, avec export JSON et comparaison à une mesure de référence"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=benchmarks.DEFAULT_ITERATIONS,
+                            help="Exécutions mesurées par scénario (défaut : %(default)s)")
+        parser.add_argument('--warmup', type=int, default=benchmarks.DEFAULT_WARMUP,
+                            help="Exécutions de chauffe non mesurées (défaut : %(default)s)")
+        parser.add_argument('--only', help="Scénarios à exécuter : préfixes de noms séparés par des virgules")
+        parser.add_argument('--excel-sizes', default=','.join(map(str, benchmarks.DEFAULT_EXCEL_SIZES)),
+                            help="Tailles des classeurs importés, séparées par des virgules (défaut : %(default)s)")
+        parser.add_argument('--excel-dir', help="Répertoire des classeurs de budget (réutilisés s'ils existent)")
+        parser.add_argument('--output', help="Fichier JSON des résultats (défaut : bench_results/<date>_<commit>.json)")
+        parser.add_argument('--compare', help="Fichier JSON de référence à comparer")
+        parser.add_argument('--threshold', type=float, default=10.0,
+                            help="Écart du p50 (en %%) au-delà duquel un scénario est signalé (défaut : %(default)s)")
+        parser.add_argument('--username', default='benchmark', help="Superuser utilisé (créé si absent)")
+
+    def handle(self, *args, **options):
+        try:
+            excel_sizes = [int(size) for size in options['excel_sizes'].split(',') if size.strip()]
+        except ValueError:
+            raise CommandError("--excel-sizes doit être une liste d'entiers séparés par des virgules")
+        baseline = None
+        if options['compare']:
+            with open(options['compare'], encoding='utf-8') as f:
+                baseline = json.load(f)
+
+        last_job_id = ImportJob.objects.order_by('-id').values_list('id', flat=True).first() or 0
+        results = {'environment': benchmarks.environment(), 'scenarios': {}}
+
+        # Le client de test utilise l'hôte « testserver »
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+            client = benchmarks.create_client(options['username'])
+            scenarios = benchmarks.build_scenarios(excel_sizes, options['excel_dir'])
+            if options['only']:
+                prefixes = [p.strip() for p in options['only'].split(',') if p.strip()]
+                scenarios = [s for s in scenarios if s.name.startswith(tuple(prefixes))]
+            try:
+                for scenario in scenarios:
+                    stats = benchmarks.run_scenario(scenario, client, options['iterations'], options['warmup'])
+                    results['scenarios'][scenario.name] = stats
+                    self.stdout.write(
+                        f"{scenario.name:<45} p50 {stats['p50_ms']:9.1f} ms  p95 {stats['p95_ms']:9.1f} ms  "
+                        f"{stats['queries']:4d} req.  {stats['peak_memory_kb']:9.0f} Ko  [{stats['status']}]"
+                    )
+            finally:
+                # Jobs d'import soumis par les scénarios : ne pas les laisser au worker
+                ImportJob.objects.filter(id__gt=last_job_id).delete()
+
+        output = options['output'] or os.path.join(
+            'bench_results', f"{results['environment']['date'].replace(':', '')}_{results['environment']['commit'] or 'local'}.json"
+        )
+        os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+        self.stdout.write(self.style.SUCCESS(f"Résultats écrits dans {output}"))
+
+        if baseline:
+            regressions = 0
+            for name, before, after, delta, regression in benchmarks.compare(results, baseline, threshold=options['threshold']):
+                line = f"{name:<45} {before:9.1f} -> {after:9.1f} ms  ({delta:+.1f} %)"
+                if regression:
+                    regressions += 1
+                    self.stdout.write(self.style.WARNING(line))
+                else:
+                    self.stdout.write(line)
+            if regressions:
+                self.stdout.write(self.style.WARNING(f"{regressions} scénario(s) en régression (p50 > {options['threshold']} %)"))
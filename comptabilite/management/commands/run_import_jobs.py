@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from comptabilite import imports, workers
+
+
+class Command(BaseCommand):
+    help = "Exécute les jobs d'import Sage/Exact en attente (worker)"
+
+    def add_arguments(self, parser):
+        workers.add_arguments(parser, interval=2.0, job_label='jobs')
+
+    def handle(self, *args, **options):
+        self.stdout.write("Worker d'import démarré")
+        workers.run_worker(
+            imports.claim_next_job,
+            imports.run_job,
+            options['interval'],
+            once=options['once'],
+            started=lambda job: self.stdout.write(f"Exécution du job #{job.id} ({job.type_import})"),
+            finished=self.report,
+        )
+        self.stdout.write("Worker d'import arrêté")
+
+    def report(self, job):
+        if job.statut == job.STATUT_TERMINE:
+            self.stdout.write(self.style.SUCCESS(f"Job #{job.id} terminé en {job.duree:.1f}s"))
+        else:
+            self.stdout.write(self.style.ERROR(f"Job #{job.id} en erreur : {job.erreur}"))
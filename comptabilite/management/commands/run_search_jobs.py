@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from comptabilite import search_jobs, workers
+
+
+class Command(BaseCommand):
+    help = "Exécute les recherches d'écritures soumises en arrière-plan (worker)"
+
+    def add_arguments(self, parser):
+        workers.add_arguments(parser, interval=1.0, job_label='recherches')
+
+    def handle(self, *args, **options):
+        self.stdout.write("Worker de recherche démarré")
+        workers.run_worker(
+            search_jobs.claim_next_job,
+            search_jobs.run_job,
+            options['interval'],
+            once=options['once'],
+            started=lambda job: self.stdout.write(f"Exécution de la recherche #{job.id}"),
+            finished=self.report,
+        )
+        self.stdout.write("Worker de recherche arrêté")
+
+    def report(self, job):
+        if job.statut == job.STATUT_TERMINE:
+            self.stdout.write(self.style.SUCCESS(
+                f"Recherche #{job.id} terminée en {job.duree:.1f}s ({job.nb_lignes} lignes)"
+            ))
+        else:
+            self.stdout.write(self.style.ERROR(f"Recherche #{job.id} {job.get_statut_display().lower()} : {job.erreur}"))
@@ -1,6 +1,11 @@
-from django.utils.translation import get_language
+from contextlib import ExitStack
+
 from django.apps import apps
-from parametres.models import AdminText
+from django.conf import settings
+from django.db import connections
+
+from . import timing
+from .dynamic_labels import get_labels
 
 
 class AdminLabelMiddleware:
@@ -8,6 +13,8 @@ class AdminLabelMiddleware:
     
     def __init__(self, get_response):
         self.get_response = get_response
+        # Libellés déjà appliqués : inutile de reparcourir les modèles tant qu'ils n'ont pas changé
+        self._applied_labels = None
 
     def __call__(self, request):
         # Appliquer les libellés dynamiques si on est dans l'admin
@@ -20,13 +27,10 @@ class AdminLabelMiddleware:
     def _apply_dynamic_labels(self):
         """Applique les libellés dynamiques aux modèles"""
         try:
-            # Récupérer les libellés pour la langue courante
-            lang = get_language() or 'fr'
-            items = AdminText.objects.filter(language=lang)
-            if not items.exists() and lang != 'fr':
-                items = AdminText.objects.filter(language='fr')
-            
-            labels = {row.key: row.value for row in items}
+            # Récupérer les libellés pour la langue courante (depuis le cache en mémoire)
+            labels = get_labels()
+            if labels == self._applied_labels:
+                return
             
             # Appliquer les libellés à tous les modèles de toutes les applications
             for app_config in apps.get_app_configs():
@@ -42,7 +46,40 @@ class AdminLabelMiddleware:
                     single_key = f"model.{model_name}.name_single"
                     if single_key in labels:
                         model._meta.verbose_name = labels[single_key]
+            
+            self._applied_labels = labels
                 
         except Exception as e:
             # En cas d'erreur, continuer avec les libellés par défaut
             pass
+
+
+class SqlTimingMiddleware:
+    """Middleware qui chronomètre les instructions SQL et le rendu de chaque requête
+
+    Ajoute l'entête Server-Timing (db, render, total) et journalise les appels lents
+    (voir timing.py). Les requêtes exécutées pendant la transmission d'une réponse en
+    flux (StreamingHttpResponse) ne sont pas mesurées.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.SQL_TIMING_ENABLED:
+            return self.get_response(request)
+
+        request_timing = timing.RequestTiming()
+        token = timing.activate(request_timing)
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(timing.QueryTimer(request_timing, request)))
+                response = self.get_response(request)
+        finally:
+            timing.deactivate(token)
+
+        if settings.SERVER_TIMING_HEADER:
+            response['Server-Timing'] = request_timing.server_timing()
+        return response
+
@@ -0,0 +1,38 @@
+# Generated by Django 5.0.6 on 2026-10-18 14:14
+
+import django.core.serializers.json
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('comptabilite', '0006_devise_delete_admintext_remove_societe_devise_id_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportJob',
+            fields=[
+                ('id', models.AutoField(db_column='IMJ_Id', primary_key=True, serialize=False, verbose_name='ID')),
+                ('type_import', models.CharField(db_column='IMJ_Type', max_length=10, verbose_name="Type d'import")),
+                ('statut', models.CharField(choices=[('pending', 'En attente'), ('running', 'En cours'), ('success', 'Terminé'), ('error', 'En erreur')], db_column='IMJ_Statut', db_index=True, default='pending', max_length=10, verbose_name='Statut')),
+                ('parametres', models.JSONField(db_column='IMJ_Parametres', encoder=django.core.serializers.json.DjangoJSONEncoder, verbose_name='Paramètres')),
+                ('resultat', models.JSONField(blank=True, db_column='IMJ_Resultat', encoder=django.core.serializers.json.DjangoJSONEncoder, null=True, verbose_name='Résultat')),
+                ('erreur', models.TextField(blank=True, db_column='IMJ_Erreur', null=True, verbose_name='Erreur')),
+                ('date_creation', models.DateTimeField(auto_now_add=True, db_column='IMJ_DateCreation', verbose_name='Date de création')),
+                ('date_debut', models.DateTimeField(blank=True, db_column='IMJ_DateDebut', null=True, verbose_name='Date de début')),
+                ('date_fin', models.DateTimeField(blank=True, db_column='IMJ_DateFin', null=True, verbose_name='Date de fin')),
+                ('utilisateur', models.ForeignKey(blank=True, db_column='USR_Id', null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL, verbose_name='Utilisateur')),
+            ],
+            options={
+                'verbose_name': "Job d'import",
+                'verbose_name_plural': "Jobs d'import",
+                'db_table': 'T_E_ImportJob_IMJ',
+                'ordering': ['-date_creation'],
+            },
+        ),
+    ]
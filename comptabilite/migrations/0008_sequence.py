@@ -0,0 +1,25 @@
+# Generated by Django 5.0.6 on 2026-10-18 14:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('comptabilite', '0007_importjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Sequence',
+            fields=[
+                ('nom', models.CharField(db_column='SEQ_Nom', max_length=128, primary_key=True, serialize=False, verbose_name='Table')),
+                ('valeur', models.BigIntegerField(db_column='SEQ_Valeur', default=0, verbose_name='Dernier identifiant réservé')),
+            ],
+            options={
+                'verbose_name': 'Séquence',
+                'verbose_name_plural': 'Séquences',
+                'db_table': 'T_E_Sequence_SEQ',
+            },
+        ),
+    ]
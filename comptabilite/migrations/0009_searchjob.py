@@ -0,0 +1,39 @@
+# Generated by Django 5.0.6 on 2026-10-18 14:35
+
+import django.core.serializers.json
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('comptabilite', '0008_sequence'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchJob',
+            fields=[
+                ('id', models.AutoField(db_column='SRJ_Id', primary_key=True, serialize=False, verbose_name='ID')),
+                ('statut', models.CharField(choices=[('pending', 'En attente'), ('running', 'En cours'), ('success', 'Terminé'), ('error', 'En erreur'), ('cancelled', 'Annulé'), ('timeout', 'Délai dépassé')], db_column='SRJ_Statut', db_index=True, default='pending', max_length=10, verbose_name='Statut')),
+                ('parametres', models.JSONField(db_column='SRJ_Parametres', encoder=django.core.serializers.json.DjangoJSONEncoder, verbose_name='Paramètres')),
+                ('nb_lignes', models.IntegerField(blank=True, db_column='SRJ_NbLignes', null=True, verbose_name='Nombre de lignes')),
+                ('erreur', models.TextField(blank=True, db_column='SRJ_Erreur', null=True, verbose_name='Erreur')),
+                ('annulation_demandee', models.BooleanField(db_column='SRJ_AnnulationDemandee', default=False, verbose_name='Annulation demandée')),
+                ('date_creation', models.DateTimeField(auto_now_add=True, db_column='SRJ_DateCreation', verbose_name='Date de création')),
+                ('date_debut', models.DateTimeField(blank=True, db_column='SRJ_DateDebut', null=True, verbose_name='Date de début')),
+                ('date_fin', models.DateTimeField(blank=True, db_column='SRJ_DateFin', null=True, verbose_name='Date de fin')),
+                ('date_consultation', models.DateTimeField(blank=True, db_column='SRJ_DateConsultation', null=True, verbose_name='Dernière consultation')),
+                ('utilisateur', models.ForeignKey(blank=True, db_column='USR_Id', null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL, verbose_name='Utilisateur')),
+            ],
+            options={
+                'verbose_name': 'Recherche en arrière-plan',
+                'verbose_name_plural': 'Recherches en arrière-plan',
+                'db_table': 'T_E_SearchJob_SRJ',
+                'ordering': ['-date_creation'],
+            },
+        ),
+    ]
@@ -0,0 +1,74 @@
+# Generated by Django 5.0.6 on 2026-10-18 14:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('comptabilite', '0009_searchjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Axe1',
+            fields=[
+                ('id', models.IntegerField(db_column='AX1_Id', primary_key=True, serialize=False, verbose_name='ID')),
+                ('code', models.CharField(db_column='AX1_Code', max_length=50, unique=True, verbose_name='Code')),
+                ('intitule', models.CharField(blank=True, db_column='AX1_Intitule', max_length=255, null=True, verbose_name='Intitulé')),
+            ],
+            options={
+                'verbose_name': 'Axe 1',
+                'verbose_name_plural': 'Axes 1',
+                'db_table': 'T_E_Axe1_AX1',
+                'ordering': ['code'],
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='Axe2',
+            fields=[
+                ('id', models.IntegerField(db_column='AX2_Id', primary_key=True, serialize=False, verbose_name='ID')),
+                ('code', models.CharField(db_column='AX2_Code', max_length=50, unique=True, verbose_name='Code')),
+                ('intitule', models.CharField(blank=True, db_column='AX2_Intitule', max_length=255, null=True, verbose_name='Intitulé')),
+            ],
+            options={
+                'verbose_name': 'Axe 2',
+                'verbose_name_plural': 'Axes 2',
+                'db_table': 'T_E_Axe2_AX2',
+                'ordering': ['code'],
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='Axe3',
+            fields=[
+                ('id', models.IntegerField(db_column='AX3_Id', primary_key=True, serialize=False, verbose_name='ID')),
+                ('code', models.CharField(db_column='AX3_Code', max_length=50, unique=True, verbose_name='Code')),
+                ('intitule', models.CharField(blank=True, db_column='AX3_Intitule', max_length=255, null=True, verbose_name='Intitulé')),
+            ],
+            options={
+                'verbose_name': 'Axe 3',
+                'verbose_name_plural': 'Axes 3',
+                'db_table': 'T_E_Axe3_AX3',
+                'ordering': ['code'],
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='FinanceFaits',
+            fields=[
+                ('id', models.BigAutoField(db_column='FIN_Id', primary_key=True, serialize=False, verbose_name='ID')),
+                ('version_id', models.IntegerField(blank=True, db_column='VER_Id', null=True, verbose_name='Version')),
+                ('lot_id', models.IntegerField(blank=True, db_column='LOT_Id', null=True, verbose_name='Lot')),
+                ('montant', models.DecimalField(db_column='FIN_Montant', decimal_places=2, max_digits=18, verbose_name='Montant')),
+                ('date', models.DateTimeField(blank=True, db_column='FIN_Date', null=True, verbose_name='Date')),
+            ],
+            options={
+                'verbose_name': 'Écriture comptable',
+                'verbose_name_plural': 'Écritures comptables',
+                'db_table': 'T_E_FinanceFaits_FIN',
+                'managed': False,
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.0.6 on 2026-10-18 14:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('comptabilite', '0010_financefaits'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='plancomptelocal',
+            index=models.Index(fields=['compte'], name='IX_PCL_COMPTE'),
+        ),
+    ]
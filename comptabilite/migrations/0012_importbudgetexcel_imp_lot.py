@@ -0,0 +1,44 @@
+from django.db import migrations
+
+# T_Temp_ImportBudgetExcel appartient au DW (pas de modèle) : la colonne de l'identifiant
+# d'import et son index sont créés ici sur SQL Server, par dw_emulation.create_schema en émulation
+ADD_IMP_LOT = """
+IF COL_LENGTH('T_Temp_ImportBudgetExcel', 'IMP_Lot') IS NULL
+    ALTER TABLE T_Temp_ImportBudgetExcel ADD IMP_Lot VARCHAR(32) NULL;
+"""
+CREATE_INDEX = """
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_IBE_IMP_Lot'
+               AND object_id = OBJECT_ID('T_Temp_ImportBudgetExcel'))
+    CREATE INDEX IX_IBE_IMP_Lot ON T_Temp_ImportBudgetExcel (IMP_Lot);
+"""
+DROP_INDEX = """
+IF EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_IBE_IMP_Lot'
+           AND object_id = OBJECT_ID('T_Temp_ImportBudgetExcel'))
+    DROP INDEX IX_IBE_IMP_Lot ON T_Temp_ImportBudgetExcel;
+"""
+
+
+def add_imp_lot(apps, schema_editor):
+    if schema_editor.connection.vendor != 'microsoft':
+        return
+    # Deux lots : l'index ne peut pas référencer la colonne dans le lot qui la crée
+    schema_editor.execute(ADD_IMP_LOT)
+    schema_editor.execute(CREATE_INDEX)
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'microsoft':
+        return
+    # La colonne est conservée : elle peut contenir les lignes d'imports en cours
+    schema_editor.execute(DROP_INDEX)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('comptabilite', '0011_plancomptelocal_compte_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_imp_lot, drop_index),
+    ]
@@ -1,9 +1,12 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
 from .dynamic_labels import DynamicLabelsMixin
+from .sequences import AllocatedIdMixin
 
 
-class Societe(models.Model):
+class Societe(AllocatedIdMixin):
     """Modèle pour les sociétés - équivalent à T_E_Societe_SOC"""
     id = models.IntegerField(primary_key=True, db_column='SOC_Id', verbose_name="ID")
     code = models.CharField(max_length=50, unique=True, db_column='SOC_Code', verbose_name="Code")
@@ -18,19 +21,11 @@ class Societe(models.Model):
         verbose_name_plural = "Sociétés"
         ordering = ['code']
 
-    def save(self, *args, **kwargs):
-        if not self.id:
-            from django.db import connection
-            with connection.cursor() as cursor:
-                cursor.execute("SELECT ISNULL(MAX(SOC_Id), 0) + 1 FROM T_E_Societe_SOC")
-                self.id = cursor.fetchone()[0]
-        super().save(*args, **kwargs)
-
     def __str__(self):
         return f"{self.code} - {self.intitule}"
 
 
-class Stade(models.Model):
+class Stade(AllocatedIdMixin):
     """Modèle pour les stades - équivalent à T_E_Stade_STA"""
     id = models.IntegerField(primary_key=True, db_column='STA_Id', verbose_name="ID")
     intitule = models.CharField(max_length=255, db_column='STA_Intitule', verbose_name="Intitulé")
@@ -41,19 +36,11 @@ class Stade(models.Model):
         verbose_name_plural = "Stades"
         ordering = ['intitule']
 
-    def save(self, *args, **kwargs):
-        if not self.id:
-            from django.db import connection
-            with connection.cursor() as cursor:
-                cursor.execute("SELECT ISNULL(MAX(STA_Id), 0) + 1 FROM T_E_Stade_STA")
-                self.id = cursor.fetchone()[0]
-        super().save(*args, **kwargs)
-
     def __str__(self):
         return self.intitule
 
 
-class NatureCompte(models.Model):
+class NatureCompte(AllocatedIdMixin):
     """Modèle pour les natures de compte - équivalent à T_E_NatureCompte_NCT"""
     id = models.IntegerField(primary_key=True, db_column='NCT_Id', verbose_name="ID")
     code = models.CharField(max_length=10, unique=True, db_column='NCT_Code', verbose_name="Code")
@@ -65,19 +52,11 @@ class NatureCompte(models.Model):
         verbose_name_plural = "Natures de Compte"
         ordering = ['code']
 
-    def save(self, *args, **kwargs):
-        if not self.id:
-            from django.db import connection
-            with connection.cursor() as cursor:
-                cursor.execute("SELECT ISNULL(MAX(NCT_Id), 0) + 1 FROM T_E_NatureCompte_NCT")
-                self.id = cursor.fetchone()[0]
-        super().save(*args, **kwargs)
-
     def __str__(self):
         return f"{self.code} - {self.intitule}"
 
 
-class TypeValeur(models.Model):
+class TypeValeur(AllocatedIdMixin):
     """Modèle pour les types de valeur - équivalent à T_E_TypeValeur_TYV"""
     id = models.IntegerField(primary_key=True, db_column='TYV_Id', verbose_name="ID")
     code = models.CharField(max_length=10, unique=True, db_column='TYV_code', verbose_name="Code")
@@ -90,15 +69,6 @@ class TypeValeur(models.Model):
         verbose_name_plural = "Types de Valeur"
         ordering = ['code']
 
-    def save(self, *args, **kwargs):
-        if not self.id:
-            # Obtenir le prochain ID disponible
-            from django.db import connection
-            with connection.cursor() as cursor:
-                cursor.execute("SELECT ISNULL(MAX(TYV_Id), 0) + 1 FROM T_E_TypeValeur_TYV")
-                self.id = cursor.fetchone()[0]
-        super().save(*args, **kwargs)
-
     def __str__(self):
         return f"{self.code} - {self.intitule}"
 
@@ -137,12 +107,16 @@ class PlanCompteLocal(models.Model):
         verbose_name = "Compte Local"
         verbose_name_plural = "Comptes Locaux"
         ordering = ['compte']
+        indexes = [
+            # Recherche par compte exact, préfixe (LIKE 'x%') ou plage (BETWEEN)
+            models.Index(fields=['compte'], name='IX_PCL_COMPTE'),
+        ]
 
     def __str__(self):
         return f"{self.compte} - {self.intitule}"
 
 
-class Devise(DynamicLabelsMixin, models.Model):
+class Devise(DynamicLabelsMixin, AllocatedIdMixin):
     """Modèle pour les devises - équivalent à T_E_Devises_DEV"""
     id = models.IntegerField(primary_key=True, db_column='DEV_Id', verbose_name="ID")
     code_iso = models.CharField(max_length=3, db_column='DEV_CodeIso', verbose_name="Code ISO", null=True, blank=True)
@@ -155,19 +129,202 @@ class Devise(DynamicLabelsMixin, models.Model):
         verbose_name_plural = "Devises"
         ordering = ['code_iso']
 
-    def save(self, *args, **kwargs):
-        if not self.id:
-            from django.db import connection
-            with connection.cursor() as cursor:
-                cursor.execute("SELECT ISNULL(MAX(DEV_Id), 0) + 1 FROM T_E_Devises_DEV")
-                self.id = cursor.fetchone()[0]
-        super().save(*args, **kwargs)
-
     def __str__(self):
         return f"{self.code_iso} - {self.intitule}"
 
 # Les libellés dynamiques seront appliqués par l'admin
 
 
+class Axe1(models.Model):
+    """Axe analytique 1 - T_E_Axe1_AX1 du DW émulé (table non gérée, voir FinanceFaits)"""
+    id = models.IntegerField(primary_key=True, db_column='AX1_Id', verbose_name="ID")
+    code = models.CharField(max_length=50, unique=True, db_column='AX1_Code', verbose_name="Code")
+    intitule = models.CharField(max_length=255, null=True, blank=True, db_column='AX1_Intitule', verbose_name="Intitulé")
+
+    class Meta:
+        managed = False
+        db_table = 'T_E_Axe1_AX1'
+        verbose_name = "Axe 1"
+        verbose_name_plural = "Axes 1"
+        ordering = ['code']
+
+    def __str__(self):
+        return self.code
+
+
+class Axe2(models.Model):
+    """Axe analytique 2 - T_E_Axe2_AX2 du DW émulé (table non gérée, voir FinanceFaits)"""
+    id = models.IntegerField(primary_key=True, db_column='AX2_Id', verbose_name="ID")
+    code = models.CharField(max_length=50, unique=True, db_column='AX2_Code', verbose_name="Code")
+    intitule = models.CharField(max_length=255, null=True, blank=True, db_column='AX2_Intitule', verbose_name="Intitulé")
+
+    class Meta:
+        managed = False
+        db_table = 'T_E_Axe2_AX2'
+        verbose_name = "Axe 2"
+        verbose_name_plural = "Axes 2"
+        ordering = ['code']
+
+    def __str__(self):
+        return self.code
+
+
+class Axe3(models.Model):
+    """Axe analytique 3 - T_E_Axe3_AX3 du DW émulé (table non gérée, voir FinanceFaits)"""
+    id = models.IntegerField(primary_key=True, db_column='AX3_Id', verbose_name="ID")
+    code = models.CharField(max_length=50, unique=True, db_column='AX3_Code', verbose_name="Code")
+    intitule = models.CharField(max_length=255, null=True, blank=True, db_column='AX3_Intitule', verbose_name="Intitulé")
+
+    class Meta:
+        managed = False
+        db_table = 'T_E_Axe3_AX3'
+        verbose_name = "Axe 3"
+        verbose_name_plural = "Axes 3"
+        ordering = ['code']
+
+    def __str__(self):
+        return self.code
+
+
+class FinanceFaits(models.Model):
+    """Fait financier - T_E_FinanceFaits_FIN du DW émulé (table non gérée par Django)
+
+    Les colonnes sont celles du schéma du mode émulation (dw_emulation.SCHEMA), elles n'ont
+    pas été vérifiées sur le DW : le modèle n'est lu que si RECHERCHE_ORM_ENABLED est activé
+    (recherche par l'ORM, voir faits.py, et API api/ecritures/).
+    """
+    id = models.BigAutoField(primary_key=True, db_column='FIN_Id', verbose_name="ID")
+    periode = models.ForeignKey('referentiel.Periode', on_delete=models.DO_NOTHING, db_constraint=False, related_name='+', db_column='PER_Id', verbose_name="Période")
+    stade = models.ForeignKey(Stade, on_delete=models.DO_NOTHING, null=True, blank=True, db_constraint=False, related_name='+', db_column='STA_Id', verbose_name="Stade")
+    societe = models.ForeignKey(Societe, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+', db_column='SOC_Id', verbose_name="Société")
+    version_id = models.IntegerField(null=True, blank=True, db_column='VER_Id', verbose_name="Version")
+    lot_id = models.IntegerField(null=True, blank=True, db_column='LOT_Id', verbose_name="Lot")
+    compte = models.ForeignKey(PlanCompteLocal, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+', db_column='PCL_Id', verbose_name="Compte")
+    type_valeur = models.ForeignKey(TypeValeur, on_delete=models.DO_NOTHING, null=True, blank=True, db_constraint=False, related_name='+', db_column='TYV_Id', verbose_name="Type valeur")
+    axe1 = models.ForeignKey(Axe1, on_delete=models.DO_NOTHING, null=True, blank=True, db_constraint=False, related_name='+', db_column='AX1_Id', verbose_name="Axe 1")
+    axe2 = models.ForeignKey(Axe2, on_delete=models.DO_NOTHING, null=True, blank=True, db_constraint=False, related_name='+', db_column='AX2_Id', verbose_name="Axe 2")
+    axe3 = models.ForeignKey(Axe3, on_delete=models.DO_NOTHING, null=True, blank=True, db_constraint=False, related_name='+', db_column='AX3_Id', verbose_name="Axe 3")
+    montant = models.DecimalField(max_digits=18, decimal_places=2, db_column='FIN_Montant', verbose_name="Montant")
+    solde = models.DecimalField(max_digits=18, decimal_places=2, null=True, blank=True, db_column='FIN_Solde', verbose_name="Solde")
+    date = models.DateTimeField(null=True, blank=True, db_column='FIN_Date', verbose_name="Date")
+
+    class Meta:
+        managed = False
+        db_table = 'T_E_FinanceFaits_FIN'
+        verbose_name = "Écriture comptable"
+        verbose_name_plural = "Écritures comptables"
+
+    def __str__(self):
+        return f"{self.id} - {self.montant}"
+
+
+class Sequence(models.Model):
+    """Compteur d'identifiants par table (allocation par bloc, voir sequences.py)"""
+    nom = models.CharField(max_length=128, primary_key=True, db_column='SEQ_Nom', verbose_name="Table")
+    valeur = models.BigIntegerField(default=0, db_column='SEQ_Valeur', verbose_name="Dernier identifiant réservé")
+
+    class Meta:
+        db_table = 'T_E_Sequence_SEQ'
+        verbose_name = "Séquence"
+        verbose_name_plural = "Séquences"
+
+    def __str__(self):
+        return f"{self.nom} ({self.valeur})"
+
+
+class ImportJob(models.Model):
+    """Job d'import Sage/Exact exécuté en arrière-plan par la commande run_import_jobs"""
+    STATUT_EN_ATTENTE = 'pending'
+    STATUT_EN_COURS = 'running'
+    STATUT_TERMINE = 'success'
+    STATUT_ERREUR = 'error'
+    STATUT_CHOICES = [
+        (STATUT_EN_ATTENTE, 'En attente'),
+        (STATUT_EN_COURS, 'En cours'),
+        (STATUT_TERMINE, 'Terminé'),
+        (STATUT_ERREUR, 'En erreur'),
+    ]
+
+    id = models.AutoField(primary_key=True, db_column='IMJ_Id', verbose_name="ID")
+    type_import = models.CharField(max_length=10, db_column='IMJ_Type', verbose_name="Type d'import")
+    statut = models.CharField(max_length=10, choices=STATUT_CHOICES, default=STATUT_EN_ATTENTE, db_index=True, db_column='IMJ_Statut', verbose_name="Statut")
+    parametres = models.JSONField(encoder=DjangoJSONEncoder, db_column='IMJ_Parametres', verbose_name="Paramètres")
+    resultat = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder, db_column='IMJ_Resultat', verbose_name="Résultat")
+    erreur = models.TextField(null=True, blank=True, db_column='IMJ_Erreur', verbose_name="Erreur")
+    utilisateur = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, db_column='USR_Id', verbose_name="Utilisateur")
+    date_creation = models.DateTimeField(auto_now_add=True, db_column='IMJ_DateCreation', verbose_name="Date de création")
+    date_debut = models.DateTimeField(null=True, blank=True, db_column='IMJ_DateDebut', verbose_name="Date de début")
+    date_fin = models.DateTimeField(null=True, blank=True, db_column='IMJ_DateFin', verbose_name="Date de fin")
+
+    class Meta:
+        db_table = 'T_E_ImportJob_IMJ'
+        verbose_name = "Job d'import"
+        verbose_name_plural = "Jobs d'import"
+        ordering = ['-date_creation']
+
+    @property
+    def duree(self):
+        """Durée d'exécution en secondes (None si le job n'a pas démarré)"""
+        if not self.date_debut:
+            return None
+        fin = self.date_fin or timezone.now()
+        return (fin - self.date_debut).total_seconds()
+
+    def __str__(self):
+        return f"Import {self.type_import} #{self.id} ({self.get_statut_display()})"
+
+
+class SearchJob(models.Model):
+    """Recherche d'écritures (procédure SRE) exécutée en arrière-plan par la commande run_search_jobs
+
+    Le résultat est conservé dans SEARCH_JOB_RESULT_DIR pendant SEARCH_JOB_RESULT_TTL secondes ;
+    seul `utilisateur` peut suivre, annuler ou consulter la recherche.
+    """
+    STATUT_EN_ATTENTE = 'pending'
+    STATUT_EN_COURS = 'running'
+    STATUT_TERMINE = 'success'
+    STATUT_ERREUR = 'error'
+    STATUT_ANNULE = 'cancelled'
+    STATUT_EXPIRE = 'timeout'
+    STATUT_CHOICES = [
+        (STATUT_EN_ATTENTE, 'En attente'),
+        (STATUT_EN_COURS, 'En cours'),
+        (STATUT_TERMINE, 'Terminé'),
+        (STATUT_ERREUR, 'En erreur'),
+        (STATUT_ANNULE, 'Annulé'),
+        (STATUT_EXPIRE, 'Délai dépassé'),
+    ]
+    STATUTS_FINAUX = (STATUT_TERMINE, STATUT_ERREUR, STATUT_ANNULE, STATUT_EXPIRE)
+
+    id = models.AutoField(primary_key=True, db_column='SRJ_Id', verbose_name="ID")
+    statut = models.CharField(max_length=10, choices=STATUT_CHOICES, default=STATUT_EN_ATTENTE, db_index=True, db_column='SRJ_Statut', verbose_name="Statut")
+    parametres = models.JSONField(encoder=DjangoJSONEncoder, db_column='SRJ_Parametres', verbose_name="Paramètres")
+    nb_lignes = models.IntegerField(null=True, blank=True, db_column='SRJ_NbLignes', verbose_name="Nombre de lignes")
+    erreur = models.TextField(null=True, blank=True, db_column='SRJ_Erreur', verbose_name="Erreur")
+    annulation_demandee = models.BooleanField(default=False, db_column='SRJ_AnnulationDemandee', verbose_name="Annulation demandée")
+    utilisateur = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, db_column='USR_Id', verbose_name="Utilisateur")
+    date_creation = models.DateTimeField(auto_now_add=True, db_column='SRJ_DateCreation', verbose_name="Date de création")
+    date_debut = models.DateTimeField(null=True, blank=True, db_column='SRJ_DateDebut', verbose_name="Date de début")
+    date_fin = models.DateTimeField(null=True, blank=True, db_column='SRJ_DateFin', verbose_name="Date de fin")
+    date_consultation = models.DateTimeField(null=True, blank=True, db_column='SRJ_DateConsultation', verbose_name="Dernière consultation")
+
+    class Meta:
+        db_table = 'T_E_SearchJob_SRJ'
+        verbose_name = "Recherche en arrière-plan"
+        verbose_name_plural = "Recherches en arrière-plan"
+        ordering = ['-date_creation']
+
+    @property
+    def duree(self):
+        """Durée d'exécution en secondes (None si le job n'a pas démarré)"""
+        if not self.date_debut:
+            return None
+        fin = self.date_fin or timezone.now()
+        return (fin - self.date_debut).total_seconds()
+
+    def __str__(self):
+        return f"Recherche #{self.id} ({self.get_statut_display()})"
+
+
 # Modèles simplifiés pour correspondre à la structure existante de la base
 # Les modèles complexes seront ajoutés progressivement selon les besoins
\ No newline at end of file
@@ -0,0 +1,195 @@
+"""
+Totaux et tableau croisé du résultat de la recherche des écritures
+
+Les lignes du résultat SRE (ColumnarResult) sont regroupées par une ou plusieurs
+dimensions (société, compte, axes, période) et les montants sommés sur les tableaux
+NumPy : seule la grille agrégée est rendue, quelques centaines de cellules au lieu
+des centaines de milliers de lignes du résultat. Une dimension peut être placée en
+colonnes (par exemple la période) ; les montants de la première mesure y sont répartis.
+"""
+from itertools import islice
+
+import numpy as np
+from django.conf import settings
+
+from . import columnar
+
+
+# Dimension : (colonne du résultat SRE, libellé)
+DIMENSIONS = {
+    'societe': ('SOC_id', 'Société'),
+    'compte': ('PCL_Compte', 'Compte'),
+    'ax1': ('AX1_Code', 'Axe 1'),
+    'ax2': ('AX2_Code', 'Axe 2'),
+    'ax3': ('AX3_Code', 'Axe 3'),
+    'periode': ('PER_id', 'Période'),
+}
+DIMENSION_CHOICES = [(key, label) for key, (_, label) in DIMENSIONS.items()]
+
+# Mesures sommées, dans l'ordre d'affichage, si elles figurent dans le résultat
+MEASURES = [('FIN_Montant', 'Montant'), ('FIN_Solde', 'Solde')]
+
+
+class PivotError(Exception):
+    """Regroupement impossible (colonne absente, trop de colonnes)."""
+
+
+class PivotTable:
+    """Grille agrégée : une ligne par combinaison des dimensions en lignes."""
+
+    def __init__(self, row_headers, column_header, column_values, measure_headers, rows, totals, count,
+                 group_count, truncated, debit=0, credit=0):
+        self.row_headers = row_headers
+        self.column_header = column_header
+        self.column_values = column_values
+        self.measure_headers = measure_headers
+        self.rows = rows
+        self.totals = totals
+        self.count = count
+        self.group_count = group_count
+        self.truncated = truncated
+        self.debit = debit
+        self.credit = credit
+
+    @property
+    def headers(self):
+        return [*self.row_headers, *[str(value) for value in self.column_values], *self.measure_headers, 'Lignes']
+
+
+def find_column(columns, name):
+    """Nom de colonne du résultat, sans tenir compte de la casse (SOC_id, SOC_Id...)."""
+    lower = name.lower()
+    for column in columns:
+        if column.lower() == lower:
+            return column
+    return None
+
+
+def as_columnar(columns, rows, names, batch_size=10000):
+    """Résultat en colonnes limité aux colonnes `names`, depuis des lignes lues en flux.
+
+    Utilisé quand le résultat dépasse la taille du cache et n'est disponible qu'en flux.
+    """
+    positions = [columns.index(name) for name in names]
+    rows = iter(rows)
+
+    def batches():
+        while True:
+            batch = [tuple(row[p] for p in positions) for row in islice(rows, batch_size)]
+            if not batch:
+                return
+            yield batch
+
+    return columnar.from_batches(names, batches())
+
+
+def build(columns, result, group_by, pivot_column=None, labels=None,
+          max_rows=None, max_columns=None):
+    """Regroupe `result` (ColumnarResult ou lignes en flux) et retourne un PivotTable.
+
+    `group_by` : dimensions en lignes (clés de DIMENSIONS), `pivot_column` : dimension
+    en colonnes. `labels` associe à une dimension un dictionnaire {valeur: libellé}.
+    """
+    max_rows = max_rows or getattr(settings, 'PIVOT_MAX_ROWS', 2000)
+    max_columns = max_columns or getattr(settings, 'PIVOT_MAX_COLUMNS', 60)
+    labels = labels or {}
+    dimensions = [d for d in group_by if d in DIMENSIONS and d != pivot_column]
+    if not dimensions and not pivot_column:
+        raise PivotError('Aucune dimension de regroupement')
+
+    needed = {}
+    for key in [*dimensions, *([pivot_column] if pivot_column else [])]:
+        column = find_column(columns, DIMENSIONS[key][0])
+        if column is None:
+            raise PivotError(f"Colonne {DIMENSIONS[key][0]} absente du résultat")
+        needed[key] = column
+    measures = [(name, label) for name, label in MEASURES if name in columns]
+
+    if not isinstance(result, columnar.ColumnarResult):
+        result = as_columnar(columns, result, [*dict.fromkeys(needed.values()), *[m for m, _ in measures]])
+    count = len(result)
+
+    # Codes des lignes : rang de la combinaison des dimensions, dans l'ordre trié des libellés
+    factors = [result[needed[key]].factorize() for key in dimensions]
+    if factors:
+        keys = np.stack([codes for codes, _ in factors], axis=1)
+        groups, inverse = np.unique(keys, axis=0, return_inverse=True)
+        inverse = inverse.reshape(-1)
+    else:
+        groups, inverse = np.zeros((1, 0), dtype=np.int64), np.zeros(count, dtype=np.int64)
+    group_count = len(groups)
+
+    column_values = []
+    width = 1
+    cell_index = inverse
+    if pivot_column:
+        pivot_codes, column_values = result[needed[pivot_column]].factorize()
+        if len(column_values) > max_columns:
+            raise PivotError(
+                f"{len(column_values)} valeurs pour {DIMENSIONS[pivot_column][1]} en colonnes (maximum {max_columns})"
+            )
+        width = len(column_values)
+        cell_index = inverse * width + pivot_codes
+        column_labels = labels.get(pivot_column, {})
+        column_values = [column_labels.get(value, value) for value in column_values]
+
+    # Sommes exactes en int64 (montants en centièmes) ou en Decimal, ou float64
+    sums = []
+    for name, _ in measures:
+        column = result[name]
+        values = np.where(column.null_mask, 0, column.values)
+        sums.append(sum_by(inverse, values, group_count))
+    cells = None
+    if pivot_column and measures:
+        first = result[measures[0][0]]
+        cells = sum_by(cell_index, np.where(first.null_mask, 0, first.values), group_count * width)
+        cells = cells.reshape(group_count, width)
+    counts = np.bincount(inverse, minlength=group_count)
+
+    debit = credit = 0
+    if measures and measures[0][0] == 'FIN_Montant':
+        debit, credit = result.amount_totals('FIN_Montant')
+
+    rows = []
+    truncated = group_count > max_rows
+    for g in range(min(group_count, max_rows)):
+        header = []
+        for position, key in enumerate(dimensions):
+            value = factors[position][1][groups[g][position]]
+            header.append(labels.get(key, {}).get(value, value))
+        row_cells = columnar.amounts_to_python(cells[g]) if cells is not None else []
+        row_measures = [columnar.amounts_to_python(values[g:g + 1])[0] for values in sums]
+        rows.append((header, row_cells, row_measures, int(counts[g])))
+
+    totals = (
+        columnar.amounts_to_python(cells.sum(axis=0)) if cells is not None else [],
+        [columnar.amounts_to_python(values.sum(keepdims=True))[0] for values in sums],
+        count,
+    )
+    return PivotTable(
+        row_headers=[DIMENSIONS[key][1] for key in dimensions],
+        column_header=DIMENSIONS[pivot_column][1] if pivot_column else None,
+        column_values=column_values,
+        measure_headers=[label for _, label in measures],
+        rows=rows,
+        totals=totals,
+        count=count,
+        group_count=group_count,
+        truncated=truncated,
+        debit=debit,
+        credit=credit,
+    )
+
+
+def sum_by(index, values, size):
+    """Sommes de `values` par valeur de `index` (0 à size - 1), en conservant le type entier."""
+    if values.dtype.kind == 'f':
+        return np.bincount(index, weights=values, minlength=size)
+    if values.dtype == object:
+        # Montants en Decimal (hors centièmes, voir columnar.py) : sommes exactes en objets
+        sums = np.zeros(size, dtype=object)
+        np.add.at(sums, index, values)
+        return sums
+    sums = np.zeros(size, dtype=np.int64)
+    np.add.at(sums, index, values.astype(np.int64))
+    return sums
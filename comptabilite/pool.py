@@ -0,0 +1,306 @@
+"""
+Pool de connexions pyodbc partagé par les threads d'un processus
+
+Django ouvre une connexion par requête (CONN_MAX_AGE=0) : sans pool, chaque
+requête paie la négociation TDS et l'authentification SQL Server. Le mixin
+PooledDatabaseWrapperMixin emprunte les connexions au pool et les y remet à
+la fermeture ; il s'applique au backend `mssql` (comptabilite.backends.mssql_pool)
+comme au CustomMSSQLDatabaseWrapper de database.py.
+
+Configuration dans DATABASES[alias]['OPTIONS']['pool'] :
+    min_size      connexions ouvertes par le préchauffage (warm_up)
+    max_size      connexions ouvertes au maximum (empruntées + disponibles)
+    max_lifetime  durée de vie maximale d'une connexion, en secondes
+    timeout       attente maximale d'une connexion disponible, en secondes
+    check_idle    au-delà de cette inactivité (secondes), la connexion est
+                  vérifiée par un SELECT 1 avant d'être rendue (0 : toujours)
+    warmup        ouvre min_size connexions au démarrage (wsgi/asgi) ; à désactiver
+                  si l'application est chargée avant le fork des workers
+                  (gunicorn --preload), les connexions ne se partagent pas
+"""
+import logging
+import threading
+import time
+from collections import deque
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_POOL_OPTIONS = {
+    'min_size': 0,
+    'max_size': 10,
+    'max_lifetime': 1800,
+    'timeout': 30,
+    'check_idle': 30,
+    'warmup': False,
+}
+
+
+class PoolTimeout(Exception):
+    """Aucune connexion disponible dans le délai imparti."""
+
+
+class _Entry:
+    """Connexion du pool avec ses dates de création et de dernière utilisation."""
+
+    __slots__ = ('connection', 'created', 'last_used')
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.created = time.monotonic()
+        self.last_used = self.created
+
+
+class ConnectionPool:
+    """Pool borné de connexions DB-API créées par `factory`."""
+
+    def __init__(self, factory, min_size=0, max_size=10, max_lifetime=1800, timeout=30, check_idle=30, **kwargs):
+        self.factory = factory
+        self.min_size = min_size
+        self.max_size = max(max_size, 1)
+        self.max_lifetime = max_lifetime
+        self.timeout = timeout
+        self.check_idle = check_idle
+        self._idle = deque()
+        self._in_use = {}
+        self._size = 0
+        self._cond = threading.Condition()
+        self._counters = {
+            'created': 0,
+            'reused': 0,
+            'discarded': 0,
+            'failed_checks': 0,
+            'waits': 0,
+            'timeouts': 0,
+        }
+
+    def _expired(self, entry, now):
+        return self.max_lifetime and now - entry.created > self.max_lifetime
+
+    def _check(self, entry, now):
+        """Vérifie une connexion restée inactive avant de la rendre."""
+        if now - entry.last_used < self.check_idle:
+            return True
+        try:
+            cursor = entry.connection.cursor()
+            try:
+                cursor.execute('SELECT 1')
+                cursor.fetchall()
+            finally:
+                cursor.close()
+        except Exception:
+            return False
+        return True
+
+    def _discard(self, entry):
+        with self._cond:
+            self._size -= 1
+            self._counters['discarded'] += 1
+            self._cond.notify()
+        try:
+            entry.connection.close()
+        except Exception:
+            pass
+
+    def _create(self):
+        try:
+            entry = _Entry(self.factory())
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self._counters['created'] += 1
+        return entry
+
+    def acquire(self):
+        """Emprunte une connexion : disponible, sinon nouvelle, sinon attend qu'une se libère."""
+        deadline = time.monotonic() + self.timeout
+        while True:
+            entry = None
+            with self._cond:
+                waited = False
+                while True:
+                    if self._idle:
+                        # LIFO : les connexions récentes servent, les autres expirent
+                        entry = self._idle.pop()
+                        break
+                    if self._size < self.max_size:
+                        self._size += 1
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._counters['timeouts'] += 1
+                        raise PoolTimeout(f'Aucune connexion disponible après {self.timeout} s')
+                    if not waited:
+                        self._counters['waits'] += 1
+                        waited = True
+                    self._cond.wait(remaining)
+
+            if entry is None:
+                entry = self._create()
+            else:
+                now = time.monotonic()
+                if self._expired(entry, now):
+                    self._discard(entry)
+                    continue
+                if not self._check(entry, now):
+                    with self._cond:
+                        self._counters['failed_checks'] += 1
+                    self._discard(entry)
+                    continue
+                with self._cond:
+                    self._counters['reused'] += 1
+
+            with self._cond:
+                self._in_use[id(entry.connection)] = entry
+            return entry.connection
+
+    def release(self, connection, discard=False):
+        """Remet une connexion dans le pool (annule une transaction restée ouverte)."""
+        with self._cond:
+            entry = self._in_use.pop(id(connection), None)
+        if entry is None:
+            # Connexion étrangère au pool
+            connection.close()
+            return
+        if not discard:
+            try:
+                if not getattr(connection, 'autocommit', True):
+                    connection.rollback()
+            except Exception:
+                discard = True
+        now = time.monotonic()
+        if discard or self._expired(entry, now):
+            self._discard(entry)
+            return
+        entry.last_used = now
+        with self._cond:
+            self._idle.append(entry)
+            self._cond.notify()
+
+    def fill(self, count=None):
+        """Ouvre des connexions jusqu'à `count` (par défaut min_size) connexions disponibles."""
+        count = self.min_size if count is None else count
+        opened = []
+        try:
+            while True:
+                with self._cond:
+                    if self._size >= min(count, self.max_size):
+                        break
+                    self._size += 1
+                opened.append(self._create())
+        finally:
+            with self._cond:
+                self._idle.extend(opened)
+                self._cond.notify_all()
+        return len(opened)
+
+    def close_all(self):
+        """Ferme les connexions disponibles du pool."""
+        with self._cond:
+            entries = list(self._idle)
+            self._idle.clear()
+            self._size -= len(entries)
+        for entry in entries:
+            try:
+                entry.connection.close()
+            except Exception:
+                pass
+
+    def stats(self):
+        with self._cond:
+            return {
+                'size': self._size,
+                'idle': len(self._idle),
+                'in_use': len(self._in_use),
+                'min_size': self.min_size,
+                'max_size': self.max_size,
+                **self._counters,
+            }
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def pool_options(settings_dict):
+    """Options du pool de la base, ou None si le pool n'est pas configuré."""
+    options = settings_dict.get('OPTIONS', {}).get('pool')
+    if not options:
+        return None
+    return {**DEFAULT_POOL_OPTIONS, **options}
+
+
+def get_pool(alias, factory, options):
+    """Retourne le pool de l'alias de base, créé au premier appel."""
+    pool = _pools.get(alias)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(alias)
+            if pool is None:
+                pool = _pools[alias] = ConnectionPool(factory, **options)
+    return pool
+
+
+def pool_stats():
+    """Statistiques des pools du processus, par alias de base."""
+    return {alias: pool.stats() for alias, pool in list(_pools.items())}
+
+
+class PooledDatabaseWrapperMixin:
+    """Mixin de DatabaseWrapper qui emprunte ses connexions au pool de l'alias.
+
+    Sans option `pool` dans OPTIONS, le comportement du backend est inchangé.
+    Les connexions sont ouvertes par `_connect`, à redéfinir (et non `get_new_connection`)
+    par un backend qui construit lui-même sa connexion, comme CustomMSSQLDatabaseWrapper.
+    """
+
+    def _connect(self, conn_params):
+        """Ouvre une connexion pyodbc (appelé à l'ouverture, hors pool ou quand le pool n'en a pas)."""
+        return super().get_new_connection(conn_params)
+
+    def _get_pool(self, conn_params):
+        options = pool_options(self.settings_dict)
+        if options is None:
+            return None
+        connect = self._connect
+        return get_pool(self.alias, lambda: connect(conn_params), options)
+
+    def get_new_connection(self, conn_params):
+        pool = self._get_pool(conn_params)
+        if pool is None:
+            return self._connect(conn_params)
+        return pool.acquire()
+
+    def _close(self):
+        pool = _pools.get(self.alias)
+        if self.connection is None or pool is None:
+            return super()._close()
+        with self.wrap_database_errors:
+            # errors_occurred reste vrai quand Django a jugé la connexion inutilisable
+            return pool.release(self.connection, discard=self.errors_occurred)
+
+    def warm_up_pool(self):
+        """Ouvre les min_size connexions du pool ; retourne le nombre de connexions ouvertes."""
+        pool = self._get_pool(self.get_connection_params())
+        if pool is None:
+            return 0
+        return pool.fill()
+
+
+def warm_up(using=None):
+    """Préchauffe les pools des bases configurées avec `warmup`, avant la première requête."""
+    from django.db import connections
+
+    for alias in [using] if using else connections:
+        connection = connections[alias]
+        options = pool_options(connection.settings_dict)
+        if not options or not options['warmup'] or not hasattr(connection, 'warm_up_pool'):
+            continue
+        try:
+            opened = connection.warm_up_pool()
+            logger.info('Pool %s préchauffé : %s connexion(s) ouverte(s)', alias, opened)
+        except Exception:
+            logger.exception('Échec du préchauffage du pool %s', alias)
@@ -0,0 +1,444 @@
+"""
+Accès à la procédure de recherche des écritures DW.PS_S_000423_SelectRechercheEcriture_SRE
+
+La procédure n'accepte qu'une valeur par critère. Les filtres multiples (plage de
+périodes, listes de sociétés et de types valeur, bornes de solde et de compte) et le
+compte saisi en préfixe (`6*`) ou en plage (`401000-409999`) sont traités :
+    - avec RECHERCHE_ORM_ENABLED, par une requête ensembliste unique sur les faits
+      (faits.py, prédicats IN, LIKE et BETWEEN) ;
+    - sinon par la procédure, appelée une fois par combinaison de valeurs (sre_calls) :
+      les comptes du préfixe ou de la plage sont lus dans le plan de comptes local
+      (index IX_PCL_COMPTE), les bornes de solde filtrent les lignes lues. Au-delà de
+      RECHERCHE_SRE_MAX_CALLS appels, la recherche est refusée (SearchUnavailable).
+"""
+import csv
+import heapq
+import re
+from itertools import product
+
+from django.conf import settings
+from django.db.models import F
+
+from referentiel.models import Periode
+
+from . import faits, timing
+from .columnar import ColumnarResult
+from .models import PlanCompteLocal
+
+
+SRE_SQL = (
+    "EXEC DW.PS_S_000423_SelectRechercheEcriture_SRE "
+    "@per_id=%s, @sta_id=%s, @soc_id=%s, @tyv_id=%s, @pcl_compte=%s, "
+    "@fin_solde=%s, @ax1_code=%s, @ax2_code=%s, @ax3_code=%s, @lb_error=%s"
+)
+
+TOO_MANY_CALLS_MESSAGE = (
+    "Ces critères nécessitent {calls} appels de la procédure de recherche (au plus {max_calls}) : "
+    "réduisez la plage de périodes, les listes ou la plage de comptes"
+)
+
+# Libellés lisibles pour l'entête du tableau
+COLUMN_LABELS = {
+    'PER_id': 'Période',
+    'STA_id': 'Stade',
+    'SOC_id': 'Société',
+    'TYV_Id': 'Type valeur',
+    'TYV_code': 'Type valeur',
+    'PCL_Compte': 'Compte',
+    'PCL_Intitule': 'Intitulé compte',
+    'AX1_Code': 'Axe 1',
+    'AX2_Code': 'Axe 2',
+    'AX3_Code': 'Axe 3',
+    'FIN_Montant': 'Montant',
+    'FIN_Solde': 'Solde',
+    'LOT_id': 'Lot',
+    'FIN_id': 'ID écriture',
+    'FIN_Date': 'Date',
+}
+
+# Critères sans équivalent dans les paramètres de la procédure
+MULTI_PARAMS = (
+    'per_ids', 'soc_ids', 'tyv_ids', 'solde_min', 'solde_max', 'compte_min', 'compte_max', 'compte_prefix',
+)
+
+# Saisie du compte : plage « 401000-409999 » (tiret, tiret demi-cadratin ou « .. »)
+COMPTE_RANGE_RE = re.compile(r'^(?P<low>[^\s*]+?)\s*(?:-|–|\.\.)\s*(?P<high>[^\s*]+)$')
+
+# Pagination
+PAGE_SIZES = (50, 100, 200, 500)
+DEFAULT_PAGE_SIZE = 100
+FETCH_BATCH_SIZE = 1000
+
+
+class SearchUnavailable(Exception):
+    """Critères de recherche que ni la procédure ni la configuration ne permettent de traiter."""
+
+
+def period_range(start, end):
+    """Identifiants des périodes de `start` à `end` inclus, dans l'ordre chronologique."""
+    periodes = Periode.objects.all()
+    if start.annee and start.mois and end.annee and end.mois:
+        periodes = periodes.annotate(cle=F('annee') * 100 + F('mois')).filter(
+            cle__range=(start.annee * 100 + start.mois, end.annee * 100 + end.mois)
+        ).order_by('cle')
+    else:
+        periodes = periodes.filter(id__range=(start.id, end.id)).order_by('id')
+    return list(periodes.values_list('id', flat=True))
+
+
+def parse_compte(value):
+    """Interprète la saisie du compte : exact, préfixe (`6*`) ou plage (`401000-409999`).
+
+    Retourne un dictionnaire de critères (pcl_compte, compte_prefix ou compte_min et
+    compte_max). Lève ValueError si la saisie n'est pas valide.
+    """
+    value = (value or '').strip()
+    if not value:
+        return {}
+    if value.endswith('*') and '*' not in value[:-1]:
+        prefix = value[:-1].strip()
+        if not prefix:
+            raise ValueError('Indiquez le début du compte avant « * »')
+        return {'compte_prefix': prefix}
+    match = COMPTE_RANGE_RE.match(value)
+    if match:
+        low, high = match.group('low'), match.group('high')
+        if low > high:
+            raise ValueError(f'Plage de comptes inversée : {low} > {high}')
+        return {'compte_min': low, 'compte_max': high}
+    if '*' in value:
+        raise ValueError('« * » n\'est accepté qu\'en fin de compte (par exemple 6*)')
+    return {'pcl_compte': value}
+
+
+def _compte_criteria(cleaned_data):
+    """Critères du compte : saisie du champ Compte, bornes « Compte de / à » combinées."""
+    criteria = {'pcl_compte': None, 'compte_prefix': None, 'compte_min': None, 'compte_max': None}
+    criteria.update(parse_compte(cleaned_data.get('pcl_compte')))
+    # Intersection de la plage saisie et des bornes explicites
+    low, high = cleaned_data.get('compte_min') or None, cleaned_data.get('compte_max') or None
+    if low is not None:
+        criteria['compte_min'] = max(low, criteria['compte_min'] or low)
+    if high is not None:
+        criteria['compte_max'] = min(high, criteria['compte_max'] or high)
+    return criteria
+
+
+def build_sre_params(cleaned_data):
+    """Construit les paramètres de la recherche à partir du formulaire de recherche.
+
+    Les critères à valeur unique restent ceux de la procédure. Une liste de sociétés
+    (ou de types valeur) réduite à une valeur redevient le critère de la procédure ;
+    sinon elle remplace soc_id (tyv_id) par soc_ids (tyv_ids).
+    """
+    def pk(name):
+        value = cleaned_data.get(name)
+        return value.id if value else None
+
+    def ids(single, multiple):
+        values = {obj.id for obj in cleaned_data.get(multiple) or []}
+        if cleaned_data.get(single):
+            values.add(cleaned_data[single].id)
+        if len(values) > 1:
+            return None, sorted(values)
+        return (values.pop() if values else None), None
+
+    compte = _compte_criteria(cleaned_data)
+
+    soc_id, soc_ids = ids('soc_id', 'societes')
+    tyv_id, tyv_ids = ids('tyv_id', 'types_valeur')
+    per_id, per_ids = pk('per_id'), None
+    if per_id and cleaned_data.get('per_fin'):
+        per_ids = period_range(cleaned_data['per_id'], cleaned_data['per_fin'])
+        per_id = None
+
+    return {
+        'per_id': per_id,
+        'sta_id': pk('sta_id'),
+        'soc_id': soc_id,
+        'tyv_id': tyv_id,
+        'pcl_compte': compte['pcl_compte'],
+        'fin_solde': cleaned_data.get('fin_solde'),
+        'ax1_code': cleaned_data.get('ax1_code') or None,
+        'ax2_code': cleaned_data.get('ax2_code') or None,
+        'ax3_code': cleaned_data.get('ax3_code') or None,
+        'per_ids': per_ids,
+        'soc_ids': soc_ids,
+        'tyv_ids': tyv_ids,
+        'solde_min': cleaned_data.get('solde_min'),
+        'solde_max': cleaned_data.get('solde_max'),
+        'compte_min': compte['compte_min'],
+        'compte_max': compte['compte_max'],
+        'compte_prefix': compte['compte_prefix'],
+    }
+
+
+def has_criteria(params):
+    """Vrai si au moins un critère de recherche est renseigné."""
+    return any(value is not None and value != '' for value in params.values())
+
+
+def uses_set_query(params):
+    """Vrai si un critère multiple est renseigné (sans équivalent dans les paramètres de la procédure)."""
+    return any(params.get(name) is not None for name in MULTI_PARAMS)
+
+
+def execute_search(cursor, params, batch_size=FETCH_BATCH_SIZE):
+    """Exécute la recherche et retourne ses colonnes et ses lots de lignes (lus à la demande).
+
+    Requête de l'ORM (faits.py) si RECHERCHE_ORM_ENABLED le permet, sinon procédure SRE,
+    appelée une fois par combinaison de valeurs si un critère multiple est renseigné.
+    Les colonnes sont vides si la recherche ne retourne pas de résultat.
+    """
+    if (uses_set_query(params) and faits.enabled()) or faits.handles(params):
+        return faits.execute(cursor, params), iter_batches(cursor, batch_size)
+    if uses_set_query(params):
+        return _execute_sre_calls(cursor, params, batch_size)
+    columns = execute_sre(cursor, params)
+    return columns, iter_batches(cursor, batch_size) if columns else iter(())
+
+
+def execute_sre(cursor, params):
+    """Exécute la procédure SRE et retourne la liste des colonnes du résultat."""
+    out_error = ''
+    cursor.execute(SRE_SQL, [
+        params['per_id'], params['sta_id'], params['soc_id'], params['tyv_id'],
+        params['pcl_compte'], params['fin_solde'], params['ax1_code'],
+        params['ax2_code'], params['ax3_code'], out_error,
+    ])
+    if not cursor.description:
+        return []
+    return [col[0] for col in cursor.description]
+
+
+def expand_comptes(params):
+    """Codes des comptes du plan local couverts par le préfixe ou les bornes de compte.
+
+    Restreints aux sociétés recherchées ; un code présent dans plusieurs sociétés
+    n'est retourné qu'une fois (la procédure filtre sur le code).
+    """
+    comptes = PlanCompteLocal.objects.all()
+    societes = params.get('soc_ids') or ([params['soc_id']] if params.get('soc_id') is not None else None)
+    if societes:
+        comptes = comptes.filter(societe_id__in=societes)
+    if params.get('pcl_compte'):
+        comptes = comptes.filter(compte=params['pcl_compte'])
+    if params.get('compte_prefix'):
+        comptes = comptes.filter(compte__startswith=params['compte_prefix'])
+    if params.get('compte_min') is not None:
+        comptes = comptes.filter(compte__gte=params['compte_min'])
+    if params.get('compte_max') is not None:
+        comptes = comptes.filter(compte__lte=params['compte_max'])
+    return list(comptes.order_by('compte').values_list('compte', flat=True).distinct())
+
+
+def sre_calls(params):
+    """Paramètres des appels de la procédure couvrant les critères multiples, une valeur par critère.
+
+    Lève SearchUnavailable au-delà de RECHERCHE_SRE_MAX_CALLS appels.
+    """
+    if any(params.get(name) is not None for name in ('compte_prefix', 'compte_min', 'compte_max')):
+        comptes = expand_comptes(params)
+    else:
+        comptes = [params['pcl_compte']]
+    values = [
+        params.get('per_ids') or [params['per_id']],
+        params.get('soc_ids') or [params['soc_id']],
+        params.get('tyv_ids') or [params['tyv_id']],
+        comptes,
+    ]
+    calls = 1
+    for criterion in values:
+        calls *= len(criterion)
+    max_calls = getattr(settings, 'RECHERCHE_SRE_MAX_CALLS', 200)
+    if calls > max_calls:
+        raise SearchUnavailable(TOO_MANY_CALLS_MESSAGE.format(calls=calls, max_calls=max_calls))
+    single = {name: value for name, value in params.items() if name not in MULTI_PARAMS}
+    return [
+        {**single, 'per_id': per_id, 'soc_id': soc_id, 'tyv_id': tyv_id, 'pcl_compte': compte}
+        for per_id, soc_id, tyv_id, compte in product(*values)
+    ]
+
+
+def _solde_filter(columns, params):
+    """Filtre des lignes sur les bornes de solde (None sans borne)."""
+    low, high = params.get('solde_min'), params.get('solde_max')
+    if low is None and high is None:
+        return None
+    if 'FIN_Solde' not in columns:
+        raise SearchUnavailable("Bornes de solde indisponibles : la procédure ne retourne pas FIN_Solde")
+    position = columns.index('FIN_Solde')
+
+    def keep(row):
+        solde = row[position]
+        return solde is not None and (low is None or solde >= low) and (high is None or solde <= high)
+    return keep
+
+
+def _execute_sre_calls(cursor, params, batch_size):
+    """Appels successifs de la procédure (sre_calls) sur `cursor`, lus comme un seul résultat."""
+    calls = iter(sre_calls(params))
+    columns = []
+    for call in calls:
+        columns = execute_sre(cursor, call)
+        if columns:
+            break
+    if not columns:
+        return [], iter(())
+    keep = _solde_filter(columns, params)
+
+    def batches():
+        call_columns = columns
+        while True:
+            if call_columns:
+                for batch in iter_batches(cursor, batch_size):
+                    if keep is not None:
+                        batch = [row for row in batch if keep(row)]
+                    if batch:
+                        yield batch
+            call = next(calls, None)
+            if call is None:
+                return
+            call_columns = execute_sre(cursor, call)
+
+    return columns, batches()
+
+
+def display_columns(columns):
+    """Génère des libellés lisibles pour les colonnes du résultat."""
+    def prettify(name: str) -> str:
+        return name.replace('_', ' ').strip().capitalize()
+
+    return [COLUMN_LABELS.get(c, prettify(c)) for c in columns]
+
+
+def iter_batches(cursor, batch_size=FETCH_BATCH_SIZE):
+    """Lit le résultat du curseur par lots de `batch_size` lignes."""
+    while True:
+        batch = cursor.fetchmany(batch_size)
+        if not batch:
+            break
+        timing.count_rows(len(batch))
+        yield batch
+
+
+def iter_rows(batches):
+    """Parcourt ligne par ligne les lots de lignes d'une recherche (execute_search)."""
+    for batch in batches:
+        yield from batch
+
+
+class Echo:
+    """Pseudo-fichier qui retourne la valeur écrite, pour produire le CSV ligne à ligne."""
+
+    def write(self, value):
+        return value
+
+
+def iter_csv(header, rows):
+    """Génère le CSV du résultat ligne par ligne (BOM UTF-8 pour l'ouverture dans Excel)."""
+    writer = csv.writer(Echo())
+    yield '\ufeff' + writer.writerow(header)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def write_xlsx(header, rows, fileobj):
+    """Écrit le résultat dans un classeur Excel en mode écriture seule (mémoire constante)."""
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('Ecritures')
+    sheet.append(header)
+    for row in rows:
+        sheet.append(list(row))
+    workbook.save(fileobj)
+
+
+class ResultPage:
+    """Page d'un résultat de procédure, compatible avec l'usage de `page_obj` dans les templates."""
+
+    def __init__(self, rows, number, page_size, count, debit=0, credit=0):
+        self.rows = rows
+        self.number = number
+        self.page_size = page_size
+        self.count = count
+        self.debit = debit
+        self.credit = credit
+
+    @property
+    def num_pages(self):
+        return max(1, -(-self.count // self.page_size))
+
+    def has_previous(self):
+        return self.number > 1
+
+    def has_next(self):
+        return self.number < self.num_pages
+
+    def previous_page_number(self):
+        return self.number - 1
+
+    def next_page_number(self):
+        return self.number + 1
+
+    def start_index(self):
+        return (self.number - 1) * self.page_size + 1 if self.rows else 0
+
+    def end_index(self):
+        return self.start_index() + len(self.rows) - 1 if self.rows else 0
+
+
+def fetch_page(rows, number, page_size, sort_index=None, descending=False, amount_index=None):
+    """Parcourt les lignes du résultat et ne conserve que la page demandée.
+
+    Sans tri, seules les lignes de la page sont gardées en mémoire. Avec un tri,
+    un tas borné à `number * page_size` lignes remplace le tri complet du résultat.
+    Le total des lignes (et le débit/crédit de `amount_index`) est calculé au passage.
+    Un résultat en colonnes (ColumnarResult) est trié et totalisé sur ses tableaux.
+    """
+    offset = (number - 1) * page_size
+    if isinstance(rows, ColumnarResult):
+        return _fetch_columnar_page(rows, number, page_size, offset, sort_index, descending, amount_index)
+    state = {'count': 0, 'debit': 0, 'credit': 0}
+
+    def counted(rows):
+        for row in rows:
+            state['count'] += 1
+            if amount_index is not None:
+                amount = row[amount_index]
+                if amount is not None and amount > 0:
+                    state['debit'] += amount
+                elif amount is not None and amount < 0:
+                    state['credit'] -= amount
+            yield row
+
+    rows = counted(rows)
+    if sort_index is None:
+        page_rows = []
+        for i, row in enumerate(rows):
+            if offset <= i < offset + page_size:
+                page_rows.append(row)
+    else:
+        if descending:
+            # Les valeurs nulles restent en fin de liste dans les deux sens de tri
+            top = heapq.nlargest(offset + page_size, rows, key=lambda r: (r[sort_index] is not None, r[sort_index]))
+        else:
+            top = heapq.nsmallest(offset + page_size, rows, key=lambda r: (r[sort_index] is None, r[sort_index]))
+        page_rows = top[offset:]
+
+    return ResultPage(page_rows, number, page_size, state['count'], state['debit'], state['credit'])
+
+
+def _fetch_columnar_page(result, number, page_size, offset, sort_index, descending, amount_index):
+    """fetch_page d'un résultat en colonnes : seules les lignes de la page sont reconstruites."""
+    debit = credit = 0
+    if amount_index is not None:
+        debit, credit = result.amount_totals(result.columns[amount_index])
+    if sort_index is None:
+        indices = range(offset, min(offset + page_size, len(result)))
+    else:
+        indices = result.argsort(result.columns[sort_index], descending)[offset:offset + page_size]
+    page_rows = result.rows(indices) if len(indices) else []
+    return ResultPage(page_rows, number, page_size, len(result), debit, credit)
+
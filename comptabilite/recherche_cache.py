@@ -0,0 +1,170 @@
+"""
+Cache des résultats de la recherche des écritures (procédure SRE)
+"""
+import threading
+import time
+from collections import OrderedDict
+from itertools import chain
+
+from django.conf import settings
+from django.core.cache import cache
+
+from . import columnar
+
+
+STAMP_PREFIX = 'comptabilite:recherche:stamp:'
+ALL = '*'
+
+
+class ResultTooLarge(Exception):
+    """Résultat trop volumineux pour être mis en cache, `rows` reste lisible en flux."""
+
+    def __init__(self, columns, rows):
+        super().__init__('Résultat trop volumineux pour le cache')
+        self.columns = columns
+        self.rows = rows
+
+
+def read_result(columns, batches, max_rows):
+    """Charge le résultat en colonnes typées (ColumnarResult) s'il ne dépasse pas `max_rows` lignes.
+
+    `batches` sont les lots de lignes lus par `fetchmany` (recherche.iter_batches).
+    """
+    try:
+        return columns, columnar.from_batches(columns, batches, max_rows)
+    except columnar.TooManyRows as e:
+        raise ResultTooLarge(columns, chain(e.result.iter_rows(), chain.from_iterable(e.batches)))
+
+
+def make_key(params):
+    """Clé normalisée des paramètres de la procédure."""
+    return tuple(sorted((name, None if value is None else str(value)) for name, value in params.items()))
+
+
+def _stamp_keys(soc_id, per_id):
+    """Jetons de version dont dépend une recherche sur (société, période)."""
+    soc = ALL if soc_id is None else soc_id
+    per = ALL if per_id is None else per_id
+    return [
+        f'{STAMP_PREFIX}all',
+        f'{STAMP_PREFIX}soc:{soc}',
+        f'{STAMP_PREFIX}pair:{soc}:{per}',
+    ]
+
+
+def invalidate(soc_id=None, per_id=None):
+    """Invalide les recherches touchées par une écriture sur (société, période).
+
+    Une valeur None signifie « toutes » : toutes les périodes de la société,
+    ou toutes les sociétés. Les jetons sont stockés dans le cache Django et
+    sont donc partagés entre les processus si le backend de cache l'est.
+    """
+    if soc_id is None:
+        keys = [f'{STAMP_PREFIX}all']
+    elif per_id is None:
+        keys = [f'{STAMP_PREFIX}soc:{soc_id}', f'{STAMP_PREFIX}soc:{ALL}']
+    else:
+        keys = [
+            f'{STAMP_PREFIX}pair:{soc_id}:{per_id}',
+            f'{STAMP_PREFIX}pair:{soc_id}:{ALL}',
+            f'{STAMP_PREFIX}pair:{ALL}:{per_id}',
+            f'{STAMP_PREFIX}pair:{ALL}:{ALL}',
+        ]
+    stamp = time.time_ns()
+    cache.set_many({key: stamp for key in keys}, None)
+
+
+class _Flight:
+    """Exécution en cours de la procédure, partagée par les requêtes identiques."""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+
+
+class SearchResultCache:
+    """Cache LRU à durée de vie limitée des résultats de la procédure SRE.
+
+    Les recherches identiques lancées simultanément dans un même processus
+    partagent une seule exécution de la procédure.
+    """
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    @property
+    def ttl(self):
+        return getattr(settings, 'RECHERCHE_CACHE_TTL', 300)
+
+    @property
+    def max_entries(self):
+        return getattr(settings, 'RECHERCHE_CACHE_MAX_ENTRIES', 20)
+
+    @property
+    def max_rows(self):
+        return getattr(settings, 'RECHERCHE_CACHE_MAX_ROWS', 50000)
+
+    def get_or_load(self, params, loader):
+        """Retourne (colonnes, lignes) depuis le cache ou via `loader`.
+
+        `loader` exécute la procédure et retourne (colonnes, lignes) ; il lève
+        ResultTooLarge si le résultat dépasse `max_rows`, auquel cas les lignes
+        sont retournées en flux sans être mises en cache.
+        """
+        if self.ttl <= 0:
+            return self._load(loader)
+
+        key = make_key(params)
+        stamps = cache.get_many(_stamp_keys(params.get('soc_id'), params.get('per_id')))
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires, entry_stamps, result = entry
+                if expires > time.monotonic() and entry_stamps == stamps:
+                    self._entries.move_to_end(key)
+                    return result
+                del self._entries[key]
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = _Flight()
+
+        if not leader:
+            flight.event.wait()
+            if flight.result is not None:
+                return flight.result
+            # Échec ou résultat trop volumineux : exécution propre à cette requête
+            return self._load(loader)
+
+        try:
+            try:
+                result = loader()
+            except ResultTooLarge as e:
+                return e.columns, e.rows
+            with self._lock:
+                self._entries[key] = (time.monotonic() + self.ttl, stamps, result)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+            flight.result = result
+            return result
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            flight.event.set()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    @staticmethod
+    def _load(loader):
+        try:
+            return loader()
+        except ResultTooLarge as e:
+            return e.columns, e.rows
+
+
+search_cache = SearchResultCache()
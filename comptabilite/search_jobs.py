@@ -0,0 +1,346 @@
+"""
+Recherches d'écritures en arrière-plan (jobs SearchJob exécutés par run_search_jobs)
+
+Une recherche longue est soumise comme job au lieu d'occuper un worker web. Pendant
+l'exécution de la procédure SRE, un thread de surveillance interrompt l'instruction
+en cours (`cancel()` pyodbc, `interrupt()` SQLite) lorsque :
+    - l'utilisateur demande l'annulation (SearchJob.annulation_demandee) ;
+    - la durée dépasse SEARCH_JOB_TIMEOUT secondes ;
+    - la page n'interroge plus le statut depuis SEARCH_JOB_ABANDON_AFTER secondes
+      (onglet fermé), la requête n'occupe alors plus le DW pour rien.
+Le résultat (colonnes typées, voir columnar.py) est conservé dans un répertoire
+propre au job sous SEARCH_JOB_RESULT_DIR pendant SEARCH_JOB_RESULT_TTL secondes,
+l'utilisateur peut y revenir et le paginer. Les fichiers ne sont pas soumis à
+l'éviction d'un cache : un résultat est complet jusqu'à son expiration. Il est
+découpé en tranches de RESULT_CHUNK_ROWS lignes décrites par un en-tête (colonnes,
+bornes des tranches, débit/crédit) : une page sans tri ne lit que les tranches qui
+la contiennent. Le tri et les regroupements lisent tout le résultat. Un job n'est
+visible que de l'utilisateur qui l'a soumis (views.py).
+"""
+import pickle
+import shutil
+import threading
+import uuid
+from bisect import bisect_right
+import time
+from datetime import timedelta
+from decimal import Decimal
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+
+from . import columnar, recherche
+from .imports import _driver_cursor
+from .models import SearchJob
+
+
+RESULT_CHUNK_ROWS = 10000
+HEADER_FILE = 'header.pickle'
+# Répertoire d'un résultat en cours d'écriture, renommé une fois complet
+PARTIAL_SUFFIX = '.partial'
+
+
+def result_dir(job_id):
+    """Répertoire du résultat d'un job."""
+    return Path(settings.SEARCH_JOB_RESULT_DIR) / str(job_id)
+
+
+def chunk_path(directory, index):
+    return Path(directory) / f'{index}.pickle'
+
+
+def _write(path, value):
+    with open(path, 'wb') as f:
+        pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def _read(path):
+    with open(path, 'rb') as f:
+        return pickle.load(f)
+
+
+def submit(params, user=None):
+    """Soumet une recherche (paramètres de la procédure SRE) et retourne le job créé."""
+    return SearchJob.objects.create(
+        parametres=params,
+        utilisateur=user if user is not None and user.is_authenticated else None,
+        date_consultation=timezone.now(),
+    )
+
+
+def claim_next_job():
+    """Réserve la plus ancienne recherche en attente, ou retourne None s'il n'y en a pas.
+
+    Comme pour les imports, la réservation est un UPDATE conditionnel sur le statut.
+    Les résultats expirés sont d'abord supprimés (purge_results).
+    """
+    purge_results()
+    pending = SearchJob.objects.filter(statut=SearchJob.STATUT_EN_ATTENTE).order_by('id')
+    for job_id in pending.values_list('id', flat=True)[:10]:
+        claimed = SearchJob.objects.filter(id=job_id, statut=SearchJob.STATUT_EN_ATTENTE).update(
+            statut=SearchJob.STATUT_EN_COURS,
+            date_debut=timezone.now(),
+        )
+        if claimed:
+            return SearchJob.objects.get(id=job_id)
+    return None
+
+
+def cancel(job):
+    """Demande l'annulation d'une recherche : immédiate si elle attend, via le worker si elle tourne."""
+    now = timezone.now()
+    SearchJob.objects.filter(id=job.id, statut=SearchJob.STATUT_EN_ATTENTE).update(
+        statut=SearchJob.STATUT_ANNULE, annulation_demandee=True, date_fin=now,
+    )
+    SearchJob.objects.filter(id=job.id, statut=SearchJob.STATUT_EN_COURS).update(annulation_demandee=True)
+    job.refresh_from_db()
+    return job
+
+
+def touch(job):
+    """Enregistre une consultation du statut (la page est toujours ouverte)."""
+    job.date_consultation = timezone.now()
+    SearchJob.objects.filter(id=job.id).update(date_consultation=job.date_consultation)
+
+
+def _iter_chunks(columns, batches, chunk_rows):
+    """ColumnarResult d'environ `chunk_rows` lignes, construits au fil des lots du curseur."""
+    pending, count = [], 0
+    for batch in batches:
+        pending.append(batch)
+        count += len(batch)
+        if count >= chunk_rows:
+            yield columnar.from_batches(columns, pending)
+            pending, count = [], 0
+    if pending:
+        yield columnar.from_batches(columns, pending)
+
+
+def store_result(job_id, columns, batches, max_rows):
+    """Écrit le résultat par tranches dans le répertoire du job et retourne son nombre de lignes.
+
+    Les tranches sont écrites dans un répertoire temporaire renommé une fois l'en-tête
+    écrit : un résultat partiel n'est jamais lu, et il est supprimé si la lecture échoue.
+    Lève columnar.TooManyRows au-delà de `max_rows` lignes, sans lire la suite.
+    """
+    final = result_dir(job_id)
+    partial = final.with_name(f'{final.name}{PARTIAL_SUFFIX}-{uuid.uuid4().hex[:8]}')
+    partial.mkdir(parents=True)
+    try:
+        batches = iter(batches)
+        offsets = [0]
+        debit = credit = 0
+        for index, chunk in enumerate(_iter_chunks(columns, batches, RESULT_CHUNK_ROWS)):
+            if offsets[-1] + len(chunk) > max_rows:
+                raise columnar.TooManyRows(chunk, batches)
+            if 'FIN_Montant' in columns:
+                chunk_debit, chunk_credit = chunk.amount_totals('FIN_Montant')
+                debit += chunk_debit
+                credit += chunk_credit
+            _write(chunk_path(partial, index), chunk)
+            offsets.append(offsets[-1] + len(chunk))
+        _write(partial / HEADER_FILE, {'columns': columns, 'offsets': offsets, 'totals': (debit, credit)})
+        shutil.rmtree(final, ignore_errors=True)
+        partial.rename(final)
+    except BaseException:
+        shutil.rmtree(partial, ignore_errors=True)
+        raise
+    return offsets[-1]
+
+
+def delete_result(job_id):
+    """Supprime le résultat d'un job (sans erreur s'il n'existe pas)."""
+    shutil.rmtree(result_dir(job_id), ignore_errors=True)
+
+
+def purge_results():
+    """Supprime les résultats expirés, ceux des jobs supprimés et les écritures interrompues.
+
+    Retourne le nombre de répertoires supprimés.
+    """
+    root = Path(settings.SEARCH_JOB_RESULT_DIR)
+    if not root.is_dir():
+        return 0
+    limit = timezone.now() - timedelta(seconds=settings.SEARCH_JOB_RESULT_TTL)
+    kept = set(SearchJob.objects.filter(statut=SearchJob.STATUT_TERMINE, date_fin__gte=limit).values_list('id', flat=True))
+    running = set(SearchJob.objects.filter(statut=SearchJob.STATUT_EN_COURS).values_list('id', flat=True))
+    purged = 0
+    for directory in root.iterdir():
+        name, partial, _ = directory.name.partition(PARTIAL_SUFFIX)
+        # Résultat d'un job en cours : en écriture, ou renommé avant l'enregistrement du statut
+        if not name.isdigit() or int(name) in running or (not partial and int(name) in kept):
+            continue
+        shutil.rmtree(directory, ignore_errors=True)
+        purged += 1
+    return purged
+
+
+class StoredResult:
+    """Résultat d'un job conservé par tranches dans son répertoire (voir store_result)."""
+
+    def __init__(self, directory, header):
+        self.directory = directory
+        self.columns = header['columns']
+        self.offsets = header['offsets']
+        self.debit, self.credit = header['totals']
+
+    def __len__(self):
+        return self.offsets[-1]
+
+    @property
+    def chunk_count(self):
+        return len(self.offsets) - 1
+
+    def is_complete(self):
+        """Vrai si toutes les tranches décrites par l'en-tête sont présentes."""
+        return all(chunk_path(self.directory, index).is_file() for index in range(self.chunk_count))
+
+    def _chunk(self, index):
+        return _read(chunk_path(self.directory, index))
+
+    def page(self, number, page_size):
+        """Page `number` sans tri (recherche.ResultPage), lue dans les seules tranches qui la contiennent.
+
+        Retourne None si le résultat a été supprimé entre-temps.
+        """
+        start = min((number - 1) * page_size, len(self))
+        stop = min(start + page_size, len(self))
+        rows = []
+        try:
+            for index in range(max(0, bisect_right(self.offsets, start) - 1), self.chunk_count):
+                low = self.offsets[index]
+                if low >= stop:
+                    break
+                chunk = self._chunk(index)
+                rows.extend(chunk.rows(range(max(start - low, 0), min(stop - low, len(chunk)))))
+        except FileNotFoundError:
+            return None
+        return recherche.ResultPage(rows, number, page_size, len(self), self.debit, self.credit)
+
+    def load(self):
+        """Résultat complet (ColumnarResult) pour le tri et les regroupements, ou None s'il a été supprimé."""
+        try:
+            chunks = [self._chunk(index) for index in range(self.chunk_count)]
+        except FileNotFoundError:
+            return None
+        return columnar.concat(chunks) if chunks else None
+
+
+def load_result(job):
+    """StoredResult d'une recherche terminée, ou None si le résultat a expiré ou est incomplet."""
+    if job.statut != SearchJob.STATUT_TERMINE or job.date_fin is None:
+        return None
+    if timezone.now() - job.date_fin > timedelta(seconds=settings.SEARCH_JOB_RESULT_TTL):
+        return None
+    directory = result_dir(job.id)
+    try:
+        result = StoredResult(directory, _read(directory / HEADER_FILE))
+    except FileNotFoundError:
+        return None
+    return result if result.is_complete() else None
+
+
+def statement_canceller(cursor):
+    """Fonction qui interrompt l'instruction en cours sur `cursor` depuis un autre thread."""
+    driver_cursor = _driver_cursor(cursor)
+    if hasattr(driver_cursor, 'cancel'):
+        return driver_cursor.cancel
+    driver_connection = getattr(driver_cursor, 'connection', None)
+    if hasattr(driver_connection, 'interrupt'):
+        return driver_connection.interrupt
+    return None
+
+
+class Watchdog(threading.Thread):
+    """Surveille un job en cours et interrompt son instruction SQL si nécessaire."""
+
+    def __init__(self, job, canceller, timeout, abandon_after, interval=1.0):
+        super().__init__(name=f'search-job-{job.id}', daemon=True)
+        self.job = job
+        self.canceller = canceller
+        self.timeout = timeout
+        self.abandon_after = abandon_after
+        self.interval = interval
+        self.reason = None
+        self._stopped = threading.Event()
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+
+    def _check(self, started):
+        if self.timeout and time.monotonic() - started > self.timeout:
+            return SearchJob.STATUT_EXPIRE, f'Délai de {self.timeout} s dépassé'
+        state = SearchJob.objects.filter(id=self.job.id).values_list(
+            'annulation_demandee', 'date_consultation'
+        ).first()
+        if state is None:
+            return SearchJob.STATUT_ANNULE, 'Recherche supprimée'
+        requested, consulted = state
+        if requested:
+            return SearchJob.STATUT_ANNULE, "Annulée par l'utilisateur"
+        consulted = consulted or self.job.date_creation
+        if self.abandon_after and timezone.now() - consulted > timedelta(seconds=self.abandon_after):
+            return SearchJob.STATUT_ANNULE, 'Recherche abandonnée (page fermée)'
+        return None
+
+    def run(self):
+        started = time.monotonic()
+        try:
+            while not self._stopped.wait(self.interval):
+                self.reason = self._check(started)
+                if self.reason:
+                    if self.canceller:
+                        self.canceller()
+                    return
+        finally:
+            # Connexion propre à ce thread
+            connection.close()
+
+
+def _sre_params(parametres):
+    params = dict(parametres)
+    for name in ('fin_solde', 'solde_min', 'solde_max'):
+        if params.get(name) is not None:
+            params[name] = Decimal(str(params[name]))
+    return params
+
+
+def run_job(job):
+    """Exécute une recherche réservée et conserve son résultat (voir store_result)."""
+    max_rows = settings.SEARCH_JOB_MAX_ROWS
+    watchdog = None
+    try:
+        with connection.cursor() as cursor:
+            watchdog = Watchdog(
+                job, statement_canceller(cursor), settings.SEARCH_JOB_TIMEOUT, settings.SEARCH_JOB_ABANDON_AFTER,
+            )
+            watchdog.start()
+            try:
+                columns, batches = recherche.execute_search(cursor, _sre_params(job.parametres))
+                nb_lignes = store_result(job.id, columns, batches, max_rows)
+            finally:
+                watchdog.stop()
+        if watchdog.reason:
+            job.statut, job.erreur = watchdog.reason
+        else:
+            job.nb_lignes = nb_lignes
+            job.statut = SearchJob.STATUT_TERMINE
+    except columnar.TooManyRows:
+        job.statut = SearchJob.STATUT_ERREUR
+        job.erreur = f'Résultat supérieur à {max_rows} lignes, affinez les critères'
+    except Exception as e:
+        # L'interruption de l'instruction remonte comme une erreur du pilote
+        if watchdog is not None and watchdog.reason:
+            job.statut, job.erreur = watchdog.reason
+        else:
+            job.statut = SearchJob.STATUT_ERREUR
+            job.erreur = str(e)
+    if job.statut != SearchJob.STATUT_TERMINE:
+        # Résultat complet d'une recherche interrompue après sa lecture
+        delete_result(job.id)
+    job.date_fin = timezone.now()
+    job.save(update_fields=['statut', 'erreur', 'nb_lignes', 'date_fin'])
+    return job
@@ -0,0 +1,177 @@
+"""
+Allocation des identifiants des tables référentielles (hi/lo sur T_E_Sequence_SEQ)
+
+Les tables T_E_Societe_SOC, T_E_Stade_STA, etc. n'ont pas de colonne IDENTITY.
+Au lieu d'un `SELECT MAX(id) + 1` avant chaque insertion, chaque processus
+réserve des blocs d'identifiants dans la table compteur T_E_Sequence_SEQ
+(une ligne par table) : la réservation est un UPDATE atomique, donc sans
+collision entre processus, et un bloc sert plusieurs insertions.
+
+Les autres écrivains des tables (application C#, procédures du DW) calculent
+encore MAX(id) + 1 et peuvent prendre un identifiant déjà réservé : sur une
+violation de clé primaire, le compteur est recalé sur le MAX(id) de la table
+(`resync`) et l'insertion est retentée une fois.
+
+`bulk_create` n'envoie pas post_save : le signal post_bulk_create le remplace
+pour l'invalidation des listes des formulaires et de la saisie assistée (signals.py).
+"""
+import threading
+
+from django.conf import settings
+from django.db import IntegrityError, connection, models, transaction
+from django.dispatch import Signal
+
+
+SEQUENCE_TABLE = 'T_E_Sequence_SEQ'
+
+# Envoyé après un bulk_create (arguments : sender, objs)
+post_bulk_create = Signal()
+
+
+def _reserve(table, column, count):
+    """Réserve `count` identifiants et retourne le premier.
+
+    La ligne compteur est créée à la première réservation à partir du
+    MAX(id) existant de la table.
+    """
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f"UPDATE {SEQUENCE_TABLE} SET SEQ_Valeur = SEQ_Valeur + %s WHERE SEQ_Nom = %s",
+            [count, table],
+        )
+        if cursor.rowcount == 0:
+            try:
+                with transaction.atomic():
+                    cursor.execute(
+                        f"INSERT INTO {SEQUENCE_TABLE} (SEQ_Nom, SEQ_Valeur) "
+                        f"SELECT %s, COALESCE(MAX({column}), 0) + %s FROM {table}",
+                        [table, count],
+                    )
+            except IntegrityError:
+                # Ligne créée entre-temps par un autre processus
+                cursor.execute(
+                    f"UPDATE {SEQUENCE_TABLE} SET SEQ_Valeur = SEQ_Valeur + %s WHERE SEQ_Nom = %s",
+                    [count, table],
+                )
+        cursor.execute(f"SELECT SEQ_Valeur FROM {SEQUENCE_TABLE} WHERE SEQ_Nom = %s", [table])
+        last = cursor.fetchone()[0]
+    return last - count + 1
+
+
+def resync(model):
+    """Recale le compteur de `model` sur le MAX(id) de sa table et oublie le bloc en cours."""
+    table = model._meta.db_table
+    column = model._meta.pk.column
+    allocator.discard(table)
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f"UPDATE {SEQUENCE_TABLE} SET SEQ_Valeur = (SELECT COALESCE(MAX({column}), 0) FROM {table}) "
+            f"WHERE SEQ_Nom = %s AND SEQ_Valeur < (SELECT COALESCE(MAX({column}), 0) FROM {table})",
+            [table],
+        )
+
+
+def _ids_taken(model, ids):
+    """Vrai si un des identifiants `ids` (réservés) existe déjà : collision avec un autre écrivain."""
+    return bool(ids) and model._base_manager.filter(pk__gte=min(ids), pk__lte=max(ids)).exists()
+
+
+class BlockAllocator:
+    """Distribue les identifiants d'un bloc réservé, par table, dans le processus."""
+
+    def __init__(self):
+        self._blocks = {}
+        self._lock = threading.Lock()
+
+    @property
+    def block_size(self):
+        return getattr(settings, 'ID_BLOCK_SIZE', 20)
+
+    def allocate(self, model, count=1):
+        """Retourne une liste de `count` identifiants libres pour `model`."""
+        table = model._meta.db_table
+        column = model._meta.pk.column
+        with self._lock:
+            next_id, last_id = self._blocks.get(table, (1, 0))
+            ids = list(range(next_id, min(last_id, next_id + count - 1) + 1))
+            missing = count - len(ids)
+            if missing:
+                # Les lots volumineux réservent exactement ce qui manque, les insertions
+                # unitaires un bloc complet pour les suivantes. Dans une transaction en
+                # cours, la réservation peut être annulée : on ne garde pas de reliquat.
+                if connection.in_atomic_block:
+                    size = missing
+                else:
+                    size = max(missing, self.block_size)
+                first = _reserve(table, column, size)
+                ids.extend(range(first, first + missing))
+                next_id, last_id = first + missing, first + size - 1
+            else:
+                next_id += count
+            self._blocks[table] = (next_id, last_id)
+        return ids
+
+    def discard(self, table):
+        with self._lock:
+            self._blocks.pop(table, None)
+
+    def reset(self):
+        with self._lock:
+            self._blocks.clear()
+
+
+allocator = BlockAllocator()
+
+
+class AllocatedIdQuerySet(models.QuerySet):
+    """QuerySet dont `bulk_create` attribue les identifiants manquants en une réservation."""
+
+    def _allocate(self, pending):
+        for obj, pk in zip(pending, allocator.allocate(self.model, len(pending))):
+            obj.pk = pk
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        pending = [obj for obj in objs if not obj.pk]
+        if pending:
+            self._allocate(pending)
+        try:
+            with transaction.atomic(using=self.db):
+                created = super().bulk_create(objs, *args, **kwargs)
+        except IntegrityError:
+            if not _ids_taken(self.model, [obj.pk for obj in pending]):
+                raise
+            # Identifiants pris par un autre écrivain : nouvelle réservation après recalage
+            resync(self.model)
+            self._allocate(pending)
+            created = super().bulk_create(objs, *args, **kwargs)
+        post_bulk_create.send(sender=self.model, objs=created)
+        return created
+
+
+class AllocatedIdMixin(models.Model):
+    """Mixin des modèles dont l'identifiant est alloué par bloc au lieu de MAX(id) + 1."""
+
+    objects = AllocatedIdQuerySet.as_manager()
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        if self.pk:
+            super().save(*args, **kwargs)
+            return
+        model = type(self)
+        self.pk = allocator.allocate(model)[0]
+        # Identifiant neuf : inutile de tenter un UPDATE avant l'INSERT
+        kwargs.setdefault('force_insert', True)
+        try:
+            with transaction.atomic():
+                super().save(*args, **kwargs)
+        except IntegrityError:
+            if not _ids_taken(model, [self.pk]):
+                raise
+            # Identifiant pris par un autre écrivain : nouvelle réservation après recalage
+            resync(model)
+            self.pk = allocator.allocate(model)[0]
+            super().save(*args, **kwargs)
@@ -1,7 +1,7 @@
 from rest_framework import serializers
 from .models import (
     Societe, Stade, NatureCompte, TypeValeur, PlanCompteGroupe,
-    PlanCompteLocal, Devise
+    PlanCompteLocal, Devise, FinanceFaits
 )
 
 
@@ -53,4 +53,18 @@ class DeviseSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
-# Sérialiseurs pour les écritures comptables seront ajoutés plus tard
+class FinanceFaitsSerializer(serializers.ModelSerializer):
+    """Écriture du DW avec les codes du compte, du type valeur et des axes (voir faits.LIST_FIELDS)"""
+    compte = serializers.CharField(source='compte.compte', read_only=True)
+    compte_intitule = serializers.CharField(source='compte.intitule', read_only=True)
+    type_valeur = serializers.CharField(source='type_valeur.code', read_only=True, default=None)
+    axe1 = serializers.CharField(source='axe1.code', read_only=True, default=None)
+    axe2 = serializers.CharField(source='axe2.code', read_only=True, default=None)
+    axe3 = serializers.CharField(source='axe3.code', read_only=True, default=None)
+
+    class Meta:
+        model = FinanceFaits
+        fields = [
+            'id', 'periode', 'stade', 'societe', 'version_id', 'lot_id', 'compte', 'compte_intitule',
+            'type_valeur', 'axe1', 'axe2', 'axe3', 'montant', 'solde', 'date',
+        ]
@@ -0,0 +1,20 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from parametres.models import AdminText
+from . import choice_cache, typeahead
+from .dynamic_labels import invalidate_labels
+from .sequences import post_bulk_create
+
+
+@receiver([post_save, post_delete], sender=AdminText)
+def admin_text_changed(sender, **kwargs):
+    """Invalide le cache des libellés à chaque modification d'un AdminText"""
+    invalidate_labels()
+
+
+@receiver([post_save, post_delete, post_bulk_create])
+def referentiel_changed(sender, **kwargs):
+    """Invalide les choix des formulaires et les index de saisie assistée à chaque modification d'un référentiel"""
+    if any(provider.model is sender for provider in choice_cache.PROVIDERS) or sender in typeahead.INDEXED_MODELS:
+        choice_cache.invalidate(sender)
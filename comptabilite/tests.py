@@ -1,3 +1,1169 @@
-from django.test import TestCase
+import csv
+import importlib
+import io
+import json
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import types
+from datetime import datetime, timedelta
+from decimal import Decimal
+from itertools import islice
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+
+from django.db.backends.base.base import BaseDatabaseWrapper
+from django.db.backends.base.client import BaseDatabaseClient
+from django.db.backends.base.creation import BaseDatabaseCreation
+from django.db.backends.base.features import BaseDatabaseFeatures
+from django.db.backends.base.introspection import BaseDatabaseIntrospection
+from django.db.backends.base.operations import BaseDatabaseOperations
+from django.db.backends.base.schema import BaseDatabaseSchemaEditor
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import DatabaseError, connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from comptabilite import (
+    benchmarks, choice_cache, columnar, comparaison, dataset, dw_emulation, dynamic_labels, faits, imports, pivot, pool,
+    recherche, recherche_cache, search_jobs, timing, typeahead, workers,
+)
+from comptabilite.models import ImportJob, NatureCompte, PlanCompteGroupe, PlanCompteLocal, SearchJob, Societe, Stade
+from comptabilite import views
+from comptabilite.views import EcrituresRechercheForm
+from parametres.models import AdminText
+from referentiel.models import Periode
+
+
+class FakeConnection:
+    autocommit = True
+
+    def __init__(self, conn_str):
+        self.conn_str = conn_str
+        self.closed = False
+
+    def cursor(self):
+        return mock.MagicMock()
+
+    def close(self):
+        self.closed = True
+
+
+class FakeMSSQLDatabaseWrapper(BaseDatabaseWrapper):
+    """Backend mssql-django réduit à l'essentiel : sa propre connexion ne doit pas être utilisée."""
+
+    vendor = 'microsoft'
+    client_class = BaseDatabaseClient
+    creation_class = BaseDatabaseCreation
+    features_class = BaseDatabaseFeatures
+    introspection_class = BaseDatabaseIntrospection
+    ops_class = BaseDatabaseOperations
+
+    def get_new_connection(self, conn_params):
+        raise AssertionError('connexion du backend mssql utilisée au lieu de _connect')
+
+
+def fake_mssql_modules(connect):
+    """Modules pyodbc et mssql de substitution (pilote ODBC absent de l'environnement de test)."""
+    modules = {
+        'pyodbc': types.ModuleType('pyodbc'),
+        'mssql': types.ModuleType('mssql'),
+        'mssql.base': types.ModuleType('mssql.base'),
+        'mssql.operations': types.ModuleType('mssql.operations'),
+        'mssql.client': types.ModuleType('mssql.client'),
+        'mssql.creation': types.ModuleType('mssql.creation'),
+        'mssql.introspection': types.ModuleType('mssql.introspection'),
+        'mssql.schema': types.ModuleType('mssql.schema'),
+    }
+    modules['pyodbc'].connect = connect
+    modules['mssql.base'].DatabaseWrapper = FakeMSSQLDatabaseWrapper
+    modules['mssql.operations'].DatabaseOperations = BaseDatabaseOperations
+    modules['mssql.client'].DatabaseClient = BaseDatabaseClient
+    modules['mssql.creation'].DatabaseCreation = BaseDatabaseCreation
+    modules['mssql.introspection'].DatabaseIntrospection = BaseDatabaseIntrospection
+    modules['mssql.schema'].DatabaseSchemaEditor = BaseDatabaseSchemaEditor
+    return modules
+
+
+class CustomMSSQLDatabaseWrapperPoolTests(SimpleTestCase):
+    alias = 'test_custom_mssql_pool'
+
+    def setUp(self):
+        self.connect = mock.Mock(side_effect=FakeConnection)
+        with mock.patch.dict(sys.modules, fake_mssql_modules(self.connect)):
+            sys.modules.pop('comptabilite.database', None)
+            database = importlib.import_module('comptabilite.database')
+        self.addCleanup(sys.modules.pop, 'comptabilite.database', None)
+        self.addCleanup(pool._pools.pop, self.alias, None)
+        self.wrapper = database.CustomMSSQLDatabaseWrapper({
+            'NAME': 'DW', 'HOST': 'sql', 'USER': 'user', 'PASSWORD': 'secret',
+            'OPTIONS': {'instance': 'INST', 'pool': {'max_size': 2, 'min_size': 2, 'check_idle': 3600}},
+        }, alias=self.alias)
+
+    def test_connections_are_borrowed_from_the_pool(self):
+        first = self.wrapper.get_new_connection(self.wrapper.get_connection_params())
+        self.assertIsInstance(first, FakeConnection)
+        self.assertIn('SERVER=sql\\INST', first.conn_str)
+        self.wrapper.connection = first
+        self.wrapper._close()
+        self.assertFalse(first.closed)
+
+        second = self.wrapper.get_new_connection(self.wrapper.get_connection_params())
+        self.assertIs(second, first)
+        self.assertEqual(self.connect.call_count, 1)
+        stats = pool.pool_stats()[self.alias]
+        self.assertEqual((stats['created'], stats['reused'], stats['in_use']), (1, 1, 1))
+
+    def test_warm_up_connections_are_reused(self):
+        self.assertEqual(self.wrapper.warm_up_pool(), 2)
+        connection = self.wrapper.get_new_connection(self.wrapper.get_connection_params())
+        self.wrapper.connection = connection
+        self.wrapper._close()
+        self.assertFalse(connection.closed)
+        self.assertEqual(self.connect.call_count, 2)
+        self.assertEqual(pool.pool_stats()[self.alias]['idle'], 2)
+
+
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class RechercheOrmTests(TestCase):
+    """Recherche par l'ORM (faits.py) comparée à la procédure SRE émulée."""
+
+    @classmethod
+    def setUpTestData(cls):
+        rng = random.Random(20)
+        cls.refs = dataset.generate_referentiels(1, rng, 2024, 1)
+        dataset.insert_faits(dataset.iter_faits(cls.refs, rng, 5))
+
+    def params(self, **criteria):
+        params = recherche.build_sre_params({})
+        params.update(criteria)
+        return params
+
+    def sre(self, params):
+        with connection.cursor() as cursor:
+            columns = recherche.execute_sre(cursor, params)
+            return columns, sorted(cursor.fetchall())
+
+    def search(self, params):
+        with connection.cursor() as cursor:
+            columns, batches = recherche.execute_search(cursor, params)
+            return columns, sorted(recherche.iter_rows(batches))
+
+    def both_paths(self, params):
+        """Résultats de la recherche par la procédure (appels par valeur) puis par l'ORM."""
+        sre = self.search(params)
+        with override_settings(RECHERCHE_ORM_ENABLED=True):
+            orm = self.search(params)
+        return sre, orm
+
+    @override_settings(RECHERCHE_ORM_ENABLED=True)
+    def test_orm_returns_the_sre_columns_and_rows(self):
+        params = self.params(soc_id=self.refs['societes'][0], per_id=self.refs['periodes'][0])
+        self.assertTrue(faits.handles(params))
+        sre_columns, sre_rows = self.sre(params)
+        orm_columns, orm_rows = self.search(params)
+        self.assertEqual(orm_columns, sre_columns)
+        self.assertIn('FIN_Solde', orm_columns)
+        self.assertEqual(len(orm_rows), 5)
+        self.assertEqual(orm_rows, sre_rows)
+
+    def test_multiple_values_call_the_procedure_per_value(self):
+        params = self.params(
+            per_ids=self.refs['periodes'][:2], soc_ids=self.refs['societes'][:3], tyv_ids=self.refs['types_valeur'],
+        )
+        self.assertEqual(len(recherche.sre_calls(params)), 12)
+        (columns, rows), (orm_columns, orm_rows) = self.both_paths(params)
+        self.assertEqual(columns, orm_columns)
+        self.assertEqual(len(rows), 2 * 3 * 5)
+        self.assertEqual(rows, orm_rows)
+
+    def test_compte_prefix_and_range_expand_the_plan(self):
+        soc_id = self.refs['societes'][0]
+        comptes = sorted(PlanCompteLocal.objects.filter(societe_id=soc_id).values_list('compte', flat=True))
+        low, high = comptes[10], comptes[40]
+        for criteria in ({'compte_prefix': comptes[0][0]}, {'compte_min': low, 'compte_max': high}):
+            params = self.params(soc_id=soc_id, **criteria)
+            expected = recherche.expand_comptes(params)
+            self.assertTrue(expected)
+            self.assertEqual([call['pcl_compte'] for call in recherche.sre_calls(params)], expected)
+            (columns, rows), (_, orm_rows) = self.both_paths(params)
+            self.assertTrue(rows)
+            self.assertEqual(rows, orm_rows)
+
+    def test_solde_bounds_filter_the_solde(self):
+        bounds = {'solde_min': Decimal('-10000'), 'solde_max': Decimal('10000')}
+        params = self.params(soc_id=self.refs['societes'][0], **bounds)
+        (columns, rows), (_, orm_rows) = self.both_paths(params)
+        solde, montant = columns.index('FIN_Solde'), columns.index('FIN_Montant')
+        self.assertTrue(rows)
+        self.assertEqual(rows, orm_rows)
+        self.assertTrue(all(bounds['solde_min'] <= row[solde] <= bounds['solde_max'] for row in rows))
+        self.assertTrue(any(not bounds['solde_min'] <= row[montant] <= bounds['solde_max'] for row in rows))
+
+    @override_settings(RECHERCHE_SRE_MAX_CALLS=5)
+    def test_too_many_calls_are_refused(self):
+        params = self.params(per_ids=self.refs['periodes'][:3], soc_ids=self.refs['societes'][:2])
+        with connection.cursor() as cursor, self.assertRaises(recherche.SearchUnavailable):
+            recherche.execute_search(cursor, params)
+        form = EcrituresRechercheForm({'solde_min': '0', 'pcl_compte': '6*'})
+        self.assertTrue(form.is_valid(), form.errors)
+
+    def test_search_error_is_shown_instead_of_no_result(self):
+        with mock.patch.object(recherche, 'execute_search', side_effect=RuntimeError('DW')), \
+                self.assertLogs('comptabilite', 'ERROR'):
+            response = self.client.get(reverse('comptabilite:ecritures_recherche'), {'pcl_compte': '100000'})
+        self.assertContains(response, "Erreur lors de l&#x27;exécution de la recherche")
+        self.assertNotContains(response, 'Aucun résultat')
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class EcrituresRechercheModesTests(SimpleTestCase):
+    """Modes de la page de recherche (views.ecritures_recherche), testés un par un."""
+
+    def paging(self, **query):
+        from django.test import RequestFactory
+        return views._search_paging(RequestFactory().get('/', query))
+
+    def test_paging_falls_back_to_the_defaults(self):
+        self.assertEqual(self.paging(), (1, recherche.DEFAULT_PAGE_SIZE, '', 'asc'))
+        self.assertEqual(self.paging(page='0', page_size='7'), (1, recherche.DEFAULT_PAGE_SIZE, '', 'asc'))
+        size = recherche.PAGE_SIZES[-1]
+        self.assertEqual(self.paging(page='3', page_size=str(size), sort='SOC_id', order='desc'), (3, size, 'SOC_id', 'desc'))
+
+    def test_grid_is_a_sorted_page_or_a_pivot(self):
+        columns = ['SOC_id', 'FIN_Montant']
+        rows = [(1, 5), (2, -3), (1, 2)]
+        grid = views._search_grid(columns, rows, [], None, views.SearchPaging(1, 2, 'FIN_Montant', 'desc'))
+        self.assertEqual(grid['page_obj'].rows, [(1, 5), (1, 2)])
+        self.assertEqual((grid['page_obj'].count, grid['page_obj'].debit, grid['page_obj'].credit), (3, 7, 3))
+        self.assertEqual(views._search_grid([], [], [], None, self.paging()), {})
+        grid = views._search_grid(['FIN_Montant'], [(1,)], ['compte'], None, self.paging())
+        self.assertIn('PCL_Compte', grid['pivot_error'])
+
+    def test_comparison_errors_are_reported(self):
+        with mock.patch.object(views.comparaison, 'compare', side_effect=views.comparaison.ComparisonError('Période')):
+            self.assertEqual(views._compare_search({}), {'comparison_error': 'Période'})
+        with mock.patch.object(views.comparaison, 'compare', side_effect=RuntimeError), self.assertLogs('comptabilite'):
+            self.assertEqual(views._compare_search({}), {'search_error': views.SEARCH_ERROR_MESSAGE})
+
+    def test_unfinished_job_has_no_grid(self):
+        with mock.patch.object(search_jobs, 'load_result', return_value=None):
+            self.assertEqual(views._job_search(None, [], None, self.paging()), {})
+
+
+class SearchJobTests(TestCase):
+    columns = ['FIN_id', 'FIN_Montant']
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('proprietaire', password='secret')
+        cls.other = User.objects.create_user('autre', password='secret')
+        cls.job = SearchJob.objects.create(
+            parametres={'pcl_compte': '100000'}, utilisateur=cls.owner, statut=SearchJob.STATUT_TERMINE,
+            date_fin=timezone.now(),
+        )
+
+    def setUp(self):
+        result_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, result_dir, ignore_errors=True)
+        settings_override = override_settings(SEARCH_JOB_RESULT_DIR=result_dir)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.rows = [(fin_id, Decimal(fin_id) - 5) for fin_id in range(1, 11)]
+        self.store(self.job.id, self.rows)
+
+    def store(self, job_id, rows, max_rows=100):
+        batches = [rows[start:start + 2] for start in range(0, len(rows), 2)]
+        with mock.patch.object(search_jobs, 'RESULT_CHUNK_ROWS', 3):
+            return search_jobs.store_result(job_id, self.columns, batches, max_rows)
+
+    def test_page_reads_only_its_chunks(self):
+        # Tranches de 4 lignes (lots de 2) : la page 2 de 4 lignes est dans la deuxième
+        result = search_jobs.load_result(self.job)
+        with mock.patch.object(search_jobs, '_read', wraps=search_jobs._read) as read:
+            page = result.page(2, 4)
+        self.assertEqual([call.args[0].name for call in read.call_args_list], ['1.pickle'])
+        self.assertEqual(page.rows, self.rows[4:8])
+        self.assertEqual((page.count, page.debit, page.credit), (10, 15, 10))
+
+    def test_full_result_for_sorting(self):
+        result = search_jobs.load_result(self.job).load()
+        self.assertEqual(result.rows(), self.rows)
+
+    def test_missing_chunk_or_expired_result_is_not_read(self):
+        search_jobs.chunk_path(search_jobs.result_dir(self.job.id), 0).unlink()
+        self.assertIsNone(search_jobs.load_result(self.job))
+        self.store(self.job.id, self.rows)
+        with override_settings(SEARCH_JOB_RESULT_TTL=0):
+            self.assertIsNone(search_jobs.load_result(self.job))
+            self.assertEqual(search_jobs.purge_results(), 1)
+        self.assertFalse(search_jobs.result_dir(self.job.id).exists())
+
+    def test_partial_chunks_are_deleted_when_the_result_is_too_large(self):
+        with self.assertRaises(columnar.TooManyRows):
+            self.store(self.job.id + 1, self.rows, max_rows=5)
+        self.assertEqual(
+            [path.name for path in search_jobs.result_dir(self.job.id).parent.iterdir()], [str(self.job.id)],
+        )
+
+    def test_owner_sees_the_job(self):
+        self.client.force_login(self.owner)
+        url = reverse('comptabilite:ecritures_recherche')
+        response = self.client.get(url, {'pcl_compte': '100000', 'job': self.job.id})
+        self.assertEqual(response.context['page_obj'].rows, self.rows)
+        response = self.client.get(reverse('comptabilite:search_job_status', args=[self.job.id]))
+        self.assertEqual(response.json()['status'], SearchJob.STATUT_TERMINE)
+
+    def test_other_users_cannot_see_or_cancel_the_job(self):
+        url = reverse('comptabilite:ecritures_recherche')
+        search = {'pcl_compte': '100000', 'job': self.job.id}
+        self.assertEqual(self.client.get(url, search).status_code, 404)
+        self.client.force_login(self.other)
+        self.assertEqual(self.client.get(url, search).status_code, 404)
+        status = self.client.get(reverse('comptabilite:search_job_status', args=[self.job.id]))
+        self.assertEqual(status.status_code, 404)
+        cancel = self.client.post(reverse('comptabilite:search_job_cancel', args=[self.job.id]))
+        self.assertEqual(cancel.status_code, 404)
+        self.job.refresh_from_db()
+        self.assertFalse(self.job.annulation_demandee)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class SequenceTests(TestCase):
+    """Identifiants alloués par bloc (sequences.py) face aux insertions MAX(id) + 1 d'autres écrivains."""
+
+    def insert_max_plus_one(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "INSERT INTO T_E_Stade_STA (STA_Id, STA_Intitule) "
+                "SELECT COALESCE(MAX(STA_Id), 0) + 1, 'Autre écrivain' FROM T_E_Stade_STA"
+            )
+
+    def test_save_resyncs_after_a_collision(self):
+        first = Stade.objects.create(intitule='Réel')
+        self.insert_max_plus_one()
+        second = Stade.objects.create(intitule='Budget')
+        self.assertGreater(second.pk, first.pk + 1)
+        self.assertEqual(Stade.objects.get(pk=second.pk).intitule, 'Budget')
+
+    def test_bulk_create_resyncs_after_a_collision(self):
+        first = Stade.objects.create(intitule='Réel')
+        self.insert_max_plus_one()
+        created = Stade.objects.bulk_create([Stade(intitule='Budget'), Stade(intitule='Prévision')])
+        self.assertTrue(all(stade.pk > first.pk + 1 for stade in created))
+        self.assertEqual(Stade.objects.filter(pk__in=[stade.pk for stade in created]).count(), 2)
+
+    def test_bulk_create_invalidates_the_choices(self):
+        choice_cache.invalidate(Stade)
+        before = len(choice_cache.STADES.objects())
+        Stade.objects.bulk_create([Stade(intitule='Budget'), Stade(intitule='Prévision')])
+        self.assertEqual(len(choice_cache.STADES.objects()), before + 2)
+
+
+class ImportBudgetExcelTests(TestCase):
+    """Imports Excel dans T_Temp_ImportBudgetExcel, isolés par identifiant d'import (IMP_Lot)."""
+
+    def batch_rows(self, batch_id):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT Societe FROM T_Temp_ImportBudgetExcel WHERE IMP_Lot = %s ORDER BY Societe", [batch_id]
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    def budget_row(self, societe):
+        return (societe,) + (None,) * (len(imports.BUDGET_EXCEL_COLUMNS) - 1)
+
+    def workbook(self, *societes):
+        from openpyxl import Workbook
+        workbook = Workbook()
+        sheet = workbook.active
+        sheet.append(imports.BUDGET_EXCEL_COLUMNS)
+        for societe in societes:
+            sheet.append([societe])
+        output = io.BytesIO()
+        workbook.save(output)
+        return SimpleUploadedFile('budget.xlsx', output.getvalue())
+
+    def test_rows_are_inserted_in_batches(self):
+        batch_id = imports.new_staging_batch_id()
+        rows = (self.budget_row(f'S{index}') for index in range(5))
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(imports.bulk_insert_budget_rows(rows, batch_id=batch_id, batch_size=2), 5)
+        inserts = [query['sql'].split(':', 1)[0] for query in queries if 'INSERT INTO T_Temp_ImportBudgetExcel' in query['sql']]
+        self.assertEqual(inserts, ['2 times', '2 times', '1 times'])
+        self.assertEqual(self.batch_rows(batch_id), [f'S{index}' for index in range(5)])
+
+    def test_workbook_is_read_row_by_row(self):
+        import openpyxl
+        from openpyxl import Workbook
+        workbook = Workbook()
+        workbook.active.append(['Societe', 'Stade'])
+        workbook.active.append(['S1', 2024])
+        workbook.active.append([None, None])
+        workbook.active.append(['S2'])
+        output = io.BytesIO()
+        workbook.save(output)
+        upload = SimpleUploadedFile('budget.xlsx', output.getvalue())
+        with mock.patch.object(openpyxl, 'load_workbook', wraps=openpyxl.load_workbook) as load_workbook:
+            rows = imports.budget_rows(islice(imports.iter_excel_rows(upload), 1, None))
+            load_workbook.assert_not_called()
+            first = next(rows)
+        self.assertEqual(load_workbook.call_args.kwargs['read_only'], True)
+        padding = (None,) * (len(imports.BUDGET_EXCEL_COLUMNS) - 2)
+        self.assertEqual(first, ('S1', '2024') + padding)
+        self.assertEqual(list(rows), [('S2', None) + padding])
+
+    def test_batches_are_isolated_and_purged(self):
+        old, new = '20200101000000_aaaaaaaa', imports.new_staging_batch_id()
+        imports.bulk_insert_budget_rows([self.budget_row('A'), self.budget_row('B')], batch_id=old)
+        imports.bulk_insert_budget_rows([self.budget_row('C')], batch_id=new)
+        self.assertEqual(imports.purge_staging_batches(24), 2)
+        self.assertEqual(self.batch_rows(old), [])
+        self.assertEqual(self.batch_rows(new), ['C'])
+        self.assertEqual(imports.delete_staging_batch(new), 1)
+        self.assertEqual(imports.delete_staging_batch(new), 0)
+
+    def test_last_batch_empties_the_table(self):
+        batch_id = imports.new_staging_batch_id()
+        imports.bulk_insert_budget_rows([self.budget_row('A'), self.budget_row('B')], batch_id=batch_id)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(imports.delete_staging_batch(batch_id), 2)
+        self.assertIn('DELETE FROM T_Temp_ImportBudgetExcel', [query['sql'] for query in queries])
+        self.assertEqual(self.batch_rows(batch_id), [])
+
+    def test_upload_replaces_the_previous_batch_of_the_session_only(self):
+        self.client.force_login(User.objects.create_user('importeur'))
+        other = imports.new_staging_batch_id()
+        imports.bulk_insert_budget_rows([self.budget_row('Autre')], batch_id=other)
+        url = reverse('comptabilite:ecritures_import_file')
+        with mock.patch.object(recherche_cache, 'invalidate') as invalidate:
+            first = self.client.post(url, {'excel_file': self.workbook('S1', 'S2')}).json()
+            second = self.client.post(url, {'excel_file': self.workbook('S3')}).json()
+        self.assertEqual(second['staging_table'], 'T_Temp_ImportBudgetExcel')
+        self.assertEqual(self.batch_rows(first['batch_id']), [])
+        self.assertEqual(self.batch_rows(second['batch_id']), ['S3'])
+        self.assertEqual(self.batch_rows(other), ['Autre'])
+        invalidate.assert_not_called()
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class TypeaheadTests(TestCase):
+    """Saisie assistée des comptes et des axes (typeahead.py)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('saisie')
+        nature = NatureCompte.objects.create(code='TA6', intitule='Charges')
+        groupe = PlanCompteGroupe.objects.create(code='TA601', intitule='Achats', nature_compte=nature)
+        cls.societes = Societe.objects.bulk_create([Societe(code='TA1', intitule='A'), Societe(code='TA2', intitule='B')])
+        PlanCompteLocal.objects.bulk_create([
+            PlanCompteLocal(compte=compte, intitule=f'Compte {compte}', societe=societe, groupe=groupe)
+            for societe, compte in [
+                (cls.societes[0], '601000'), (cls.societes[0], '602000'), (cls.societes[1], '601000'),
+                (cls.societes[1], '607000'), (cls.societes[1], '701000'),
+            ]
+        ])
+
+    def setUp(self):
+        typeahead.COMPTES._entry = None
+        self.client.force_login(self.user)
+
+    def codes(self, response):
+        return [result['code'] for result in response.json()['results']]
+
+    def test_prefix_index_is_sorted_and_case_insensitive(self):
+        index = typeahead.PrefixIndex([('ab2', 'x'), ('AB1', 'y'), ('b1', 'z')])
+        self.assertEqual(index.search('ab'), [('AB1', 'y'), ('ab2', 'x')])
+        self.assertEqual(index.search('ab', limit=1), [('AB1', 'y')])
+        self.assertEqual(index.search('c'), [])
+
+    def test_comptes_of_the_groupe_or_of_one_societe(self):
+        url = reverse('comptabilite:typeahead_comptes')
+        self.assertEqual(self.codes(self.client.get(url, {'q': '60*'})), ['601000', '602000', '607000'])
+        response = self.client.get(url, {'q': '60', 'soc_id': self.societes[1].id})
+        self.assertEqual(self.codes(response), ['601000', '607000'])
+        self.assertEqual(self.client.get(url, {'q': '6', 'soc_id': 'x'}).status_code, 400)
+
+    def test_index_is_rebuilt_when_the_plan_changes(self):
+        url = reverse('comptabilite:typeahead_comptes')
+        self.assertEqual(self.codes(self.client.get(url, {'q': '70'})), ['701000'])
+        PlanCompteLocal.objects.create(
+            compte='702000', intitule='Ventes', societe=self.societes[0], groupe=PlanCompteGroupe.objects.get(code='TA601'),
+        )
+        self.assertEqual(self.codes(self.client.get(url, {'q': '70'})), ['701000', '702000'])
+
+    def test_axes_are_not_served_without_the_orm(self):
+        self.assertNotIn('data-typeahead', EcrituresRechercheForm().fields['ax1_code'].widget.attrs)
+        with mock.patch.object(typeahead.AXES[1], 'build') as build:
+            response = self.client.get(reverse('comptabilite:typeahead_axe', args=[1]), {'q': 'A'})
+        self.assertEqual(response.json(), {'success': True, 'results': []})
+        build.assert_not_called()
+
+    @override_settings(RECHERCHE_ORM_ENABLED=True)
+    def test_axe_read_error_returns_an_empty_list(self):
+        self.assertIn('data-typeahead', EcrituresRechercheForm().fields['ax1_code'].widget.attrs)
+        typeahead.AXES[2]._entry = None
+        with mock.patch.object(typeahead.AXES[2], 'build', side_effect=DatabaseError('schéma')), \
+                self.assertLogs('comptabilite', 'ERROR'):
+            response = self.client.get(reverse('comptabilite:typeahead_axe', args=[2]), {'q': 'A'})
+        self.assertEqual(response.json(), {'success': True, 'results': []})
+        self.assertEqual(self.client.get(reverse('comptabilite:typeahead_axe', args=[4]), {'q': 'A'}).status_code, 404)
+
+
+class DynamicLabelsTests(TestCase):
+    """Libellés de l'admin servis depuis la mémoire (dynamic_labels.py)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser('admin-libelles')
+        AdminText.objects.create(language='fr', key='model.admintext.name_plural', value='Textes')
+
+    def setUp(self):
+        dynamic_labels.invalidate_labels()
+        self.client.force_login(self.user)
+
+    def test_changelist_title_uses_the_cached_labels(self):
+        url = reverse('admin:parametres_admintext_changelist')
+        self.assertContains(self.client.get(url), 'Textes')
+        with CaptureQueriesContext(connection) as captured:
+            self.client.get(url)
+        self.assertFalse([q for q in captured if 'WHERE "T_E_AdminText_ADT"."language"' in q['sql']])
+
+    def test_saving_a_label_invalidates_the_cache(self):
+        self.assertEqual(dynamic_labels.get_labels('fr')['model.admintext.name_plural'], 'Textes')
+        AdminText.objects.filter(key='model.admintext.name_plural').update(value='Autres')
+        self.assertEqual(dynamic_labels.get_labels('fr')['model.admintext.name_plural'], 'Textes')
+        AdminText.objects.get(key='model.admintext.name_plural').save()
+        self.assertEqual(dynamic_labels.get_labels('en')['model.admintext.name_plural'], 'Autres')
+
+
+class ImportJobTests(TestCase):
+    """Jobs d'import Sage/Exact en arrière-plan (imports.py, commande run_import_jobs)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('importeur')
+        cls.other = User.objects.create_user('autre')
+
+    def create_job(self, **fields):
+        return ImportJob.objects.create(type_import='sage', parametres={'societe_id': 1}, utilisateur=self.owner, **fields)
+
+    def test_status_is_visible_to_its_owner_only(self):
+        job = self.create_job()
+        url = reverse('comptabilite:import_job_status', args=[job.id])
+        self.client.force_login(self.other)
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.client.force_login(self.owner)
+        self.assertEqual(self.client.get(url).json()['status'], ImportJob.STATUT_EN_ATTENTE)
+
+    @override_settings(IMPORT_JOB_STALE_AFTER=30)
+    def test_jobs_left_running_by_a_stopped_worker_are_failed(self):
+        now = timezone.now()
+        stale = self.create_job(statut=ImportJob.STATUT_EN_COURS, date_debut=now - timedelta(minutes=31))
+        running = self.create_job(statut=ImportJob.STATUT_EN_COURS, date_debut=now - timedelta(minutes=5))
+        pending = self.create_job()
+        self.assertEqual(imports.claim_next_job(), pending)
+        stale.refresh_from_db()
+        running.refresh_from_db()
+        self.assertEqual(stale.statut, ImportJob.STATUT_ERREUR)
+        self.assertIn('30 minutes', stale.erreur)
+        self.assertIsNotNone(stale.date_fin)
+        self.assertEqual(running.statut, ImportJob.STATUT_EN_COURS)
+        with override_settings(IMPORT_JOB_STALE_AFTER=0):
+            self.assertEqual(imports.fail_stale_jobs(), 0)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class EcrituresExportTests(TestCase):
+    """Export CSV et Excel du résultat de la recherche (ecritures/export/)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        rng = random.Random(3)
+        cls.refs = dataset.generate_referentiels(1, rng, 2024, 1)
+        dataset.insert_faits(dataset.iter_faits(cls.refs, rng, 5))
+        cls.user = User.objects.create_user('export')
+
+    def setUp(self):
+        self.search = {'soc_id': self.refs['societes'][0], 'per_id': self.refs['periodes'][0]}
+        with connection.cursor() as cursor:
+            params = {**recherche.build_sre_params({}), **self.search}
+            columns = recherche.execute_sre(cursor, params)
+            self.expected = sorted(cursor.fetchall())
+        self.header = recherche.display_columns(columns)
+        self.montant = columns.index('FIN_Montant')
+
+    def test_export_requires_a_logged_in_get(self):
+        url = reverse('comptabilite:ecritures_export')
+        self.assertEqual(self.client.get(url, self.search).status_code, 302)
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.post(url, self.search).status_code, 405)
+        self.assertEqual(self.client.get(url).status_code, 400)
+
+    def test_csv_streams_every_row(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('comptabilite:ecritures_export'), self.search)
+        self.assertTrue(response.streaming)
+        lines = list(csv.reader(io.StringIO(b''.join(response.streaming_content).decode('utf-8-sig'))))
+        self.assertEqual(lines[0], self.header)
+        self.assertEqual(len(lines) - 1, len(self.expected))
+        self.assertEqual(
+            sorted(Decimal(line[self.montant]) for line in lines[1:]),
+            sorted(Decimal(str(row[self.montant])) for row in self.expected),
+        )
+
+    def test_xlsx_contains_every_row(self):
+        from openpyxl import load_workbook
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('comptabilite:ecritures_export'), {**self.search, 'format': 'xlsx'})
+        sheet = load_workbook(io.BytesIO(b''.join(response.streaming_content))).active
+        rows = list(sheet.iter_rows(values_only=True))
+        self.assertEqual(list(rows[0]), self.header)
+        self.assertEqual(len(rows) - 1, len(self.expected))
+
+
+class WorkerTests(TestCase):
+    """Boucle commune des workers (workers.py)."""
+
+    def test_jobs_are_run_until_none_is_pending(self):
+        pending = [1, 2]
+        claim = mock.Mock(side_effect=lambda: pending.pop(0) if pending else None)
+        finished = []
+        count = workers.run_worker(claim, lambda job: job * 10, 0, once=True, finished=finished.append)
+        self.assertEqual((count, finished), (2, [10, 20]))
+
+    def test_stop_ends_the_loop_after_the_current_job(self):
+        stop = threading.Event()
+
+        def run(job):
+            stop.set()
+            return job
+
+        claim = mock.Mock(return_value='job')
+        self.assertEqual(workers.run_worker(claim, run, 0, stop=stop), 1)
+        claim.assert_called_once()
+
+    def test_import_worker_command(self):
+        job = ImportJob.objects.create(type_import='sage', parametres={'societe_id': 1})
+        out = io.StringIO()
+        with mock.patch.object(imports, 'execute_import_procedure', return_value=['ok']) as procedure:
+            call_command('run_import_jobs', '--once', stdout=out)
+        procedure.assert_called_once_with('sage', societe_id=1)
+        job.refresh_from_db()
+        self.assertEqual((job.statut, job.resultat), (ImportJob.STATUT_TERMINE, ['ok']))
+        self.assertIn(f'Job #{job.id} terminé', out.getvalue())
+
+
+class ColumnarTests(SimpleTestCase):
+    """Lecture en colonnes typées (columnar.py)."""
+
+    columns = ['FIN_id', 'SOC_id', 'PCL_Compte', 'FIN_Montant', 'FIN_Date']
+
+    def result(self, amounts):
+        rows = [
+            (position, position % 2 or None, f'60{position % 3}000', amount, None)
+            for position, amount in enumerate(amounts, 1)
+        ]
+        return columnar.from_batches(self.columns, [rows[:2], rows[2:]])
+
+    def test_columns_are_typed_and_rows_rebuilt(self):
+        result = self.result([Decimal('10.50'), Decimal('-2.25'), None])
+        self.assertEqual(result['FIN_id'].values.dtype, np.int32)
+        self.assertEqual(result['FIN_Montant'].values.tolist(), [1050, -225, 0])
+        self.assertEqual(result['PCL_Compte'].categories, ['601000', '602000', '600000'])
+        self.assertEqual(result.rows(), [
+            (1, 1, '601000', Decimal('10.50'), None),
+            (2, None, '602000', Decimal('-2.25'), None),
+            (3, 1, '600000', None, None),
+        ])
+        self.assertEqual(result.amount_totals('FIN_Montant'), (Decimal('10.50'), Decimal('2.25')))
+        self.assertEqual(result.argsort('SOC_id').tolist(), [0, 2, 1])
+
+    def test_cents_are_exact_beyond_float_precision(self):
+        large = Decimal('12345678901234567.89')
+        result = self.result([large, 0.1, 0.2])
+        self.assertEqual(result['FIN_Montant'].values.dtype, np.int64)
+        self.assertEqual([row[3] for row in result.rows()], [large, Decimal('0.10'), Decimal('0.20')])
+        self.assertEqual(result.amount_totals('FIN_Montant')[0], large + Decimal('0.30'))
+
+    def test_amounts_with_more_decimals_fall_back_to_decimal(self):
+        # Le montant hors centièmes arrive dans le second lot : le premier est converti
+        result = self.result([Decimal('1.10'), Decimal('2.20'), Decimal('0.005')])
+        self.assertEqual(result['FIN_Montant'].values.dtype, object)
+        self.assertEqual([row[3] for row in result.rows()], [Decimal('1.10'), Decimal('2.20'), Decimal('0.005')])
+        self.assertEqual(result.amount_totals('FIN_Montant'), (Decimal('3.305'), 0))
+        merged = columnar.concat([result, self.result([Decimal('1.00')])])
+        self.assertEqual(merged.amount_totals('FIN_Montant')[0], Decimal('4.305'))
+        self.assertEqual(merged.argsort('FIN_Montant').tolist(), [2, 3, 0, 1])
+        self.assertEqual(pivot.sum_by(np.array([0, 1, 0, 1]), merged['FIN_Montant'].values, 2).tolist(),
+                         [Decimal('1.105'), Decimal('3.20')])
+
+
+class FetchPageTests(SimpleTestCase):
+    """Pagination côté serveur du résultat de la procédure (recherche.fetch_page)."""
+
+    columns = ['FIN_id', 'PCL_Compte', 'FIN_Montant']
+    rows = [(1, '601000', Decimal('5')), (2, None, Decimal('-3')), (3, '401000', None), (4, '512000', Decimal('2'))]
+
+    def test_unsorted_page_and_totals(self):
+        page = recherche.fetch_page(iter(self.rows), 2, 3, amount_index=2)
+        self.assertEqual(page.rows, [self.rows[3]])
+        self.assertEqual((page.count, page.debit, page.credit, page.num_pages), (4, 7, 3, 2))
+        self.assertEqual((page.start_index(), page.end_index()), (4, 4))
+        self.assertTrue(page.has_previous())
+        self.assertFalse(page.has_next())
+
+    def test_sorted_pages_keep_empty_values_last(self):
+        ascending = recherche.fetch_page(self.rows, 1, 3, sort_index=1)
+        self.assertEqual([row[0] for row in ascending.rows], [3, 4, 1])
+        descending = recherche.fetch_page(self.rows, 2, 3, sort_index=1, descending=True)
+        self.assertEqual(descending.rows, [self.rows[1]])
+
+    def test_columnar_result_gives_the_same_page(self):
+        result = columnar.from_batches(self.columns, [self.rows[:2], self.rows[2:]])
+        for sort_index, descending in [(None, False), (0, True), (2, False)]:
+            expected = recherche.fetch_page(self.rows, 1, 2, sort_index, descending, amount_index=2)
+            page = recherche.fetch_page(result, 1, 2, sort_index, descending, amount_index=2)
+            self.assertEqual(page.rows, expected.rows)
+            self.assertEqual((page.count, page.debit, page.credit), (expected.count, expected.debit, expected.credit))
+
+
+class SearchResultCacheTests(SimpleTestCase):
+    """Cache des résultats de la recherche et jetons d'invalidation (recherche_cache.py)."""
+
+    def setUp(self):
+        self.cache = recherche_cache.SearchResultCache()
+        self.calls = []
+
+    def get(self, soc_id, per_id):
+        def loader():
+            self.calls.append((soc_id, per_id))
+            return ['SOC_id'], [(soc_id,)]
+        return self.cache.get_or_load({'soc_id': soc_id, 'per_id': per_id, 'pcl_compte': None}, loader)
+
+    def test_writes_invalidate_the_searches_they_touch(self):
+        for key in [(1, 2), (1, 3), (4, 2), (None, 2)]:
+            self.get(*key)
+        self.get(1, 2)
+        self.assertEqual(len(self.calls), 4)
+
+        recherche_cache.invalidate(soc_id=1, per_id=2)
+        self.calls.clear()
+        for key in [(1, 2), (1, 3), (4, 2), (None, 2)]:
+            self.get(*key)
+        self.assertEqual(self.calls, [(1, 2), (None, 2)])
+
+        recherche_cache.invalidate(soc_id=1)
+        self.calls.clear()
+        for key in [(1, 2), (1, 3), (4, 2)]:
+            self.get(*key)
+        self.assertEqual(self.calls, [(1, 2), (1, 3)])
+
+        recherche_cache.invalidate()
+        self.calls.clear()
+        self.get(4, 2)
+        self.assertEqual(self.calls, [(4, 2)])
+
+    def test_identical_searches_share_one_execution(self):
+        started, release = threading.Event(), threading.Event()
+
+        def slow_loader():
+            self.calls.append('sre')
+            started.set()
+            release.wait(5)
+            return ['SOC_id'], [(1,)]
+
+        params = {'soc_id': 9, 'per_id': 9}
+        results = []
+        leader = threading.Thread(target=lambda: results.append(self.cache.get_or_load(params, slow_loader)))
+        leader.start()
+        started.wait(5)
+        follower = threading.Thread(target=lambda: results.append(self.cache.get_or_load(params, slow_loader)))
+        follower.start()
+        release.set()
+        leader.join(5)
+        follower.join(5)
+        self.assertEqual(self.calls, ['sre'])
+        self.assertEqual(results, [(['SOC_id'], [(1,)])] * 2)
+
+    def test_too_large_results_are_not_cached(self):
+        def loader():
+            self.calls.append('sre')
+            raise recherche_cache.ResultTooLarge(['SOC_id'], iter([(1,)]))
+
+        for _ in range(2):
+            columns, rows = self.cache.get_or_load({'soc_id': 5}, loader)
+            self.assertEqual(list(rows), [(1,)])
+        self.assertEqual(self.calls, ['sre', 'sre'])
+
+
+class DwEmulationTests(TestCase):
+    """Émulation SQLite des procédures stockées DW (dw_emulation.py)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.refs = dataset.generate_referentiels(1, random.Random(11), 2024, 1)
+        cls.soc_id = cls.refs['societes'][0]
+        cls.compte = PlanCompteLocal.objects.filter(societe_id=cls.soc_id).values_list('compte', flat=True)[0]
+
+    def sage_rows(self, *amounts):
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                "INSERT INTO T_Temp_EcritureSage (SOC_Id, Periode, CompteGeneral, Montant) VALUES (%s, %s, %s, %s)",
+                [(self.soc_id, '202401', self.compte, amount) for amount in amounts],
+            )
+
+    def amounts(self):
+        params = {**recherche.build_sre_params({}), 'soc_id': self.soc_id, 'per_id': dataset.periode_id(2024, 1)}
+        with connection.cursor() as cursor:
+            columns = recherche.execute_sre(cursor, params)
+            return sorted(Decimal(str(row[columns.index('FIN_Montant')])) for row in cursor.fetchall())
+
+    def test_exec_is_parsed_into_named_parameters(self):
+        self.assertEqual(
+            dw_emulation.parse_exec('EXEC [DW].[PS_X] @a=%s, @b = %s', [1, None]), ('PS_X', {'a': 1, 'b': None}),
+        )
+        self.assertIsNone(dw_emulation.parse_exec('SELECT 1', []))
+        with self.assertRaises(NotImplementedError), connection.cursor() as cursor:
+            cursor.execute('EXEC DW.PS_Inconnue @a=%s', [1])
+
+    def test_sage_import_inserts_then_refreshes_the_faits(self):
+        stade_id = self.refs['stades'][0]
+        self.sage_rows('10.50', '-4.00')
+        with mock.patch.object(recherche_cache, 'invalidate') as invalidate:
+            nb_lignes, lot_id, message = imports.execute_import_procedure(
+                'sage', False, self.soc_id, stade_id, '202401', None, 'Test',
+            )
+        invalidate.assert_called_once_with(soc_id=self.soc_id)
+        self.assertEqual((nb_lignes, message), (2, 'OK'))
+        self.assertEqual(self.amounts(), [Decimal('-4'), Decimal('10.5')])
+
+        # Actualisation : les écritures du lot précédent sont remplacées
+        imports.execute_import_procedure('sage', True, self.soc_id, stade_id, '202401', None, 'Test')
+        self.assertEqual(self.amounts(), [Decimal('-4'), Decimal('10.5')])
+        self.assertEqual(
+            imports.execute_import_procedure('sage', False, self.soc_id, stade_id, '209901', None, ''),
+            [0, None, 'Période 209901 inconnue'],
+        )
+
+
+class GenerateDatasetCommandTests(TestCase):
+    """Commande generate_dataset (dataset.py)."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+
+    def generate(self, *args, **options):
+        out = io.StringIO()
+        options = {'years': 1, 'faits_par_periode': 2, 'excel_dir': self.directory, 'excel_rows': '3', **options}
+        call_command('generate_dataset', *args, stdout=out, **options)
+        return out.getvalue()
+
+    def faits(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT COUNT(*), SUM(FIN_Montant) FROM T_E_FinanceFaits_FIN")
+            return cursor.fetchone()
+
+    def test_dataset_is_generated_once_and_reproducible(self):
+        output = self.generate(seed=3)
+        self.assertIn('Référentiels : 10 sociétés', output)
+        self.assertIn('Faits financiers : 240 lignes', output)
+        count, total = self.faits()
+        self.assertEqual(count, 240)
+        from openpyxl import load_workbook
+        workbook = load_workbook(f'{self.directory}/budget_3.xlsx', read_only=True)
+        self.assertEqual(len(list(workbook.worksheets[0].iter_rows(values_only=True))), 4)
+        workbook.close()
+
+        with self.assertRaises(CommandError):
+            self.generate(seed=3)
+        self.generate('--clear', seed=3)
+        self.assertEqual(self.faits(), (count, total))
+
+    def test_invalid_options_are_refused(self):
+        with self.assertRaises(CommandError):
+            self.generate(scale=0)
+        with self.assertRaises(CommandError):
+            self.generate(excel_rows='1,x')
+
+
+class RunBenchmarksCommandTests(TestCase):
+    """Commande run_benchmarks (benchmarks.py)."""
+
+    def test_percentiles_and_comparison(self):
+        self.assertEqual(benchmarks.percentile([1, 2, 3, 4], 50), 2.5)
+        self.assertEqual(benchmarks.percentile([7], 95), 7)
+        results = {'scenarios': {'a': {'p50_ms': 12.0}, 'b': {'p50_ms': 10.0}, 'c': {'p50_ms': 1.0}}}
+        baseline = {'scenarios': {'a': {'p50_ms': 10.0}, 'b': {'p50_ms': 10.0}}}
+        self.assertEqual(benchmarks.compare(results, baseline), [('a', 10.0, 12.0, 20.0, True), ('b', 10.0, 10.0, 0.0, False)])
+
+    def test_selected_scenarios_are_measured_and_compared(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        baseline = f'{directory}/baseline.json'
+        with open(baseline, 'w', encoding='utf-8') as f:
+            json.dump({'scenarios': {'api_societes': {'p50_ms': 1e-6}}}, f)
+        output = f'{directory}/results.json'
+        out = io.StringIO()
+        call_command(
+            'run_benchmarks', only='api_societes,index', iterations=2, warmup=0, excel_sizes='',
+            excel_dir=directory, output=output, compare=baseline, stdout=out,
+        )
+        with open(output, encoding='utf-8') as f:
+            results = json.load(f)
+        self.assertEqual(sorted(results['scenarios']), ['api_societes', 'index'])
+        self.assertEqual(results['scenarios']['api_societes']['status'], 200)
+        self.assertEqual(results['scenarios']['index']['iterations'], 2)
+        self.assertIn('1 scénario(s) en régression', out.getvalue())
+
+
+class SqlTimingTests(TestCase):
+    """Entête Server-Timing et journal des appels lents (timing.py, SqlTimingMiddleware)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('mesure')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_server_timing_header(self):
+        response = self.client.get(reverse('comptabilite:index'))
+        self.assertRegex(
+            response['Server-Timing'],
+            r'^db;dur=\d+\.\d;desc="[1-9]\d* SQL", render;dur=\d+\.\d, total;dur=\d+\.\d$',
+        )
+        with override_settings(SERVER_TIMING_HEADER=False):
+            self.assertNotIn('Server-Timing', self.client.get(reverse('comptabilite:index')))
+        with override_settings(SQL_TIMING_ENABLED=False):
+            self.assertNotIn('Server-Timing', self.client.get(reverse('comptabilite:index')))
+
+    @override_settings(SLOW_QUERY_THRESHOLD_MS=0)
+    def test_slow_queries_are_logged_without_sensitive_values(self):
+        with self.assertLogs('comptabilite.sql', 'WARNING') as logs:
+            self.client.get(reverse('comptabilite:index'))
+        entries = [json.loads(line.split(':', 2)[2]) for line in logs.output]
+        self.assertTrue(all(entry['event'] == 'slow_query' and entry['path'] == '/' for entry in entries))
+        session = [entry for entry in entries if 'session_key' in entry['sql']]
+        self.assertTrue(session)
+        self.assertTrue(all(entry['params'] == timing.REDACTED for entry in session))
+
+    def test_params_are_truncated(self):
+        long_value = 'x' * (timing.MAX_PARAM_LENGTH + 10)
+        self.assertEqual(
+            timing.redact_params('SELECT %s, %s, %s', [b'abc', long_value, Decimal('1.5')]),
+            ['<3 octets>', 'x' * timing.MAX_PARAM_LENGTH + '…', '1.5'],
+        )
+
+
+class PivotTests(SimpleTestCase):
+    """Totaux regroupés et tableau croisé du résultat de la recherche (pivot.py)."""
+
+    columns = ['SOC_id', 'PCL_Compte', 'FIN_Montant', 'FIN_Solde']
+    rows = [
+        (1, '601000', Decimal('10.50'), Decimal('1')),
+        (2, '601000', Decimal('-2.25'), None),
+        (1, '401000', Decimal('3'), Decimal('3')),
+        (1, '601000', None, Decimal('2')),
+    ]
+
+    def test_totals_by_compte_and_societe(self):
+        for result in (iter(self.rows), columnar.from_batches(self.columns, [self.rows])):
+            table = pivot.build(self.columns, result, ['compte'], 'societe', labels={'societe': {1: 'S1', 2: 'S2'}})
+            self.assertEqual(table.column_values, ['S1', 'S2'])
+            self.assertEqual(table.measure_headers, ['Montant', 'Solde'])
+            self.assertEqual(table.rows, [
+                (['401000'], [Decimal('3'), 0], [Decimal('3'), Decimal('3')], 1),
+                (['601000'], [Decimal('10.5'), Decimal('-2.25')], [Decimal('8.25'), Decimal('3')], 3),
+            ])
+            self.assertEqual(table.totals, ([Decimal('13.5'), Decimal('-2.25')], [Decimal('11.25'), Decimal('6')], 4))
+            self.assertEqual((table.debit, table.credit), (Decimal('13.5'), Decimal('2.25')))
+
+    def test_limits(self):
+        table = pivot.build(self.columns, iter(self.rows), ['societe', 'compte'], max_rows=2)
+        self.assertEqual((table.group_count, len(table.rows), table.truncated), (3, 2, True))
+        self.assertEqual([row[0] for row in table.rows], [[1, '401000'], [1, '601000']])
+        with self.assertRaises(pivot.PivotError):
+            pivot.build(self.columns, iter(self.rows), [], 'compte', max_columns=1)
+        with self.assertRaises(pivot.PivotError):
+            pivot.build(self.columns, iter(self.rows), [])
+
+    def test_dimension_without_any_value(self):
+        columns = ['AX1_Code', 'FIN_Montant']
+        result = columnar.from_batches(columns, [[(None, Decimal('1')), (None, Decimal('2'))]])
+        self.assertEqual(result['AX1_Code'].factorize()[1], [None])
+        table = pivot.build(columns, result, ['ax1'])
+        self.assertEqual(table.rows, [([None], [], [Decimal('3')], 2)])
+
+
+class ComparaisonTests(TestCase):
+    """Comparaison N / N-1 (comparaison.py)."""
+
+    columns = ['PCL_Compte', 'AX1_Code', 'AX2_Code', 'AX3_Code', 'FIN_Montant']
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.periodes = Periode.objects.bulk_create([
+            Periode(id=dataset.periode_id(annee, 3), date=datetime(annee, 3, 1), annee=annee, mois=3, trimestre_civil=1)
+            for annee in (2023, 2024)
+        ])
+
+    def result(self, rows):
+        return columnar.from_batches(self.columns, [rows])
+
+    def test_periods_are_aligned_on_compte_and_axes(self):
+        current = self.result([
+            ('601000', 'A', None, None, Decimal('150')), ('601000', 'A', None, None, Decimal('50')),
+            ('602000', None, None, None, Decimal('30')),
+        ])
+        previous = self.result([
+            ('601000', 'A', None, None, Decimal('160')), ('607000', None, None, None, Decimal('-40')),
+            ('602000', None, None, None, Decimal('0')),
+        ])
+        comparison = comparaison.build(self.columns, current, previous, '202403', '202303')
+        self.assertEqual(comparison.headers[-4:], ['202403', '202303', 'Écart', 'Écart %'])
+        self.assertEqual(comparison.rows, [
+            (['601000', 'A', None, None], Decimal('200'), Decimal('160'), Decimal('40'), 25.0),
+            (['602000', None, None, None], Decimal('30'), Decimal('0'), Decimal('30'), None),
+            (['607000', None, None, None], Decimal('0'), Decimal('-40'), Decimal('40'), 100.0),
+        ])
+        self.assertEqual(comparison.totals, (Decimal('230'), Decimal('120'), Decimal('110'), 91.7))
+        self.assertEqual((comparison.count, comparison.count_precedent, comparison.group_count), (3, 3, 3))
+        with self.assertRaises(comparaison.ComparisonError):
+            comparaison.build(self.columns[1:], current, previous, '202403', '202303')
+
+    def test_both_periods_are_searched_together(self):
+        params = {**recherche.build_sre_params({}), 'per_id': self.periodes[1].id}
+        parts = [
+            (self.columns, self.result([('601000', None, None, None, Decimal('5'))])),
+            (self.columns, None),
+        ]
+        with mock.patch.object(comparaison.fanout, 'run_concurrently', return_value=parts) as run:
+            comparison = comparaison.compare(params)
+        calls = run.call_args.args[0]
+        self.assertEqual([call['per_id'] for call in calls], [self.periodes[1].id, self.periodes[0].id])
+        self.assertEqual(comparison.periode_precedente, self.periodes[0])
+        self.assertEqual(comparison.totals[:3], (Decimal('5'), 0, Decimal('5')))
+
+    def test_comparison_needs_one_period_with_its_previous_year(self):
+        base = recherche.build_sre_params({})
+        for params in ({**base, 'per_id': None}, {**base, 'per_id': self.periodes[0].id},
+                       {**base, 'per_id': self.periodes[1].id, 'per_ids': [self.periodes[1].id]}):
+            with self.assertRaises(comparaison.ComparisonError):
+                comparaison.compare(params)
+
+
+class ParseCompteTests(SimpleTestCase):
+    """Saisie du compte de la recherche : exact, préfixe ou plage (recherche.parse_compte)."""
+
+    def test_exact_prefix_and_range(self):
+        self.assertEqual(recherche.parse_compte(None), {})
+        self.assertEqual(recherche.parse_compte('  601000 '), {'pcl_compte': '601000'})
+        self.assertEqual(recherche.parse_compte('60*'), {'compte_prefix': '60'})
+        self.assertEqual(recherche.parse_compte('401000-409999'), {'compte_min': '401000', 'compte_max': '409999'})
+
+    def test_invalid_input_is_refused(self):
+        for value in ('*', '6*0', '6**', '409999-401000'):
+            with self.assertRaises(ValueError):
+                recherche.parse_compte(value)
+        form = EcrituresRechercheForm({'pcl_compte': '6*0'})
+        self.assertFalse(form.is_valid())
+        self.assertIn('pcl_compte', form.errors)
+
+    def test_range_is_combined_with_the_bounds(self):
+        criteria = recherche._compte_criteria({'pcl_compte': '401000-409999', 'compte_min': '405000', 'compte_max': '499999'})
+        self.assertEqual(criteria, {'pcl_compte': None, 'compte_prefix': None, 'compte_min': '405000', 'compte_max': '409999'})
+        criteria = recherche._compte_criteria({'pcl_compte': '6*', 'compte_max': '619999'})
+        self.assertEqual(criteria, {'pcl_compte': None, 'compte_prefix': '6', 'compte_min': None, 'compte_max': '619999'})
+
+
+class ChoiceCacheTests(TestCase):
+    """Listes des formulaires servies depuis la mémoire (choice_cache.py)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.societe = Societe.objects.create(code='CC1', intitule='Alpha')
+
+    def setUp(self):
+        for provider in choice_cache.PROVIDERS:
+            provider.invalidate()
+
+    def societes(self):
+        return [label for value, label in EcrituresRechercheForm().fields['soc_id'].choices if value]
+
+    def test_choices_are_served_from_memory(self):
+        self.societes()
+        with self.assertNumQueries(0):
+            form = EcrituresRechercheForm({'soc_id': self.societe.id})
+            self.assertIn(str(self.societe), self.societes())
+            self.assertTrue(form.is_valid())
+            self.assertEqual(form.cleaned_data['soc_id'], self.societe)
+        self.assertFalse(EcrituresRechercheForm({'soc_id': 0}).is_valid())
+        form = EcrituresRechercheForm({'societes': [self.societe.id, self.societe.id]})
+        self.assertTrue(form.is_valid())
+        self.assertEqual(form.cleaned_data['societes'], [self.societe])
+        self.assertFalse(EcrituresRechercheForm({'societes': [self.societe.id, 0]}).is_valid())
+
+    def test_saving_a_societe_invalidates_its_choices(self):
+        self.societes()
+        other = Societe.objects.create(code='CC2', intitule='Beta')
+        self.assertIn(str(other), self.societes())
+        self.assertTrue(EcrituresRechercheForm({'soc_id': other.id}).is_valid())
+        other.delete()
+        self.assertNotIn('Beta', ' '.join(self.societes()))
+
+    def test_version_changed_by_another_process(self):
+        self.societes()
+        # Modification sans signal (autre processus, par exemple) puis changement du jeton de version
+        Societe.objects.filter(pk=self.societe.pk).update(intitule='Gamma')
+        self.assertNotIn('Gamma', ' '.join(self.societes()))
+        cache.set(choice_cache.version_key(Societe), time.time_ns(), None)
+        self.assertIn('Gamma', ' '.join(self.societes()))
+
+
+class StreamedSearchTests(TestCase):
+    """Page de recherche rendue en flux (paramètre stream, views._stream_search)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        rng = random.Random(25)
+        cls.refs = dataset.generate_referentiels(1, rng, 2024, 1)
+        dataset.insert_faits(dataset.iter_faits(cls.refs, rng, 3))
+
+    def get(self, **criteria):
+        response = self.client.get(reverse('comptabilite:ecritures_recherche'), {'stream': 1, **criteria})
+        self.assertTrue(response.streaming)
+        return [part.decode() if isinstance(part, bytes) else part for part in response.streaming_content]
+
+    def test_rows_follow_the_page_header(self):
+        soc_id = self.refs['societes'][0]
+        parts = self.get(soc_id=soc_id, per_id=self.refs['periodes'][0])
+        # Entête de la page et formulaire envoyés avant l'exécution de la recherche
+        self.assertIn('<form', parts[0])
+        self.assertNotIn('<tbody>', parts[0])
+        page = ''.join(parts)
+        self.assertEqual(page.count('<tr><td>'), 3)
+        self.assertIn('3 résultats', page)
+        self.assertNotIn(views.STREAM_MARKER, page)
+        self.assertTrue(page.rstrip().endswith('</html>'))
+
+    def test_empty_result_and_error(self):
+        empty = Societe.objects.create(code='VIDE', intitule='Sans écritures')
+        self.assertIn('Aucun résultat.', ''.join(self.get(soc_id=empty.id)))
+        with mock.patch.object(recherche, 'execute_search', side_effect=recherche.SearchUnavailable('Indisponible')):
+            page = ''.join(self.get(soc_id=self.refs['societes'][0]))
+        self.assertIn('Indisponible', page)
+        self.assertTrue(page.rstrip().endswith('</html>'))
@@ -0,0 +1,198 @@
+"""
+Mesure des temps SQL et de rendu par requête HTTP (SqlTimingMiddleware)
+
+Chaque instruction exécutée pendant la requête (requêtes ORM comme appels
+`EXEC DW.PS_*`) est chronométrée par un execute_wrapper Django : durée, nombre
+de lignes et paramètres (valeurs sensibles masquées). Le middleware en déduit
+l'entête Server-Timing (db, render, total) et écrit les appels plus lents que
+SLOW_QUERY_THRESHOLD_MS dans le journal `comptabilite.sql`, une ligne JSON par appel.
+
+La durée d'un appel couvre l'exécution jusqu'au premier résultat : la lecture des
+lignes (fetchmany) n'en fait pas partie. Les lignes d'un SELECT ne sont connues du
+pilote qu'à la lecture ; `count_rows` les attribue à la dernière instruction.
+"""
+import contextvars
+import json
+import logging
+import re
+import time
+
+from django.conf import settings
+from django.template.backends import django as django_backend
+
+
+logger = logging.getLogger('comptabilite.sql')
+
+REDACTED = '***'
+MAX_PARAM_LENGTH = 200
+MAX_SQL_LENGTH = 2000
+# Instructions dont les paramètres ne sont jamais journalisés
+SENSITIVE_SQL = re.compile(r'password|passwd|pwd|secret|token|session_data|session_key', re.IGNORECASE)
+PROCEDURE_RE = re.compile(r'^\s*EXEC(?:UTE)?\s+([\w.\[\]]+)', re.IGNORECASE)
+
+_current = contextvars.ContextVar('request_timing', default=None)
+
+
+class Statement:
+    """Instruction exécutée pendant la requête."""
+
+    __slots__ = ('sql', 'params', 'many', 'duration', 'rows', 'error')
+
+    def __init__(self, sql, params, many):
+        self.sql = sql
+        self.params = params
+        self.many = many
+        self.duration = 0.0
+        self.rows = None
+        self.error = None
+
+    @property
+    def procedure(self):
+        match = PROCEDURE_RE.match(self.sql)
+        return match.group(1) if match else None
+
+
+class RequestTiming:
+    """Temps cumulés d'une requête HTTP (en secondes)."""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.statements = []
+        self.render = 0.0
+
+    @property
+    def db(self):
+        return sum(statement.duration for statement in self.statements)
+
+    @property
+    def total(self):
+        return time.perf_counter() - self.start
+
+    def server_timing(self):
+        """Valeur de l'entête Server-Timing (durées en millisecondes)."""
+        return (
+            f'db;dur={self.db * 1000:.1f};desc="{len(self.statements)} SQL", '
+            f'render;dur={self.render * 1000:.1f}, '
+            f'total;dur={self.total * 1000:.1f}'
+        )
+
+
+def current():
+    """Mesures de la requête en cours, ou None hors d'une requête mesurée."""
+    return _current.get()
+
+
+def activate(timing):
+    return _current.set(timing)
+
+
+def deactivate(token):
+    _current.reset(token)
+
+
+def count_rows(count):
+    """Attribue `count` lignes lues à la dernière instruction exécutée."""
+    timing = _current.get()
+    if timing is not None and timing.statements:
+        statement = timing.statements[-1]
+        statement.rows = (statement.rows or 0) + count
+
+
+def redact_params(sql, params):
+    """Paramètres journalisables : masqués pour les instructions sensibles, tronqués sinon."""
+    if params is None:
+        return None
+    if SENSITIVE_SQL.search(sql):
+        return REDACTED
+
+    def clean(value):
+        if isinstance(value, (bytes, bytearray, memoryview)):
+            return f'<{len(value)} octets>'
+        if isinstance(value, str) and len(value) > MAX_PARAM_LENGTH:
+            return value[:MAX_PARAM_LENGTH] + '…'
+        if isinstance(value, (int, float, bool, str)) or value is None:
+            return value
+        return str(value)
+
+    if isinstance(params, dict):
+        return {key: clean(value) for key, value in params.items()}
+    return [clean(value) for value in params]
+
+
+class QueryTimer:
+    """execute_wrapper qui chronomètre chaque instruction de la requête HTTP."""
+
+    def __init__(self, timing, request=None):
+        self.timing = timing
+        self.request = request
+
+    def __call__(self, execute, sql, params, many, context):
+        statement = Statement(sql, params, many)
+        start = time.perf_counter()
+        try:
+            result = execute(sql, params, many, context)
+        except Exception as e:
+            statement.error = f'{type(e).__name__}: {e}'
+            raise
+        else:
+            rowcount = getattr(context['cursor'], 'rowcount', -1)
+            if rowcount is not None and rowcount >= 0:
+                statement.rows = rowcount
+            return result
+        finally:
+            statement.duration = time.perf_counter() - start
+            self.timing.statements.append(statement)
+            if statement.duration * 1000 >= settings.SLOW_QUERY_THRESHOLD_MS:
+                log_slow_query(statement, self.request)
+
+
+def log_slow_query(statement, request=None):
+    """Écrit une instruction lente dans le journal comptabilite.sql (ligne JSON)."""
+    entry = {
+        'event': 'slow_query',
+        'duration_ms': round(statement.duration * 1000, 1),
+        'procedure': statement.procedure,
+        'sql': statement.sql[:MAX_SQL_LENGTH],
+        'params': None if statement.many else redact_params(statement.sql, statement.params),
+        'many': statement.many,
+        'rows': statement.rows,
+        'error': statement.error,
+        'method': getattr(request, 'method', None),
+        'path': getattr(request, 'path', None),
+    }
+    logger.warning(json.dumps(entry, ensure_ascii=False, default=str))
+
+
+class Template:
+    """Template dont le rendu est ajouté au temps `render` de la requête."""
+
+    def __init__(self, template):
+        self.template = template
+
+    @property
+    def origin(self):
+        return self.template.origin
+
+    def render(self, context=None, request=None):
+        timing = _current.get()
+        if timing is None:
+            return self.template.render(context, request)
+        start = time.perf_counter()
+        try:
+            return self.template.render(context, request)
+        finally:
+            timing.render += time.perf_counter() - start
+
+
+class DjangoTemplates(django_backend.DjangoTemplates):
+    """Moteur DjangoTemplates dont les templates mesurent leur rendu.
+
+    Seul le rendu des templates de premier niveau est mesuré : les {% include %}
+    et {% extends %} passent par le moteur interne et restent inclus dans leur parent.
+    """
+
+    def from_string(self, template_code):
+        return Template(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return Template(super().get_template(template_name))
@@ -0,0 +1,132 @@
+"""
+Saisie assistée des comptes et des codes d'axes (index des préfixes en mémoire)
+
+Les codes du plan de comptes local et des axes 1 à 3 sont chargés une fois par
+processus dans des listes triées : la recherche des codes commençant par la saisie
+est une recherche dichotomique (bisect) suivie de la lecture des `limit` entrées
+suivantes, sans requête SQL ni parcours de la table, quel que soit le nombre de
+comptes. Les comptes sont indexés pour tout le groupe (un code par compte, quelle
+que soit la société) et par société.
+
+Comme les listes des formulaires (choice_cache.py), un index est reconstruit quand
+le jeton de version de sa table change (signaux post_save/post_delete) et au plus
+tard après CHOICE_CACHE_TIMEOUT secondes.
+
+Les tables des axes (modèles non gérés Axe1 à Axe3) ne sont interrogées que si la
+recherche par l'ORM est activée (RECHERCHE_ORM_ENABLED) : leur schéma n'est vérifié
+contre le DW qu'à cette condition, comme celui de T_E_FinanceFaits_FIN (faits.py).
+"""
+import threading
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+from django.core.cache import cache
+
+from . import faits
+from .choice_cache import version_key
+from .models import Axe1, Axe2, Axe3, PlanCompteLocal
+
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+
+
+class PrefixIndex:
+    """Codes triés (en majuscules) et leurs (code, intitulé), pour la recherche par préfixe."""
+
+    def __init__(self, entries):
+        entries = sorted(entries, key=lambda entry: (entry[0].upper(), entry[0]))
+        self.keys = [code.upper() for code, _ in entries]
+        self.entries = entries
+
+    def __len__(self):
+        return len(self.keys)
+
+    def search(self, prefix, limit=DEFAULT_LIMIT):
+        """(code, intitulé) des codes commençant par `prefix` (sans tenir compte de la casse)."""
+        prefix = prefix.upper()
+        results = []
+        for position in range(bisect_left(self.keys, prefix), len(self.keys)):
+            if len(results) >= limit or not self.keys[position].startswith(prefix):
+                break
+            results.append(self.entries[position])
+        return results
+
+
+class IndexProvider:
+    """Index d'une table, reconstruit quand son jeton de version change."""
+
+    def __init__(self, model, build):
+        self.model = model
+        self.build = build
+        self._entry = None
+        self._lock = threading.Lock()
+
+    def _is_current(self, entry, version):
+        timeout = getattr(settings, 'CHOICE_CACHE_TIMEOUT', 3600)
+        return entry is not None and entry[0] == version and (not timeout or time.monotonic() - entry[1] < timeout)
+
+    def get(self):
+        version = cache.get(version_key(self.model))
+        entry = self._entry
+        if self._is_current(entry, version):
+            return entry[2]
+        # Une seule reconstruction à la fois, les autres threads attendent son résultat
+        with self._lock:
+            entry = self._entry
+            if not self._is_current(entry, version):
+                entry = (version, time.monotonic(), self.build())
+                self._entry = entry
+        return entry[2]
+
+
+def _build_comptes():
+    """Index des comptes du groupe (clé None) et de chaque société."""
+    by_societe = {}
+    groupe = {}
+    rows = PlanCompteLocal.objects.order_by().values_list('societe_id', 'compte', 'intitule').iterator(chunk_size=10000)
+    for societe_id, compte, intitule in rows:
+        if not compte:
+            continue
+        by_societe.setdefault(societe_id, []).append((compte, intitule))
+        groupe.setdefault(compte, intitule)
+    indexes = {societe_id: PrefixIndex(entries) for societe_id, entries in by_societe.items()}
+    indexes[None] = PrefixIndex(groupe.items())
+    return indexes
+
+
+def _axe_builder(model):
+    def build():
+        return PrefixIndex(
+            (code, intitule) for code, intitule in model.objects.order_by().values_list('code', 'intitule') if code
+        )
+    return build
+
+
+COMPTES = IndexProvider(PlanCompteLocal, _build_comptes)
+AXES = {
+    1: IndexProvider(Axe1, _axe_builder(Axe1)),
+    2: IndexProvider(Axe2, _axe_builder(Axe2)),
+    3: IndexProvider(Axe3, _axe_builder(Axe3)),
+}
+
+INDEXED_MODELS = [COMPTES.model, *(provider.model for provider in AXES.values())]
+
+
+def search_comptes(prefix, soc_id=None, limit=DEFAULT_LIMIT):
+    """Comptes commençant par `prefix`, de la société `soc_id` ou de tout le groupe."""
+    index = COMPTES.get().get(soc_id)
+    return index.search(prefix, limit) if index is not None else []
+
+
+def axes_enabled():
+    """Vrai si la saisie assistée des axes est servie (RECHERCHE_ORM_ENABLED)."""
+    return faits.enabled()
+
+
+def search_axe(axe, prefix, limit=DEFAULT_LIMIT):
+    """Codes de l'axe `axe` (1 à 3) commençant par `prefix` (aucun si les axes ne sont pas servis)."""
+    if not axes_enabled():
+        return []
+    return AXES[axe].get().search(prefix, limit)
@@ -13,7 +13,7 @@ router.register(r'comptes-locaux', views.PlanCompteLocalViewSet)
 router.register(r'devises', views.DeviseViewSet)
 # router.register(r'tiers', views.TiersViewSet)
 # router.register(r'versions', views.VersionViewSet)
-# router.register(r'ecritures', views.FinanceFaitsViewSet)
+router.register(r'ecritures', views.FinanceFaitsViewSet, basename='financefaits')
 
 app_name = 'comptabilite'
 
@@ -38,13 +38,23 @@ urlpatterns = [
     path('profile/', views.user_profile, name='profile'),
             # Ecritures
             path('ecritures/recherche/', views.ecritures_recherche, name='ecritures_recherche'),
+            path('ecritures/recherche/jobs/<int:pk>/', views.search_job_status, name='search_job_status'),
+            path('ecritures/recherche/jobs/<int:pk>/cancel/', views.search_job_cancel, name='search_job_cancel'),
+            path('ecritures/recherche/comptes/', views.typeahead_comptes, name='typeahead_comptes'),
+            path('ecritures/recherche/axes/<int:axe>/', views.typeahead_axe, name='typeahead_axe'),
+            path('ecritures/export/', views.ecritures_export, name='ecritures_export'),
             path('ecritures/import/', views.ecritures_import, name='ecritures_import'),
             path('ecritures/import-sage/', views.ecritures_import_sage, name='ecritures_import_sage'),
+            path('ecritures/import-jobs/<int:pk>/', views.import_job_status, name='import_job_status'),
             path('ecritures/import-file/', views.ecritures_import_file, name='ecritures_import_file'),
             path('ecritures/template/', views.ecritures_template, name='ecritures_template'),
             
             # Import Excel dédié
             path('import-excel/', views.import_excel, name='import_excel'),
+            path('import-sage/', views.import_sage, name='import_sage'),
+            
+            # Supervision
+            path('db-pool/stats/', views.db_pool_stats, name='db_pool_stats'),
     
     # path('ecritures/', views.FinanceFaitsListView.as_view(), name='finance_faits_list'),
     
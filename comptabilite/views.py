@@ -1,23 +1,30 @@
 from django.shortcuts import render, get_object_or_404, redirect
-from django.http import JsonResponse, HttpResponse
+from django.http import Http404, JsonResponse, HttpResponse, StreamingHttpResponse, FileResponse
 from django.views.decorators.csrf import csrf_exempt, csrf_protect
 from django.views.decorators.http import require_http_methods
 from django.core.files.storage import default_storage
 from django.core.files.base import ContentFile
+from django.template.loader import get_template, render_to_string
+from django.utils.safestring import mark_safe
 from django import forms
-import pandas as pd
 import io
 import csv
+import logging
+import tempfile
+import time
+from collections import namedtuple
+from itertools import chain, islice
 from django.utils.decorators import method_decorator
 from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView
 from django.db import models
-from django.db import connection
+from django.db import DatabaseError, connection
 from django.contrib.auth import login, logout, authenticate
 from django.contrib.auth.decorators import login_required, permission_required
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib import messages
 from django.contrib.auth.forms import UserCreationForm
 from django.core.exceptions import PermissionDenied
-from django.urls import reverse_lazy
+from django.urls import reverse, reverse_lazy
 from django import forms
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
@@ -25,80 +32,25 @@ from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.filters import SearchFilter, OrderingFilter
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import CursorPagination
 from .models import (
     Societe, Stade, NatureCompte, TypeValeur, PlanCompteGroupe,
-    PlanCompteLocal, Devise
+    PlanCompteLocal, Devise, ImportJob, SearchJob
 )
 from referentiel.models import Periode
+from .choice_cache import (
+    CachedModelChoiceField, CachedModelMultipleChoiceField,
+    DEVISES, PERIODES, SOCIETES, STADES, TYPES_VALEUR,
+)
+from . import comparaison, faits, imports, pivot, pool, recherche, recherche_cache, search_jobs, typeahead
 from .serializers import (
     SocieteSerializer, StadeSerializer, NatureCompteSerializer, TypeValeurSerializer,
-    PlanCompteGroupeSerializer, PlanCompteLocalSerializer, DeviseSerializer
+    PlanCompteGroupeSerializer, PlanCompteLocalSerializer, DeviseSerializer, FinanceFaitsSerializer
 )
 # from .filters import FinanceFaitsFilter
 
-
-class EcrituresRechercheForm(forms.Form):
-    """Formulaire de recherche d'écritures comptables."""
-    per_id = forms.ModelChoiceField(
-        queryset=Periode.objects.all(),
-        required=False,
-        empty_label="Sélectionner une période",
-        label="Période"
-    )
-    sta_id = forms.ModelChoiceField(
-        queryset=Stade.objects.all(),
-        required=False,
-        empty_label="Sélectionner un stade",
-        label="Stade"
-    )
-    soc_id = forms.ModelChoiceField(
-        queryset=Societe.objects.all(),
-        required=False,
-        empty_label="Sélectionner une société",
-        label="Société"
-    )
-    tyv_id = forms.ModelChoiceField(
-        queryset=TypeValeur.objects.all(),
-        required=False,
-        empty_label="Sélectionner un type de valeur",
-        label="Type de valeur"
-    )
-    pcl_compte = forms.CharField(
-        required=False,
-        max_length=20,
-        label="Compte PCL"
-    )
-    fin_solde = forms.DecimalField(
-        required=False,
-        max_digits=15,
-        decimal_places=2,
-        label="Solde"
-    )
-    ax1_code = forms.CharField(
-        required=False,
-        max_length=20,
-        label="Axe 1"
-    )
-    ax2_code = forms.CharField(
-        required=False,
-        max_length=20,
-        label="Axe 2"
-    )
-    ax3_code = forms.CharField(
-        required=False,
-        max_length=20,
-        label="Axe 3"
-    )
-    
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        for field_name, field in self.fields.items():
-            if isinstance(field, forms.ModelChoiceField):
-                css = 'form-select'
-            else:
-                css = 'form-control'
-            existing = field.widget.attrs.get('class', '')
-            field.widget.attrs['class'] = (existing + ' ' + css).strip()
+logger = logging.getLogger(__name__)
 
 
 # Formulaires pour les devises
@@ -120,8 +72,8 @@ class DeviseForm(forms.ModelForm):
 
 # Formulaires pour les sociétés
 class SocieteForm(forms.ModelForm):
-    devise = forms.ModelChoiceField(
-        queryset=Devise.objects.all().order_by('intitule'),
+    devise = CachedModelChoiceField(
+        DEVISES,
         empty_label="Sélectionner une devise",
         required=False,
         widget=forms.Select(attrs={'class': 'form-select'}),
@@ -148,11 +100,9 @@ class SocieteForm(forms.ModelForm):
         super().__init__(*args, **kwargs)
         # Pré-sélectionner la devise si elle existe
         if self.instance and self.instance.pk and self.instance.devise_id:
-            try:
-                devise = Devise.objects.get(id=self.instance.devise_id)
+            devise = DEVISES.get(self.instance.devise_id)
+            if devise is not None:
                 self.fields['devise'].initial = devise
-            except Devise.DoesNotExist:
-                pass
     
     def save(self, commit=True):
         instance = super().save(commit=False)
@@ -323,127 +273,482 @@ class SocieteDeleteView(DeleteView):
 
 
 class EcrituresRechercheForm(forms.Form):
-    per_id = forms.ModelChoiceField(
-        queryset=Periode.objects.all().order_by('id'),
+    # Listes des référentiels servies depuis la mémoire (voir choice_cache.py)
+    per_id = CachedModelChoiceField(
+        PERIODES,
         required=False,
         empty_label='Toutes',
         label='Période'
     )
-    sta_id = forms.ModelChoiceField(
-        queryset=Stade.objects.all().order_by('intitule'),
+    sta_id = CachedModelChoiceField(
+        STADES,
         required=False,
         empty_label='Tous',
         label='Stade'
     )
-    soc_id = forms.ModelChoiceField(
-        queryset=Societe.objects.all().order_by('intitule'),
+    soc_id = CachedModelChoiceField(
+        SOCIETES,
         required=False,
         empty_label='Toutes',
         label='Société'
     )
-    tyv_id = forms.ModelChoiceField(
-        queryset=TypeValeur.objects.all().order_by('intitule'),
+    tyv_id = CachedModelChoiceField(
+        TYPES_VALEUR,
         required=False,
         empty_label='Tous',
         label='Type valeur'
     )
-    pcl_compte = forms.CharField(required=False, label='Compte')
+    pcl_compte = forms.CharField(
+        required=False,
+        label='Compte',
+        widget=forms.TextInput(attrs={
+            'placeholder': '401000, 6* ou 401000-409999',
+            'data-typeahead': reverse_lazy('comptabilite:typeahead_comptes'),
+        }),
+        help_text='Compte exact, préfixe (6*) ou plage (401000-409999)'
+    )
     fin_solde = forms.DecimalField(required=False, label='Solde', decimal_places=2, max_digits=18)
+    # Saisie assistée branchée dans __init__, seulement si les tables des axes sont interrogées
     ax1_code = forms.CharField(required=False, label='Axe 1')
     ax2_code = forms.CharField(required=False, label='Axe 2')
     ax3_code = forms.CharField(required=False, label='Axe 3')
+    # Filtres multiples : requête ensembliste (RECHERCHE_ORM_ENABLED) ou un appel de la
+    # procédure par combinaison de valeurs (voir recherche.sre_calls)
+    per_fin = CachedModelChoiceField(
+        PERIODES,
+        required=False,
+        empty_label='—',
+        label="Jusqu'à la période"
+    )
+    societes = CachedModelMultipleChoiceField(
+        SOCIETES,
+        required=False,
+        widget=forms.SelectMultiple(attrs={'size': 4}),
+        label='Autres sociétés'
+    )
+    types_valeur = CachedModelMultipleChoiceField(
+        TYPES_VALEUR,
+        required=False,
+        widget=forms.SelectMultiple(attrs={'size': 4}),
+        label='Autres types valeur'
+    )
+    solde_min = forms.DecimalField(required=False, label='Solde min', decimal_places=2, max_digits=18)
+    solde_max = forms.DecimalField(required=False, label='Solde max', decimal_places=2, max_digits=18)
+    compte_min = forms.CharField(required=False, label='Compte de')
+    compte_max = forms.CharField(required=False, label='Compte à')
+    # Totaux côté serveur : regroupement du résultat au lieu des lignes détaillées
+    group_by = forms.MultipleChoiceField(
+        choices=pivot.DIMENSION_CHOICES,
+        required=False,
+        widget=forms.CheckboxSelectMultiple,
+        label='Regrouper par'
+    )
+    pivot_column = forms.ChoiceField(
+        choices=[('', 'Aucune')] + pivot.DIMENSION_CHOICES,
+        required=False,
+        label='En colonnes'
+    )
+    comparer = forms.BooleanField(required=False, label='Comparer avec N-1')
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
+        if typeahead.axes_enabled():
+            for axe in typeahead.AXES:
+                self.fields[f'ax{axe}_code'].widget.attrs['data-typeahead'] = reverse('comptabilite:typeahead_axe', args=[axe])
         # Améliorer le rendu Bootstrap
         for name, field in self.fields.items():
             css = 'form-control'
-            if isinstance(field.widget, forms.Select):
+            if isinstance(field.widget, (forms.CheckboxSelectMultiple, forms.CheckboxInput)):
+                css = 'form-check-input'
+            elif isinstance(field.widget, forms.Select):
                 css = 'form-select'
             existing = field.widget.attrs.get('class', '')
             field.widget.attrs['class'] = (existing + ' ' + css).strip()
 
+    def clean_pcl_compte(self):
+        value = self.cleaned_data.get('pcl_compte')
+        try:
+            recherche.parse_compte(value)
+        except ValueError as e:
+            raise forms.ValidationError(str(e))
+        return value.strip() if value else value
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if cleaned_data.get('per_fin') and not cleaned_data.get('per_id'):
+            self.add_error('per_fin', 'Choisissez la période de début')
+        for low, high in (('solde_min', 'solde_max'), ('compte_min', 'compte_max')):
+            if cleaned_data.get(low) is not None and cleaned_data.get(high) is not None \
+                    and cleaned_data[low] > cleaned_data[high]:
+                self.add_error(high, f'Doit être supérieur ou égal à {self.fields[low].label.lower()}')
+        return cleaned_data
+
+
+def pivot_labels(group_by, pivot_column):
+    """Libellés des sociétés pour la grille regroupée (le résultat SRE ne porte que SOC_id)."""
+    if 'societe' not in group_by and pivot_column != 'societe':
+        return {}
+    return {'societe': {soc_id: f'{code} - {intitule}' for soc_id, code, intitule in
+                        Societe.objects.values_list('id', 'code', 'intitule')}}
+
+
+SEARCH_ERROR_MESSAGE = "Erreur lors de l'exécution de la recherche, le détail est dans le journal de l'application"
+
+# Pagination et tri de la grille de recherche (paramètres page, page_size, sort et order)
+SearchPaging = namedtuple('SearchPaging', 'number size sort order')
+
+
+def _search_paging(request):
+    """Pagination et tri demandés, ramenés aux valeurs admises."""
+    try:
+        page_size = int(request.GET.get('page_size', recherche.DEFAULT_PAGE_SIZE))
+    except ValueError:
+        page_size = recherche.DEFAULT_PAGE_SIZE
+    if page_size not in recherche.PAGE_SIZES:
+        page_size = recherche.DEFAULT_PAGE_SIZE
+    try:
+        page_number = max(1, int(request.GET.get('page', 1)))
+    except ValueError:
+        page_number = 1
+    return SearchPaging(page_number, page_size, request.GET.get('sort', ''), request.GET.get('order', 'asc'))
+
+
+def _submit_search_job(request, params):
+    """Soumet la recherche comme job (commande run_search_jobs) et redirige vers la page qui suit son avancement."""
+    job = search_jobs.submit(params, request.user)
+    query = request.GET.copy()
+    query.pop('background', None)
+    query.pop('page', None)
+    query['job'] = job.id
+    return redirect(f"{reverse('comptabilite:ecritures_recherche')}?{query.urlencode()}")
+
+
+def _compare_search(params):
+    """Comparaison N / N-1 : les deux appels de la procédure sont simultanés."""
+    try:
+        return {'comparison': comparaison.compare(params)}
+    except comparaison.ComparisonError as e:
+        return {'comparison_error': str(e)}
+    except Exception:
+        logger.exception("Erreur lors de la comparaison N / N-1")
+        return {'search_error': SEARCH_ERROR_MESSAGE}
+
+
+def _search_grid(columns, rows, group_by, pivot_column, paging):
+    """Grille d'un résultat chargé : totaux regroupés (group_by, pivot_column) ou page triée."""
+    if not columns:
+        return {}
+    if group_by or pivot_column:
+        try:
+            return {'columns': columns, 'pivot': pivot.build(
+                columns, rows, group_by, pivot_column, labels=pivot_labels(group_by, pivot_column),
+            )}
+        except pivot.PivotError as e:
+            return {'columns': columns, 'pivot_error': str(e)}
+    return {'columns': columns, 'page_obj': recherche.fetch_page(
+        rows,
+        paging.number,
+        paging.size,
+        sort_index=columns.index(paging.sort) if paging.sort in columns else None,
+        descending=paging.order == 'desc',
+        amount_index=columns.index('FIN_Montant') if 'FIN_Montant' in columns else None,
+    )}
+
+
+def _job_search(search_job, group_by, pivot_column, paging):
+    """Grille du résultat d'un job de recherche.
+
+    Sans résultat (recherche en cours, en erreur ou résultat expiré), la page n'affiche que
+    le statut du job.
+    """
+    job_result = search_jobs.load_result(search_job)
+    if job_result is None or not job_result.columns:
+        return {}
+    columns = job_result.columns
+    if not (group_by or pivot_column) and paging.sort not in columns:
+        # Page sans tri : seules les tranches du résultat qui la contiennent sont lues
+        page_obj = job_result.page(paging.number, paging.size)
+        return {'columns': columns, 'page_obj': page_obj} if page_obj is not None else {}
+    rows = job_result.load()
+    return _search_grid(columns, rows, group_by, pivot_column, paging) if rows is not None else {}
+
+
+def _cached_search(params, group_by, pivot_column, paging):
+    """Grille du résultat de la procédure SRE, lu dans le cache des résultats ou exécuté puis mis en cache."""
+    def load():
+        with connection.cursor() as cursor:
+            result_columns, batches = recherche.execute_search(cursor, params)
+            if not result_columns:
+                return [], []
+            return recherche_cache.read_result(result_columns, batches, recherche_cache.search_cache.max_rows)
+
+    columns, rows = recherche_cache.search_cache.get_or_load(params, load)
+    return _search_grid(columns, rows, group_by, pivot_column, paging)
+
 
 def ecritures_recherche(request):
     """Recherche des écritures via la procédure DW.PS_S_000423_SelectRechercheEcriture_SRE.
     Reproduit la grille de recherche de l'application WinForms.
+    Le résultat est paginé côté serveur (paramètres page, page_size, sort et order).
+    Avec group_by (et pivot_column), seule la grille des totaux regroupés est rendue.
+    Avec comparer, la période est comparée au même mois de l'année précédente (N / N-1).
+    Avec background=1, la recherche est soumise comme job (commande run_search_jobs) et
+    la page suit son avancement ; le paramètre job affiche ensuite son résultat, pour
+    l'utilisateur connecté qui a soumis le job uniquement (404 sinon).
+    Avec stream=1, toutes les lignes sont affichées sur une page rendue en flux.
     """
     form = EcrituresRechercheForm(request.GET or None)
-    rows = []
-    columns = []
-    display_columns = []
-
-    if form.is_valid() and any(v is not None and v != '' for v in form.cleaned_data.values()):
-        params = {
-            'per_id': (form.cleaned_data.get('per_id').id if form.cleaned_data.get('per_id') else None),
-            'sta_id': (form.cleaned_data.get('sta_id').id if form.cleaned_data.get('sta_id') else None),
-            'soc_id': (form.cleaned_data.get('soc_id').id if form.cleaned_data.get('soc_id') else None),
-            'tyv_id': (form.cleaned_data.get('tyv_id').id if form.cleaned_data.get('tyv_id') else None),
-            'pcl_compte': form.cleaned_data.get('pcl_compte') or None,
-            'fin_solde': form.cleaned_data.get('fin_solde'),
-            'ax1_code': form.cleaned_data.get('ax1_code') or None,
-            'ax2_code': form.cleaned_data.get('ax2_code') or None,
-            'ax3_code': form.cleaned_data.get('ax3_code') or None,
-        }
-
-        # Exécution de la procédure stockée
-        try:
-            with connection.cursor() as cursor:
-                sql = (
-                    "EXEC DW.PS_S_000423_SelectRechercheEcriture_SRE "
-                    "@per_id=%s, @sta_id=%s, @soc_id=%s, @tyv_id=%s, @pcl_compte=%s, "
-                    "@fin_solde=%s, @ax1_code=%s, @ax2_code=%s, @ax3_code=%s, @lb_error=%s"
-                )
-                out_error = ''
-                cursor.execute(
-                    sql,
-                    [
-                        params['per_id'], params['sta_id'], params['soc_id'], params['tyv_id'],
-                        params['pcl_compte'], params['fin_solde'], params['ax1_code'],
-                        params['ax2_code'], params['ax3_code'], out_error,
-                    ],
-                )
-                if cursor.description:
-                    columns = [col[0] for col in cursor.description]
-                    rows = cursor.fetchall()
-        except Exception as e:
-            print(f"Erreur lors de l'exécution de la procédure: {e}")
+    paging = _search_paging(request)
+    result = {}
+    search_job = None
+
+    params = recherche.build_sre_params(form.cleaned_data) if form.is_valid() else None
+    if params and recherche.has_criteria(params):
+        group_by = form.cleaned_data.get('group_by') or []
+        pivot_column = form.cleaned_data.get('pivot_column') or None
+        comparer = form.cleaned_data.get('comparer')
+
+        # Les jobs sont rattachés à leur utilisateur : sans connexion, la recherche est exécutée directement
+        if request.GET.get('background') and request.user.is_authenticated and not comparer:
+            return _submit_search_job(request, params)
+
+        if request.GET.get('stream') and not request.GET.get('job') and not (group_by or pivot_column or comparer):
+            return _stream_search(request, form, params)
+
+        if request.GET.get('job', '').isdigit():
+            # Seul l'utilisateur qui a soumis la recherche peut en consulter le résultat
+            if not request.user.is_authenticated:
+                raise Http404
+            search_job = get_object_or_404(SearchJob, pk=request.GET['job'], utilisateur=request.user)
+
+        if comparer:
+            result = _compare_search(params)
+        else:
+            try:
+                if search_job is not None:
+                    result = _job_search(search_job, group_by, pivot_column, paging)
+                else:
+                    result = _cached_search(params, group_by, pivot_column, paging)
+            except recherche.SearchUnavailable as e:
+                result = {'search_error': str(e)}
+            except Exception:
+                logger.exception("Erreur lors de l'exécution de la procédure SRE")
+                result = {'search_error': SEARCH_ERROR_MESSAGE}
 
     # Générer des libellés lisibles pour l'entête du tableau
-    if columns:
-        overrides = {
-            'PER_id': 'Période',
-            'STA_id': 'Stade',
-            'SOC_id': 'Société',
-            'TYV_Id': 'Type valeur',
-            'TYV_code': 'Type valeur',
-            'PCL_Compte': 'Compte',
-            'PCL_Intitule': 'Intitulé compte',
-            'AX1_Code': 'Axe 1',
-            'AX2_Code': 'Axe 2',
-            'AX3_Code': 'Axe 3',
-            'FIN_Montant': 'Montant',
-            'FIN_Solde': 'Solde',
-            'LOT_id': 'Lot',
-            'FIN_id': 'ID écriture',
-            'FIN_Date': 'Date',
-        }
-
-        def prettify(name: str) -> str:
-            return name.replace('_', ' ').strip().capitalize()
+    columns = result.get('columns', [])
+    display_columns = recherche.display_columns(columns) if columns else []
+    page_obj = result.get('page_obj')
 
-        display_columns = [overrides.get(c, prettify(c)) for c in columns]
-    
     context = {
         'title': 'Recherche des écritures',
         'form': form,
         'columns': columns,
         'display_columns': display_columns,
-        'rows': rows,
+        'header_columns': list(zip(columns, display_columns)),
+        'rows': page_obj.rows if page_obj else [],
+        'page_obj': page_obj,
+        'pivot': result.get('pivot'),
+        'pivot_error': result.get('pivot_error'),
+        'comparison': result.get('comparison'),
+        'comparison_error': result.get('comparison_error'),
+        'search_error': result.get('search_error'),
+        'search_job': search_job,
+        'search_job_done': search_job is not None and search_job.statut in SearchJob.STATUTS_FINAUX,
+        'page_sizes': recherche.PAGE_SIZES,
+        'page_size': paging.size,
+        'current_sort': paging.sort,
+        'current_order': paging.order,
+        'next_order': 'desc' if paging.order == 'asc' else 'asc',
     }
     return render(request, 'comptabilite/finance_faits_search.html', context)
 
 
+# Emplacement des lignes dans la page rendue en flux (voir _stream_search)
+STREAM_MARKER = '<!-- comptabilite:flux-des-lignes -->'
+
+
+def _stream_search(request, form, params):
+    """Page de recherche rendue en flux : toutes les lignes, sans pagination ni tri.
+
+    L'entête de la page et le formulaire sont envoyés avant l'exécution de la recherche,
+    puis les lignes par lots de recherche.FETCH_BATCH_SIZE, lus sur le curseur : le délai
+    avant le premier octet et la mémoire du worker ne dépendent pas du nombre de lignes.
+    """
+    page = render_to_string('comptabilite/finance_faits_search.html', {
+        'title': 'Recherche des écritures',
+        'form': form,
+        'streaming': True,
+        'stream_marker': mark_safe(STREAM_MARKER),
+    }, request=request)
+    head, tail = page.split(STREAM_MARKER, 1)
+    part = get_template('comptabilite/finance_faits_search_rows.html')
+
+    def stream():
+        yield head
+        opened = False
+        try:
+            with connection.cursor() as cursor:
+                columns, batches = recherche.execute_search(cursor, params)
+                amount_index = columns.index('FIN_Montant') if 'FIN_Montant' in columns else None
+                count = debit = credit = 0
+                for batch in batches:
+                    if not opened:
+                        yield part.render({'part': 'head', 'display_columns': recherche.display_columns(columns)})
+                        opened = True
+                    count += len(batch)
+                    if amount_index is not None:
+                        for row in batch:
+                            amount = row[amount_index]
+                            if amount is not None and amount > 0:
+                                debit += amount
+                            elif amount is not None and amount < 0:
+                                credit -= amount
+                    yield part.render({'part': 'rows', 'rows': batch})
+                if opened:
+                    yield part.render({'part': 'foot', 'count': count, 'debit': debit, 'credit': credit})
+                else:
+                    yield part.render({'part': 'empty'})
+        except recherche.SearchUnavailable as e:
+            yield part.render({'part': 'error', 'opened': opened, 'message': str(e)})
+        except Exception:
+            logger.exception("Erreur lors de l'affichage en flux de la recherche des écritures")
+            yield part.render({'part': 'error', 'opened': opened})
+        yield tail
+
+    return StreamingHttpResponse(stream(), content_type='text/html; charset=utf-8')
+
+
+@login_required
+@require_http_methods(["GET"])
+def ecritures_export(request):
+    """Export CSV ou Excel (paramètre format) du résultat de la recherche des écritures.
+    Le résultat de la procédure est lu par lots, sans être chargé entièrement en mémoire.
+    """
+    form = EcrituresRechercheForm(request.GET or None)
+    params = recherche.build_sre_params(form.cleaned_data) if form.is_valid() else None
+    if not (params and recherche.has_criteria(params)):
+        return HttpResponse('Critères de recherche invalides ou absents', status=400)
+
+    if request.GET.get('format') == 'xlsx':
+        # Classeur écrit en mode écriture seule dans un fichier temporaire
+        output = tempfile.TemporaryFile()
+        with connection.cursor() as cursor:
+            columns, batches = recherche.execute_search(cursor, params)
+            recherche.write_xlsx(recherche.display_columns(columns), recherche.iter_rows(batches), output)
+        output.seek(0)
+        return FileResponse(
+            output,
+            as_attachment=True,
+            filename='ecritures.xlsx',
+            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+        )
+
+    def stream():
+        with connection.cursor() as cursor:
+            columns, batches = recherche.execute_search(cursor, params)
+            if columns:
+                yield from recherche.iter_csv(recherche.display_columns(columns), recherche.iter_rows(batches))
+
+    response = StreamingHttpResponse(stream(), content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = 'attachment; filename="ecritures.csv"'
+    return response
+
+
+def _typeahead_limit(request):
+    try:
+        limit = int(request.GET.get('limit', typeahead.DEFAULT_LIMIT))
+    except ValueError:
+        limit = typeahead.DEFAULT_LIMIT
+    return max(1, min(limit, typeahead.MAX_LIMIT))
+
+
+def _typeahead_response(results):
+    return JsonResponse({
+        'success': True,
+        'results': [{'code': code, 'intitule': intitule} for code, intitule in results],
+    })
+
+
+@login_required
+@require_http_methods(["GET"])
+def typeahead_comptes(request):
+    """Comptes commençant par la saisie `q`, de la société `soc_id` ou de tout le groupe.
+
+    Servi depuis l'index en mémoire (typeahead.py), sans requête sur le plan de comptes.
+    """
+    prefix = request.GET.get('q', '').strip().rstrip('*')
+    if not prefix:
+        return _typeahead_response([])
+    try:
+        soc_id = int(request.GET['soc_id']) if request.GET.get('soc_id') else None
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'Société invalide'}, status=400)
+    return _typeahead_response(typeahead.search_comptes(prefix, soc_id, _typeahead_limit(request)))
+
+
+@login_required
+@require_http_methods(["GET"])
+def typeahead_axe(request, axe):
+    """Codes de l'axe `axe` (1 à 3) commençant par la saisie `q`, depuis l'index en mémoire.
+
+    Liste vide si les axes ne sont pas servis (voir typeahead.axes_enabled) ou si leur
+    table ne peut pas être lue.
+    """
+    if axe not in typeahead.AXES:
+        return JsonResponse({'success': False, 'error': 'Axe inconnu'}, status=404)
+    prefix = request.GET.get('q', '').strip()
+    if not prefix:
+        return _typeahead_response([])
+    try:
+        results = typeahead.search_axe(axe, prefix, _typeahead_limit(request))
+    except DatabaseError:
+        logger.exception("Erreur lors de la lecture de l'axe %s pour la saisie assistée", axe)
+        results = []
+    return _typeahead_response(results)
+
+
+@login_required
+@require_http_methods(["GET"])
+def search_job_status(request, pk):
+    """Statut d'une recherche en arrière-plan (interrogé périodiquement par la page de recherche).
+
+    Chaque interrogation est enregistrée : sans interrogation pendant SEARCH_JOB_ABANDON_AFTER
+    secondes, la recherche est considérée comme abandonnée et interrompue.
+    """
+    job = get_object_or_404(SearchJob, pk=pk, utilisateur=request.user)
+    if job.statut not in SearchJob.STATUTS_FINAUX:
+        search_jobs.touch(job)
+    return JsonResponse({
+        'success': True,
+        'job_id': job.id,
+        'status': job.statut,
+        'status_display': job.get_statut_display(),
+        'done': job.statut in SearchJob.STATUTS_FINAUX,
+        'cancel_requested': job.annulation_demandee,
+        'date_creation': job.date_creation,
+        'date_debut': job.date_debut,
+        'date_fin': job.date_fin,
+        'duree': job.duree,
+        'rows': job.nb_lignes,
+        'error': job.erreur,
+    })
+
+
+@login_required
+@require_http_methods(["POST"])
+def search_job_cancel(request, pk):
+    """Annulation d'une recherche en arrière-plan (l'instruction SQL en cours est interrompue)."""
+    job = search_jobs.cancel(get_object_or_404(SearchJob, pk=pk, utilisateur=request.user))
+    return JsonResponse({
+        'success': True,
+        'job_id': job.id,
+        'status': job.statut,
+        'status_display': job.get_statut_display(),
+        'done': job.statut in SearchJob.STATUTS_FINAUX,
+    })
+
+
 @login_required
 @require_http_methods(["POST"])
 def ecritures_import(request):
@@ -500,6 +805,8 @@ def ecritures_import(request):
             
             # Récupérer le résultat si la procédure retourne quelque chose
             result = cursor.fetchone()
+
+        recherche_cache.invalidate(soc_id=int(soc_id), per_id=int(per_id))
             
         return JsonResponse({
             'success': True,
@@ -519,6 +826,7 @@ def ecritures_import(request):
 def ecritures_import_sage(request):
     """Import d'écritures depuis Sage/Exact.
     Reproduit la fonctionnalité BT_ImportData_Click de l'app C#.
+    L'import est soumis comme job (voir import_job_status) et exécuté par la commande run_import_jobs.
     """
     try:
         # Récupérer les paramètres du formulaire
@@ -573,44 +881,29 @@ def ecritures_import_sage(request):
         # Calcul de la période (format YYYYMM)
         periode = int(year) * 100 + month_num
         
-        # Exécution de la procédure d'import
-        with connection.cursor() as cursor:
-            if import_type == 'sage':
-                # Appel de PS_S_000104_InsertionFaitsFinanciers pour Sage
-                sql = "EXEC DW.PS_S_000104_InsertionFaitsFinanciers @actualiser=%s, @socid=%s, @staid=%s, @periode=%s, @force=%s, @version=%s, @libelle=%s"
-                cursor.execute(sql, [
-                    actualiser,
-                    int(societe_id),
-                    int(stade_id),
-                    periode,
-                    True,  # force
-                    version_id,
-                    libelle or ''
-                ])
-            else:  # exact
-                # Appel de PS_S_InsertionFaitsExactOnline_IFE pour Exact
-                sql = "EXEC DW.PS_S_InsertionFaitsExactOnline_IFE @actualiser=%s, @socid=%s, @staid=%s, @periode=%s, @force=%s, @version=%s, @libelle=%s"
-                cursor.execute(sql, [
-                    actualiser,
-                    int(societe_id),
-                    int(stade_id),
-                    periode,
-                    True,  # force
-                    version_id,
-                    libelle or ''
-                ])
-            
-            # Récupérer le résultat si la procédure retourne quelque chose
-            result = cursor.fetchone()
+        # Soumission du job d'import, exécuté par la commande run_import_jobs
+        job = ImportJob.objects.create(
+            type_import='sage' if import_type == 'sage' else 'exact',
+            parametres={
+                'actualiser': actualiser,
+                'societe_id': int(societe_id),
+                'stade_id': int(stade_id),
+                'periode': periode,
+                'version_id': version_id,
+                'libelle': libelle or '',
+            },
+            utilisateur=request.user,
+        )
         
         return JsonResponse({
             'success': True,
-            'message': 'Données importées avec succès',
+            'message': 'Import soumis, en attente d\'exécution',
+            'job_id': job.id,
+            'status_url': reverse('comptabilite:import_job_status', args=[job.id]),
             'periode': periode,
             'societe_id': societe_id,
             'stade_id': stade_id,
             'import_type': import_type,
-            'result': result
         })
         
     except Exception as e:
@@ -620,10 +913,45 @@ def ecritures_import_sage(request):
         })
 
 
+@login_required
+@require_http_methods(["GET"])
+def import_job_status(request, pk):
+    """Statut d'un job d'import Sage/Exact (interrogé périodiquement par l'interface).
+
+    Seul l'utilisateur qui a soumis le job peut le consulter.
+    """
+    job = get_object_or_404(ImportJob, pk=pk, utilisateur=request.user)
+    return JsonResponse({
+        'success': True,
+        'job_id': job.id,
+        'import_type': job.type_import,
+        'status': job.statut,
+        'status_display': job.get_statut_display(),
+        'done': job.statut in (ImportJob.STATUT_TERMINE, ImportJob.STATUT_ERREUR),
+        'date_creation': job.date_creation,
+        'date_debut': job.date_debut,
+        'date_fin': job.date_fin,
+        'duree': job.duree,
+        'parametres': job.parametres,
+        'result': job.resultat,
+        'error': job.erreur,
+    })
+
+
+@staff_member_required
+@require_http_methods(["GET"])
+def db_pool_stats(request):
+    """Statistiques du pool de connexions du processus qui traite la requête."""
+    return JsonResponse({
+        'success': True,
+        'pools': pool.pool_stats(),
+    })
+
+
 @login_required
 @require_http_methods(["POST"])
 def ecritures_import_file(request):
-    """Import d'écritures depuis un fichier Excel vers T_Temp_ImportBudgetExcel."""
+    """Import d'écritures depuis un fichier Excel vers T_Temp_ImportBudgetExcel (lignes de l'import : IMP_Lot = batch_id)."""
     try:
         if 'excel_file' not in request.FILES:
             return JsonResponse({
@@ -640,52 +968,38 @@ def ecritures_import_file(request):
                 'error': 'Seuls les fichiers Excel (.xlsx, .xls) sont acceptés'
             })
         
-        # Lire le fichier Excel
-        df = pd.read_excel(file)
+        # Lire le fichier Excel ligne par ligne, sans l'en-tête
+        rows = imports.budget_rows(islice(imports.iter_excel_rows(file), 1, None))
+        first_row = next(rows, None)
         
         # Vérifier que le fichier n'est pas vide
-        if df.empty:
+        if first_row is None:
             return JsonResponse({
                 'success': False,
                 'error': 'Le fichier Excel est vide'
             })
         
-        # Insérer les données dans T_Temp_ImportBudgetExcel
-        with connection.cursor() as cursor:
-            # Vider la table temporaire d'abord
-            cursor.execute("DELETE FROM T_Temp_ImportBudgetExcel")
-            
-            # Insérer les nouvelles données
-            for index, row in df.iterrows():
-                # Créer un dictionnaire avec les valeurs par défaut pour toutes les colonnes
-                values = [None] * 24  # 24 colonnes dans la table
-                
-                # Mapper les colonnes du DataFrame aux colonnes de la table
-                for i, col in enumerate(df.columns):
-                    if i < 24:  # S'assurer qu'on ne dépasse pas le nombre de colonnes
-                        value = row[col]
-                        if not pd.isna(value):
-                            values[i] = str(value)
-                
-                # Construire la requête d'insertion avec les noms de colonnes
-                columns = [
-                    'Societe', 'Annee', 'Version', 'CompteGeneral', 'Section', 'GroupeCode',
-                    'RefactCode', 'Parametre', 'Periode', 'Valeur', 'SOC_Id', 'SocieteNom',
-                    'CompteIntitule', 'PLG_Code', 'PLG_Intitule', 'NCT_Intitule', 'NCT_Code',
-                    'SIG_Code', 'SIG_Intitule', 'TFT_code', 'TFT_Intitule', 'BLN_code',
-                    'BLN_Intitule', 'TypeValeur'
-                ]
-                
-                placeholders = ', '.join(['%s'] * len(columns))
-                columns_str = ', '.join(columns)
-                sql = f"INSERT INTO T_Temp_ImportBudgetExcel ({columns_str}) VALUES ({placeholders})"
-                
-                cursor.execute(sql, values)
+        # Chaque import est chargé dans T_Temp_ImportBudgetExcel sous son identifiant (colonne IMP_Lot) :
+        # les imports simultanés sont isolés et les lignes de l'import précédent de la session sont supprimées
+        previous_batch_id = request.session.get('import_budget_batch_id')
+        if previous_batch_id:
+            imports.delete_staging_batch(previous_batch_id)
+        batch_id = imports.new_staging_batch_id()
+        request.session['import_budget_batch_id'] = batch_id
+        
+        # Insertion par lots au fil de la lecture : la mémoire est bornée par la taille des lots
+        start = time.perf_counter()
+        rows_imported = imports.bulk_insert_budget_rows(chain([first_row], rows), batch_id=batch_id)
+        duration = time.perf_counter() - start
         
         return JsonResponse({
             'success': True,
-            'message': f'Import réussi: {len(df)} lignes importées dans T_Temp_ImportBudgetExcel',
-            'rows_imported': len(df)
+            'message': f'Import réussi: {rows_imported} lignes importées dans {imports.BUDGET_EXCEL_TABLE}',
+            'rows_imported': rows_imported,
+            'batch_id': batch_id,
+            'staging_table': imports.BUDGET_EXCEL_TABLE,
+            'duration': round(duration, 3),
+            'rows_per_second': round(rows_imported / duration) if duration else None,
         })
         
     except Exception as e:
@@ -702,12 +1016,6 @@ def process_csv_file(file):
     return list(reader)
 
 
-def process_excel_file(file):
-    """Traite un fichier Excel et retourne les données."""
-    df = pd.read_excel(file)
-    return df.to_dict('records')
-
-
 def validate_import_data(data):
     """Valide les données d'import."""
     errors = []
@@ -984,6 +1292,32 @@ class DeviseViewSet(viewsets.ModelViewSet):
     ordering = ['code_iso']
 
 
+class FinanceFaitsPagination(CursorPagination):
+    """Pagination par clé sur FIN_Id : ni COUNT ni OFFSET sur la table des faits"""
+    ordering = 'id'
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+
+
+class FinanceFaitsViewSet(viewsets.ReadOnlyModelViewSet):
+    """API en lecture des écritures (modèle FinanceFaits), avec les critères de la recherche des écritures
+
+    Disponible seulement avec RECHERCHE_ORM_ENABLED : le schéma du modèle est celui du DW émulé.
+    """
+    serializer_class = FinanceFaitsSerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = FinanceFaitsPagination
+
+    def get_queryset(self):
+        if not faits.enabled():
+            raise NotFound("API des écritures indisponible (RECHERCHE_ORM_ENABLED désactivé)")
+        form = EcrituresRechercheForm(self.request.query_params)
+        if not form.is_valid():
+            raise ValidationError(form.errors)
+        return faits.list_queryset(recherche.build_sre_params(form.cleaned_data))
+
+
 # API pour les tiers et versions sera ajoutée plus tard
 
 
@@ -1043,6 +1377,18 @@ def import_excel(request):
     return render(request, 'comptabilite/import_excel.html')
 
 
+@login_required
+def import_sage(request):
+    """Page dédiée à l'import Sage/Exact, exécuté en arrière-plan."""
+    if request.method == 'POST':
+        return ecritures_import_sage(request)
+    
+    return render(request, 'comptabilite/import_sage.html', {
+        'societes': Societe.objects.all().order_by('intitule'),
+        'stades': Stade.objects.all().order_by('intitule'),
+    })
+
+
 
 
 # API pour les écritures comptables sera ajoutée plus tard
\ No newline at end of file
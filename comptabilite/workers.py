@@ -0,0 +1,68 @@
+"""
+Boucle commune des workers de jobs (commandes run_import_jobs et run_search_jobs)
+
+Le worker réserve un job (`claim`, UPDATE conditionnel sur le statut, voir
+imports.claim_next_job), l'exécute (`run`) puis recommence ; sans job en attente il
+patiente `interval` secondes. SIGTERM et SIGINT arrêtent la boucle après le job en
+cours au lieu de l'interrompre : un job n'est pas laissé en cours par un arrêt normal.
+"""
+import signal
+import threading
+
+from django.db import close_old_connections
+
+
+def add_arguments(parser, interval, job_label):
+    """Options --once et --interval communes aux commandes de worker."""
+    parser.add_argument(
+        '--once',
+        action='store_true',
+        help=f"Traite les {job_label} en attente puis s'arrête",
+    )
+    parser.add_argument(
+        '--interval',
+        type=float,
+        default=interval,
+        help=f"Délai en secondes entre deux recherches de jobs (défaut : {interval:g})",
+    )
+
+
+def _install_stop_handlers(stop):
+    """Arrêt après le job en cours sur SIGTERM/SIGINT ; retourne les gestionnaires remplacés."""
+    if threading.current_thread() is not threading.main_thread():
+        return {}
+    previous = {}
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        previous[signum] = signal.signal(signum, lambda *args: stop.set())
+    return previous
+
+
+def run_worker(claim, run, interval, once=False, started=None, finished=None, stop=None):
+    """Exécute les jobs réservés par `claim()` avec `run(job)` jusqu'à l'arrêt du worker.
+
+    `started(job)` et `finished(job)` (job retourné par `run`) servent au suivi des
+    jobs. Avec `once`, la boucle s'arrête dès qu'aucun job n'est en attente. Retourne
+    le nombre de jobs exécutés.
+    """
+    stop = stop or threading.Event()
+    previous = _install_stop_handlers(stop)
+    count = 0
+    try:
+        while not stop.is_set():
+            close_old_connections()
+            job = claim()
+            if job is None:
+                if once:
+                    break
+                stop.wait(interval)
+                continue
+            if started:
+                started(job)
+            job = run(job)
+            count += 1
+            if finished:
+                finished(job)
+    finally:
+        for signum, handler in previous.items():
+            signal.signal(signum, handler)
+    return count
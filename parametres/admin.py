@@ -1,4 +1,5 @@
 from django.contrib import admin
+from django.utils.translation import get_language
 from .models import AdminText
 
 
@@ -24,32 +25,20 @@ class AdminTextAdmin(admin.ModelAdmin):
     
     def changelist_view(self, request, extra_context=None):
         """Override pour utiliser un libellé dynamique"""
-        # Récupérer le libellé dynamique
+        # Récupérer le libellé dynamique (libellés en mémoire, voir dynamic_labels.py)
+        from comptabilite.dynamic_labels import get_labels
+        lang = get_language() or 'fr'
+        label = get_labels(lang).get('model.admintext.name_plural')
+        if not label and lang != 'fr':
+            label = get_labels('fr').get('model.admintext.name_plural')
+        if not label:
+            return super().changelist_view(request, extra_context)
+
+        # Modifier temporairement le verbose_name_plural
+        original_verbose_name_plural = self.model._meta.verbose_name_plural
+        self.model._meta.verbose_name_plural = label
         try:
-            from parametres.models import AdminText as AdminTextModel
-            lang = request.LANGUAGE_CODE or 'fr'
-            admin_text = AdminTextModel.objects.filter(
-                language=lang, 
-                key='model.admintext.name_plural'
-            ).first()
-            if not admin_text and lang != 'fr':
-                admin_text = AdminTextModel.objects.filter(
-                    language='fr', 
-                    key='model.admintext.name_plural'
-                ).first()
-            
-            if admin_text:
-                # Modifier temporairement le verbose_name_plural
-                original_verbose_name_plural = self.model._meta.verbose_name_plural
-                self.model._meta.verbose_name_plural = admin_text.value
-                
-                response = super().changelist_view(request, extra_context)
-                
-                # Restaurer le verbose_name_plural original
-                self.model._meta.verbose_name_plural = original_verbose_name_plural
-                
-                return response
-        except Exception:
-            pass
-        
-        return super().changelist_view(request, extra_context)
\ No newline at end of file
+            return super().changelist_view(request, extra_context)
+        finally:
+            # Restaurer le verbose_name_plural original
+            self.model._meta.verbose_name_plural = original_verbose_name_plural
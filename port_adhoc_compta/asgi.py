@@ -14,3 +14,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'port_adhoc_compta.settings')
 
 application = get_asgi_application()
+
+# Ouvre les connexions du pool avant la première requête (option `warmup`)
+from comptabilite.pool import warm_up  # noqa: E402
+
+warm_up()
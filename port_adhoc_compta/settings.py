@@ -50,6 +50,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
+    # En tête de chaîne : le temps total couvre les autres middlewares
+    'comptabilite.middleware.SqlTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -64,7 +66,8 @@ ROOT_URLCONF = 'port_adhoc_compta.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates dont le rendu est mesuré pour l'entête Server-Timing
+        'BACKEND': 'comptabilite.timing.DjangoTemplates',
         'DIRS': [BASE_DIR / 'templates'],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -85,9 +88,10 @@ WSGI_APPLICATION = 'port_adhoc_compta.wsgi.application'
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
 # Configuration SQL Server avec IP et port spécifique
+# Backend mssql avec pool de connexions (voir comptabilite/pool.py)
 DATABASES = {
     'default': {
-        'ENGINE': 'mssql',
+        'ENGINE': 'comptabilite.backends.mssql_pool',
         'NAME': 'TEST_TDB',
         'USER': 'Dev_Cube_Web',
         'PASSWORD': 'G4L|pK$9tbal',
@@ -97,12 +101,43 @@ DATABASES = {
             'driver': 'ODBC Driver 18 for SQL Server',
             'host_is_server': True,
             'unicode_results': True,
-            'extra_params': 'TrustServerCertificate=yes;Encrypt=no;Trusted_Connection=no;'
+            'extra_params': 'TrustServerCertificate=yes;Encrypt=no;Trusted_Connection=no;',
+            'pool': {
+                'min_size': config('DB_POOL_MIN_SIZE', default=2, cast=int),
+                'max_size': config('DB_POOL_MAX_SIZE', default=10, cast=int),
+                'max_lifetime': config('DB_POOL_MAX_LIFETIME', default=1800, cast=int),
+                'timeout': config('DB_POOL_TIMEOUT', default=30, cast=int),
+                'check_idle': config('DB_POOL_CHECK_IDLE', default=30, cast=int),
+                'warmup': config('DB_POOL_WARMUP', default=True, cast=bool),
+            } if config('DB_POOL_ENABLED', default=True, cast=bool) else None,
         },
     }
 }
 
 
+# Mode émulation : base SQLite locale où les procédures DW.PS_S_* sont émulées
+# (comptabilite/dw_emulation.py), pour mesurer et tester sans SQL Server
+DW_EMULATION = config('DW_EMULATION', default=False, cast=bool)
+if DW_EMULATION:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'comptabilite.backends.sqlite_dw',
+            'NAME': config('DW_EMULATION_DB', default=str(BASE_DIR / 'dw_emulation.sqlite3')),
+        }
+    }
+
+
+# Cache partagé entre les processus (jetons de version des libellés et des recherches).
+# Le cache fichier est commun aux workers d'une même machine ; utiliser un backend
+# réseau (Redis, Memcached) si l'application tourne sur plusieurs serveurs.
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': config('CACHE_LOCATION', default=str(BASE_DIR / '.cache')),
+    }
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -193,3 +228,79 @@ REST_FRAMEWORK = {
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 50
 }
+
+# Cache des résultats de la recherche des écritures (procédure SRE)
+# Durée de vie en secondes (0 pour désactiver), nombre d'entrées et taille maximale d'un résultat
+RECHERCHE_CACHE_TTL = config('RECHERCHE_CACHE_TTL', default=300, cast=int)
+RECHERCHE_CACHE_MAX_ENTRIES = config('RECHERCHE_CACHE_MAX_ENTRIES', default=20, cast=int)
+RECHERCHE_CACHE_MAX_ROWS = config('RECHERCHE_CACHE_MAX_ROWS', default=50000, cast=int)
+
+# Totaux regroupés de la recherche : lignes affichées et valeurs en colonnes au maximum
+PIVOT_MAX_ROWS = config('PIVOT_MAX_ROWS', default=2000, cast=int)
+PIVOT_MAX_COLUMNS = config('PIVOT_MAX_COLUMNS', default=60, cast=int)
+
+# Comparaison N / N-1 : lignes lues au maximum pour les deux périodes
+COMPARAISON_MAX_ROWS = config('COMPARAISON_MAX_ROWS', default=1000000, cast=int)
+
+# Recherche des écritures par l'ORM sur FinanceFaits (faits.py) : filtres multiples (plages,
+# listes, bornes de solde et de compte) et recherches simples sur société et période. Le modèle
+# FinanceFaits reprend le schéma du DW émulé : à n'activer qu'une fois vérifié sur le DW. Désactivé,
+# les filtres multiples appellent la procédure SRE par combinaison de valeurs et l'API api/ecritures/ répond 404
+RECHERCHE_ORM_ENABLED = config('RECHERCHE_ORM_ENABLED', default=False, cast=bool)
+# Sans RECHERCHE_ORM_ENABLED : nombre maximal d'appels de la procédure SRE pour une recherche à
+# critères multiples (périodes x sociétés x types valeur x comptes du préfixe ou de la plage)
+RECHERCHE_SRE_MAX_CALLS = config('RECHERCHE_SRE_MAX_CALLS', default=200, cast=int)
+
+# Listes des référentiels des formulaires (choice_cache.py) : rechargées à chaque modification
+# par Django et, pour les modifications faites hors de Django, au plus tard après ce délai (0 : jamais)
+CHOICE_CACHE_TIMEOUT = config('CHOICE_CACHE_TIMEOUT', default=3600, cast=int)
+
+# Recherches en arrière-plan (commande run_search_jobs) : délai maximal d'exécution,
+# conservation du résultat, annulation si la page n'interroge plus le statut, lignes au maximum
+SEARCH_JOB_TIMEOUT = config('SEARCH_JOB_TIMEOUT', default=300, cast=int)
+SEARCH_JOB_RESULT_TTL = config('SEARCH_JOB_RESULT_TTL', default=3600, cast=int)
+SEARCH_JOB_ABANDON_AFTER = config('SEARCH_JOB_ABANDON_AFTER', default=60, cast=int)
+SEARCH_JOB_MAX_ROWS = config('SEARCH_JOB_MAX_ROWS', default=1000000, cast=int)
+# Répertoire des résultats (fichiers hors cache, sans éviction) : partagé entre les serveurs web et le worker
+SEARCH_JOB_RESULT_DIR = config('SEARCH_JOB_RESULT_DIR', default=str(BASE_DIR / '.search_jobs'))
+
+# Imports Sage/Exact en arrière-plan (commande run_import_jobs) : un job en cours depuis plus
+# de ce délai (minutes) est considéré comme abandonné par son worker et passé en erreur (0 : jamais)
+IMPORT_JOB_STALE_AFTER = config('IMPORT_JOB_STALE_AFTER', default=120, cast=int)
+
+# Import Excel dans T_Temp_ImportBudgetExcel : nombre de lignes par lot d'insertion
+IMPORT_EXCEL_BATCH_SIZE = config('IMPORT_EXCEL_BATCH_SIZE', default=1000, cast=int)
+
+# Identifiants des tables référentielles (Société, Stade, ...) réservés par blocs dans T_E_Sequence_SEQ
+ID_BLOCK_SIZE = config('ID_BLOCK_SIZE', default=20, cast=int)
+
+# Mesure des temps SQL par requête : entête Server-Timing (db, render, total)
+# et journal des appels plus lents que SLOW_QUERY_THRESHOLD_MS (logger comptabilite.sql)
+SQL_TIMING_ENABLED = config('SQL_TIMING_ENABLED', default=True, cast=bool)
+SERVER_TIMING_HEADER = config('SERVER_TIMING_HEADER', default=True, cast=bool)
+SLOW_QUERY_THRESHOLD_MS = config('SLOW_QUERY_THRESHOLD_MS', default=500, cast=int)
+SLOW_QUERY_LOG_FILE = config('SLOW_QUERY_LOG_FILE', default='')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'slow_query': {'format': '{asctime} {message}', 'style': '{'},
+    },
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+        'slow_query': {
+            'class': 'logging.FileHandler',
+            'filename': SLOW_QUERY_LOG_FILE,
+            'formatter': 'slow_query',
+            'encoding': 'utf-8',
+        } if SLOW_QUERY_LOG_FILE else {
+            'class': 'logging.StreamHandler',
+            'formatter': 'slow_query',
+        },
+    },
+    'loggers': {
+        'comptabilite': {'handlers': ['console'], 'level': 'INFO'},
+        'comptabilite.sql': {'handlers': ['slow_query'], 'level': 'WARNING', 'propagate': False},
+    },
+}
@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'port_adhoc_compta.settings')
 
 application = get_wsgi_application()
+
+# Ouvre les connexions du pool avant la première requête (option `warmup`)
+from comptabilite.pool import warm_up  # noqa: E402
+
+warm_up()